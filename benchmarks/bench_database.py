@@ -0,0 +1,138 @@
+"""
+Database scale benchmark.
+
+Times DatabaseManager operations on a large history: get_all_chats, get_chat
+and save_messages on a sample of chats, then cleanup_empty_chats and
+clear_all_chats (which VACUUMs). Each destructive operation runs on a fresh
+copy of the database. Reports latency and bytes written per operation.
+
+    python -m benchmarks.bench_database [--db history.db] [--quick] [--json results.json]
+
+Without --db, a database is generated first (see generate_history).
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .common import describe, print_table, write_json
+from .generate_history import generate
+
+from src.database import DatabaseManager
+
+def io_counters() -> Dict[str, int]:
+    """Bytes written by this process, from /proc/self/io (Linux only)."""
+    counters: Dict[str, int] = {}
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                key, value = line.split(':')
+                counters[key.strip()] = int(value)
+    except OSError:
+        pass
+    return counters
+
+def db_bytes(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+def timed(name: str, fn: Callable[[], Any], repeat: int, path: str) -> Dict[str, Any]:
+    """Runs fn repeat times and reports latency and write volume."""
+    before_io = io_counters()
+    before_size = db_bytes(path)
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    after_io = io_counters()
+    stats = describe(samples)
+
+    def written(key: str) -> Optional[float]:
+        if key not in before_io or key not in after_io:
+            return None
+        return (after_io[key] - before_io[key]) / 1024
+
+    return {
+        "operation": name,
+        "runs": repeat,
+        "p50_ms": stats["p50"],
+        "p95_ms": stats["p95"],
+        "max_ms": stats["max"],
+        # wchar counts bytes passed to write(); write_bytes what reached the block layer
+        "written_kib": written("wchar"),
+        "disk_kib": written("write_bytes"),
+        "size_delta_kib": (db_bytes(path) - before_size) / 1024,
+    }
+
+def fresh_copy(source: str, workdir: str, name: str) -> str:
+    target = os.path.join(workdir, name)
+    for suffix in ("", "-wal"):
+        if os.path.exists(source + suffix):
+            shutil.copyfile(source + suffix, target + suffix)
+    return target
+
+def run(db_path: str, samples: int = 50, seed: int = 1234) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = fresh_copy(db_path, tmp, "read.db")
+        db = DatabaseManager(path)
+        chat_ids = [c["id"] for c in db.get_all_chats()]
+        sample = rng.sample(chat_ids, min(samples, len(chat_ids)))
+
+        rows.append(timed("get_all_chats", db.get_all_chats, 10, path))
+
+        ids = iter(sample * 2)
+        rows.append(timed("get_chat", lambda: db.get_chat(next(ids)), len(sample), path))
+
+        # save_messages as the app calls it: the whole history plus one new turn
+        histories = {chat_id: db.get_messages(chat_id) for chat_id in sample}
+        save_ids = iter(sample)
+
+        def save_turn() -> None:
+            chat_id = next(save_ids)
+            history = histories[chat_id]
+            history.append({"role": "user", "content": "one more question"})
+            history.append({"role": "assistant", "content": "one more answer " * 50, "model": "llama3:8b"})
+            db.save_messages(chat_id, history)
+
+        rows.append(timed("save_messages", save_turn, len(sample), path))
+        rows.append(timed("checkpoint", db.checkpoint, 1, path))
+
+        path = fresh_copy(db_path, tmp, "cleanup.db")
+        db = DatabaseManager(path)
+        rows.append(timed("cleanup_empty_chats", db.cleanup_empty_chats, 1, path))
+
+        path = fresh_copy(db_path, tmp, "clear.db")
+        db = DatabaseManager(path)
+        rows.append(timed("clear_all_chats (+VACUUM)", db.clear_all_chats, 1, path))
+    return rows
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help="Existing database to benchmark (it is copied, never modified)")
+    parser.add_argument('--quick', action='store_true', help="Generate a small database instead of the full scale one")
+    parser.add_argument('--samples', type=int, default=50, help="Chats sampled for get_chat and save_messages")
+    parser.add_argument('--json', help="Write raw results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db
+        info: Dict[str, Any] = {"db": db_path}
+        if not db_path:
+            db_path = os.path.join(tmp, "history.db")
+            if args.quick:
+                info = generate(db_path, chats=500, messages=20000, images=100, image_kib=64, empty_chats=50)
+            else:
+                info = generate(db_path, chats=10000, messages=1000000, images=5000, image_kib=200, empty_chats=500)
+            print(f"Generated database: {info}")
+        rows = run(db_path, args.samples)
+
+    print_table("Database operations", rows)
+    write_json(args.json, {"database": rows, "dataset": info})
+
+if __name__ == '__main__':
+    main()
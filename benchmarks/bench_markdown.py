@@ -0,0 +1,191 @@
+"""
+Markdown parsing micro-benchmark and regression gate.
+
+Replays a corpus of realistic responses token by token through the parsing
+half of MarkdownView (parse_blocks, then markdown_to_pango for every text
+block whose content changed, as _update_text_block does) at the 50 ms flush
+cadence of AiBubble. Reports the cost of each flush and total CPU per corpus,
+and exits with status 1 when a budget is exceeded, so it can gate changes.
+GTK is not needed; widget costs are covered by bench_render.
+
+    python -m benchmarks.bench_markdown [--quick] [--p95-budget-ms 8] [--max-budget-ms 50]
+"""
+import argparse
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .common import describe, measure, print_table, write_json
+from .fake_ollama import tokenize
+
+from src import markdown_parser
+from src.markdown_parser import PangoMarkupParser, parse_blocks, markdown_to_pango
+
+# Matches the timeout AiBubble uses to coalesce text updates
+FLUSH_INTERVAL_S = 0.05
+
+def _prose(paragraphs: int) -> str:
+    parts = []
+    for p in range(paragraphs):
+        if p % 6 == 0:
+            parts.append(f"## Section {p // 6 + 1}\n")
+        parts.append(
+            f"Paragraph {p} explains how **streaming** responses are *parsed* and rendered, with a "
+            f"[link](https://example.com/{p}), some `inline code` and ~~struck~~ text. "
+            "The renderer has to keep up with the model while the user scrolls and reads.\n"
+        )
+        if p % 4 == 3:
+            parts.append("".join(f"- item {i} with **bold** text\n" for i in range(5)))
+        if p % 9 == 8:
+            parts.append("> A quoted remark about latency budgets.\n")
+    return "\n".join(parts)
+
+def _huge_code(lines: int) -> str:
+    body = "\n".join(f"    result_{i} = transform(data[{i}], factor={i % 7})  # step {i}" for i in range(lines))
+    return f"Here is the implementation:\n\n```python\ndef pipeline(data):\n{body}\n    return data\n```\n\nThat's all."
+
+def _nested_fences(sections: int) -> str:
+    parts = []
+    for s in range(sections):
+        parts.append(f"Example {s}, a README that contains code:\n")
+        parts.append("````markdown\n# Title\n\nRun this:\n\n```bash\nmake install\n```\n\nDone.\n````\n")
+        parts.append("~~~text\n```python\nnot a fence here\n```\n~~~\n")
+        parts.append("```\npython\nprint('language on the next line')\n```\n")
+    return "\n".join(parts)
+
+def _wide_table(rows: int, cols: int) -> str:
+    header = "| " + " | ".join(f"Column {c}" for c in range(cols)) + " |"
+    sep = "|" + "|".join("---" for _ in range(cols)) + "|"
+    body = "\n".join("| " + " | ".join(f"**r{r}**c{c}" if c == 0 else f"value {r * c}" for c in range(cols)) + " |"
+                     for r in range(rows))
+    return f"Results:\n\n{header}\n{sep}\n{body}\n\nSummary below the table."
+
+def _latex(equations: int) -> str:
+    parts = []
+    for e in range(equations):
+        parts.append(f"The term $x_{{{e}}}^2 + \\alpha_{e}$ grows, so")
+        parts.append(f"$$\n\\frac{{\\partial L}}{{\\partial w_{{{e}}}}} = \\sum_{{i=1}}^{{n}} (y_i - \\hat{{y}}_i) x_{{i,{e}}}\n$$")
+        parts.append("\\begin{align}\na &= b + c \\\\\nd &= \\sqrt{e^2 + f^2}\n\\end{align}\n")
+    return "\n".join(parts)
+
+def corpus(quick: bool) -> Dict[str, str]:
+    scale = 1 if quick else 4
+    return {
+        "long prose": _prose(30 * scale),
+        "huge code block": _huge_code(300 * scale),
+        "nested fences": _nested_fences(10 * scale),
+        "wide table": _wide_table(40 * scale, 12),
+        "latex heavy": _latex(25 * scale),
+    }
+
+class _Timed:
+    """Accumulates time spent in a wrapped function."""
+
+    def __init__(self, fn: Callable[..., Any]) -> None:
+        self.fn = fn
+        self.total_s = 0.0
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return self.fn(*args, **kwargs)
+        finally:
+            self.total_s += time.perf_counter() - start
+
+def replay(text: str, tokens_per_s: float) -> Dict[str, Any]:
+    """Streams text through the parser at the flush cadence and times every flush."""
+    tokens = tokenize(text)
+    per_flush = max(int(tokens_per_s * FLUSH_INTERVAL_S), 1)
+
+    table_timer = _Timed(PangoMarkupParser.render_ascii_table)
+    PangoMarkupParser.render_ascii_table = table_timer
+    try:
+        # Last markdown rendered per block position, like each label's _raw_md
+        rendered: List[Optional[str]] = []
+        flush_ms: List[float] = []
+        parse_s = 0.0
+        markup_s = 0.0
+        accumulated = ""
+        with measure(trace_memory=False) as m:
+            for i in range(0, len(tokens), per_flush):
+                accumulated += "".join(tokens[i:i + per_flush])
+                start = time.perf_counter()
+                blocks = parse_blocks(accumulated)
+                parsed = time.perf_counter()
+                for idx, block in enumerate(blocks):
+                    if idx >= len(rendered):
+                        rendered.append(None)
+                    if block['type'] == 'text' and rendered[idx] != block['content']:
+                        rendered[idx] = block['content']
+                        if block['content'].strip():
+                            markdown_to_pango(block['content'])
+                    elif block['type'] == 'code':
+                        rendered[idx] = None
+                del rendered[len(blocks):]
+                end = time.perf_counter()
+                parse_s += parsed - start
+                markup_s += end - parsed
+                flush_ms.append((end - start) * 1000)
+    finally:
+        PangoMarkupParser.render_ascii_table = table_timer.fn
+
+    stats = describe(flush_ms)
+    return {
+        "flushes": stats["n"],
+        "flush_p50_ms": stats["p50"],
+        "flush_p95_ms": stats["p95"],
+        "flush_max_ms": stats["max"],
+        "parse_s": parse_s,
+        "markup_s": markup_s,
+        "table_s": table_timer.total_s,
+        "cpu_s": m.cpu_s,
+    }
+
+def run(quick: bool = False, tokens_per_s: float = 60.0) -> List[Dict[str, Any]]:
+    rows = []
+    for name, text in corpus(quick).items():
+        row: Dict[str, Any] = {"corpus": name, "kib": len(text) / 1024}
+        row.update(replay(text, tokens_per_s))
+        rows.append(row)
+    return rows
+
+def check_budgets(rows: List[Dict[str, Any]], p95_ms: Optional[float], max_ms: Optional[float],
+                  cpu_s: Optional[float]) -> List[str]:
+    """Returns a message for every corpus that exceeds a budget."""
+    failures = []
+    for row in rows:
+        if p95_ms is not None and row["flush_p95_ms"] > p95_ms:
+            failures.append(f"{row['corpus']}: p95 flush {row['flush_p95_ms']:.2f} ms > {p95_ms} ms")
+        if max_ms is not None and row["flush_max_ms"] > max_ms:
+            failures.append(f"{row['corpus']}: max flush {row['flush_max_ms']:.2f} ms > {max_ms} ms")
+        if cpu_s is not None and row["cpu_s"] > cpu_s:
+            failures.append(f"{row['corpus']}: total CPU {row['cpu_s']:.2f} s > {cpu_s} s")
+    return failures
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="Smaller corpus for a fast smoke run")
+    parser.add_argument('--rate', type=float, default=60.0, help="Simulated tokens per second")
+    parser.add_argument('--p95-budget-ms', type=float, default=8.0, help="Fail when a corpus' p95 flush cost exceeds this")
+    parser.add_argument('--max-budget-ms', type=float, default=50.0,
+                        help="Fail when any flush exceeds this (one flush interval by default)")
+    parser.add_argument('--cpu-budget-s', type=float, default=None, help="Fail when a corpus' total CPU exceeds this")
+    parser.add_argument('--json', help="Write raw results to this file")
+    args = parser.parse_args()
+
+    renderer = "python-markdown" if markdown_parser.markdown else "escaped text (python-markdown not installed)"
+    print(f"Markdown renderer: {renderer}")
+    rows = run(args.quick, args.rate)
+    print_table("Markdown parsing per flush", rows)
+    failures = check_budgets(rows, args.p95_budget_ms, args.max_budget_ms, args.cpu_budget_s)
+    write_json(args.json, {"markdown": rows, "budget_failures": failures})
+
+    if failures:
+        print("\nBudget exceeded:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+        sys.exit(1)
+    print("\nAll corpora within budget")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Chat persistence benchmark.
+
+Replays the app's save pattern against a fresh DatabaseManager: after every
+assistant turn the whole history is written with save_messages and the chat
+is read back with get_chat. Reports per-operation latency and the database
+size on disk.
+
+    python -m benchmarks.bench_persistence [--quick] [--json results.json]
+"""
+import argparse
+import base64
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from .common import describe, measure, print_table, write_json
+from .fake_ollama import WORDS
+
+from src.database import DatabaseManager
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def _db_bytes(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+def run_scenario(name: str, turns: int, reply_words: int, image_bytes: int, seed: int = 1234) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = DatabaseManager(path)
+        now = time.time()
+        db.create_chat("bench", "Benchmark", now, now, "fake:latest")
+
+        history: List[Dict[str, Any]] = []
+        save_ms: List[float] = []
+        load_ms: List[float] = []
+        with measure(trace_memory=False) as m:
+            for turn in range(turns):
+                user: Dict[str, Any] = {"role": "user", "content": _text(rng, 30)}
+                if image_bytes and turn % 5 == 0:
+                    user["images"] = [base64.b64encode(os.urandom(image_bytes)).decode('ascii')]
+                history.append(user)
+                history.append({
+                    "role": "assistant",
+                    "content": _text(rng, reply_words),
+                    "thinking_content": _text(rng, reply_words // 4),
+                    "model": "fake:latest",
+                    "api_details": {"endpoint": "chat", "model": "fake:latest", "options": {"temperature": 0.7}},
+                })
+
+                start = time.perf_counter()
+                db.save_messages("bench", history)
+                save_ms.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                db.get_chat("bench")
+                load_ms.append((time.perf_counter() - start) * 1000)
+        size = _db_bytes(path)
+
+    save = describe(save_ms)
+    load = describe(load_ms)
+    return {
+        "scenario": name,
+        "turns": turns,
+        "save_p50_ms": save["p50"],
+        "save_p95_ms": save["p95"],
+        "save_last_ms": save_ms[-1],
+        "load_p50_ms": load["p50"],
+        "load_p95_ms": load["p95"],
+        "total_s": m.wall_s,
+        "db_kib": size / 1024,
+    }
+
+def run(quick: bool = False) -> List[Dict[str, Any]]:
+    turns = 20 if quick else 100
+    return [
+        run_scenario("short replies", turns, 50, 0),
+        run_scenario("long replies", turns, 800, 0),
+        run_scenario("with images", turns, 200, 256 * 1024 if quick else 1024 * 1024),
+    ]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="Fewer turns for a fast smoke run")
+    parser.add_argument('--json', help="Write raw results to this file")
+    args = parser.parse_args()
+
+    rows = run(args.quick)
+    print_table("Persistence (DatabaseManager)", rows)
+    write_json(args.json, {"persistence": rows})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Markdown rendering benchmark.
+
+Replays a generated token stream into a MarkdownView the way AiBubble does:
+text accumulates and the view is updated once per 50 ms flush. Reports the
+cost of each update. Needs GTK and a display; on a headless machine run it
+under a virtual one, e.g. `xvfb-run python -m benchmarks.bench_render`.
+
+    python -m benchmarks.bench_render [--quick] [--json results.json]
+"""
+import argparse
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+from .common import describe, measure, print_table, write_json
+from .fake_ollama import generate_tokens
+
+# Matches the timeout AiBubble uses to coalesce text updates
+FLUSH_INTERVAL_S = 0.05
+
+def init_gtk() -> bool:
+    """Initializes GTK, returning False when no display is available."""
+    try:
+        import gi
+        gi.require_version('Gtk', '4.0')
+        gi.require_version('Adw', '1')
+        from gi.repository import Gtk
+    except (ImportError, ValueError):
+        return False
+    return Gtk.init_check() if hasattr(Gtk, 'init_check') else True
+
+def replay(view: Any, tokens: List[str], tokens_per_s: float) -> List[float]:
+    """Feeds tokens to the view in flush-sized batches, returning each update's cost in ms."""
+    per_flush = max(int(tokens_per_s * FLUSH_INTERVAL_S), 1)
+    costs: List[float] = []
+    text = ""
+    for i in range(0, len(tokens), per_flush):
+        text += "".join(tokens[i:i + per_flush])
+        start = time.perf_counter()
+        view.update(text)
+        costs.append((time.perf_counter() - start) * 1000)
+    return costs
+
+def corpus(quick: bool) -> Dict[str, List[str]]:
+    rng = random.Random(1234)
+    n = 400 if quick else 3000
+    prose = generate_tokens(n, rng)
+    code = ["```python\n"] + [f"value_{i} = compute({i})\n" for i in range(n // 4)] + ["```\n"]
+    mixed: List[str] = []
+    for section in range(max(n // 200, 1)):
+        mixed += generate_tokens(150, rng)
+        mixed += ["\n```bash\n"] + [f"echo step {section}-{i}\n" for i in range(20)] + ["```\n"]
+    return {"prose": prose, "code block": code, "prose + code": mixed}
+
+def run(quick: bool = False, tokens_per_s: float = 60.0) -> List[Dict[str, Any]]:
+    from src.markdown_view import MarkdownView
+
+    rows = []
+    for name, tokens in corpus(quick).items():
+        view = MarkdownView()
+        with measure(trace_memory=False) as m:
+            costs = replay(view, tokens, tokens_per_s)
+        stats = describe(costs)
+        rows.append({
+            "corpus": name,
+            "flushes": stats["n"],
+            "update_p50_ms": stats["p50"],
+            "update_p95_ms": stats["p95"],
+            "update_max_ms": stats["max"],
+            "over_budget": sum(1 for c in costs if c > FLUSH_INTERVAL_S * 1000),
+            "cpu_s": m.cpu_s,
+        })
+    return rows
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="Shorter streams for a fast smoke run")
+    parser.add_argument('--rate', type=float, default=60.0, help="Simulated tokens per second")
+    parser.add_argument('--json', help="Write raw results to this file")
+    args = parser.parse_args()
+
+    if not init_gtk():
+        print("GTK 4 with a display is required for the rendering benchmark", file=sys.stderr)
+        sys.exit(2)
+    rows = run(args.quick, args.rate)
+    print_table("Rendering (MarkdownView)", rows)
+    write_json(args.json, {"render": rows})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Streaming client benchmark.
+
+Drives ollama.chat against the fake server for several stream shapes and
+reports client throughput, time to first token, inter-chunk gaps and peak
+Python heap.
+
+    python -m benchmarks.bench_stream [--quick] [--json results.json]
+"""
+import argparse
+import base64
+import os
+from typing import Any, Dict, List, Tuple
+
+from .common import describe, measure, print_table, write_json
+from .fake_ollama import FakeOllama, StreamProfile
+
+from src import ollama
+from src.instrumentation import StreamTimings
+
+def scenarios(quick: bool) -> List[Tuple[str, StreamProfile, Dict[str, Any]]]:
+    """(name, server profile, request extras) for each scenario."""
+    n = 500 if quick else 4000
+    image_mib = 2 if quick else 16
+    return [
+        ("plain", StreamProfile(tokens=n), {}),
+        ("chunked x8", StreamProfile(tokens=n, chunk_tokens=8), {}),
+        ("thinking", StreamProfile(tokens=n // 2, thinking_tokens=n // 2), {}),
+        ("logprobs top5", StreamProfile(tokens=n), {"logprobs": True, "top_logprobs": 5}),
+        ("paced 100 tok/s", StreamProfile(tokens=100 if quick else 300, rate=100.0), {}),
+        ("paced, gzip proxy", StreamProfile(tokens=100 if quick else 300, rate=100.0), {"gzip": True}),
+        ("logprobs, gzip proxy", StreamProfile(tokens=n), {"logprobs": True, "top_logprobs": 5, "gzip": True}),
+        (f"2 images x {image_mib} MiB", StreamProfile(tokens=50), {"image_bytes": image_mib * 1024 * 1024, "image_count": 2}),
+    ]
+
+def run_scenario(name: str, profile: StreamProfile, extras: Dict[str, Any]) -> Dict[str, Any]:
+    images = None
+    if extras.get("image_count"):
+        # Random bytes are incompressible, like real photos
+        images = [base64.b64encode(os.urandom(extras["image_bytes"])).decode('ascii')
+                  for _ in range(extras["image_count"])]
+
+    with FakeOllama(profile, gzip=extras.get("gzip", False)) as server:
+        timings = StreamTimings()
+        chunks = 0
+        chars = 0
+        with measure() as m:
+            for chunk in ollama.chat(
+                host=server.url,
+                model="fake:latest",
+                messages=[{"role": "user", "content": "benchmark"}],
+                logprobs=extras.get("logprobs", False),
+                top_logprobs=extras.get("top_logprobs"),
+                images=images,
+                timings=timings
+            ):
+                if 'error' in chunk:
+                    raise RuntimeError(chunk['error'])
+                message = chunk.get('message', {})
+                text = message.get('content', '') + message.get('thinking', '')
+                timings.mark_chunk(bool(text))
+                chunks += 1
+                chars += len(text)
+                if chunk.get('done'):
+                    timings.mark_last_chunk()
+        body_bytes = server.requests[0]["body_bytes"] if server.requests else 0
+
+    summary = timings.summary()
+    gaps = describe([b - a for a, b in zip(timings.token_times, timings.token_times[1:])])
+    return {
+        "scenario": name,
+        "chunks": chunks,
+        "chunks_per_s": chunks / m.wall_s if m.wall_s else 0.0,
+        "chars_per_s": chars / m.wall_s if m.wall_s else 0.0,
+        "first_byte_ms": summary["first_byte_ms"],
+        "ttft_ms": summary["ttft_ms"],
+        "gap_p95_ms": gaps["p95"] * 1000 if gaps["p95"] is not None else None,
+        "cpu_s": m.cpu_s,
+        "wall_s": m.wall_s,
+        "peak_heap_kib": m.peak_kib,
+        "request_kib": body_bytes / 1024,
+    }
+
+def run(quick: bool = False) -> List[Dict[str, Any]]:
+    return [run_scenario(name, profile, extras) for name, profile, extras in scenarios(quick)]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="Smaller streams for a fast smoke run")
+    parser.add_argument('--json', help="Write raw results to this file")
+    args = parser.parse_args()
+
+    rows = run(args.quick)
+    print_table("Streaming (ollama.chat)", rows)
+    write_json(args.json, {"stream": rows})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Measurement and reporting helpers shared by the benchmarks."""
+import gettext
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Make the application sources importable as the `src` package
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# The app installs _() at startup; UI modules call it when building widgets
+gettext.install('gnollama')
+
+from src.metrics import percentile
+
+def describe(values: List[float]) -> Dict[str, Optional[float]]:
+    """Summary statistics for a list of samples."""
+    return {
+        "n": len(values),
+        "mean": statistics.fmean(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values) if values else None,
+    }
+
+class Measurement:
+    """Wall time, CPU time and Python heap peak of a measured block."""
+
+    def __init__(self) -> None:
+        self.wall_s: float = 0.0
+        self.cpu_s: float = 0.0
+        self.peak_kib: float = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"wall_s": self.wall_s, "cpu_s": self.cpu_s, "peak_kib": self.peak_kib}
+
+@contextmanager
+def measure(trace_memory: bool = True) -> Iterator[Measurement]:
+    """Measures the enclosed block; tracemalloc slows allocation-heavy code, so it can be turned off."""
+    m = Measurement()
+    if trace_memory:
+        tracemalloc.start()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield m
+    finally:
+        m.wall_s = time.perf_counter() - wall
+        m.cpu_s = time.process_time() - cpu
+        if trace_memory:
+            m.peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+
+def max_rss_kib() -> int:
+    """Peak resident set size of this process."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+def print_table(title: str, rows: List[Dict[str, Any]]) -> None:
+    """Prints rows of flat dicts as an aligned text table."""
+    print(f"\n== {title} ==")
+    if not rows:
+        print("(no results)")
+        return
+    columns = list(rows[0].keys())
+    widths = {c: max(len(c), *(len(_fmt(r.get(c, ''))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(_fmt(row.get(c, '')).ljust(widths[c]) for c in columns))
+
+def write_json(path: Optional[str], results: Dict[str, Any]) -> None:
+    """Writes the raw results, with basic environment details, for comparing runs."""
+    if not path:
+        return
+    results = dict(results)
+    results["environment"] = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "timestamp": time.time(),
+        "max_rss_kib": max_rss_kib(),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {path}")
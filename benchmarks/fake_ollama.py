@@ -0,0 +1,276 @@
+"""
+A local stand-in for the Ollama HTTP API.
+
+Streams NDJSON responses with a configurable shape (token count and rate,
+tokens per chunk, thinking and logprobs payloads) so client changes can be
+measured without a GPU. Token text is generated from a seed, so runs are
+reproducible.
+
+Run it standalone to point the app at it:
+
+    python -m benchmarks.fake_ollama --port 11435 --tokens 800 --rate 60 --thinking 200
+"""
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+WORDS = (
+    "the model streams tokens over http while the client parses each line and renders markdown "
+    "latency throughput buffer chunk request response thinking context window cache server"
+).split()
+
+class StreamProfile:
+    """Shape of the streams the fake server produces."""
+
+    def __init__(self, tokens: int = 200, rate: float = 0.0, chunk_tokens: int = 1,
+                 thinking_tokens: int = 0, logprobs: bool = False, top_logprobs: int = 0,
+                 first_token_delay: float = 0.0, text: Optional[str] = None, seed: int = 1234) -> None:
+        self.tokens = tokens
+        # Tokens per second; 0 streams as fast as possible
+        self.rate = rate
+        self.chunk_tokens = max(chunk_tokens, 1)
+        self.thinking_tokens = thinking_tokens
+        # Always include logprobs, even when the request didn't ask for them
+        self.logprobs = logprobs
+        self.top_logprobs = top_logprobs
+        # Simulated model load and prompt evaluation before the first chunk
+        self.first_token_delay = first_token_delay
+        # Fixed response text to replay instead of generated words
+        self.text = text
+        self.seed = seed
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in vars(self).items() if k != 'text'}
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into token-sized pieces (about four characters, keeping whitespace)."""
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+def generate_tokens(count: int, rng: random.Random) -> List[str]:
+    return [rng.choice(WORDS) + (" " if rng.random() < 0.85 else "\n") for _ in range(count)]
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: 'FakeOllama'
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _wants_gzip(self) -> bool:
+        return self.server.gzip and 'gzip' in self.headers.get('Accept-Encoding', '')
+
+    def _send_json(self, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if self._wants_gzip():
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == '/api/tags':
+            self._send_json({"models": [{"name": "fake:latest", "size": 0, "details": {}}]})
+        elif self.path == '/api/version':
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            self.send_error(404)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() != 'chunked':
+            return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        parts = []
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if size == 0:
+                # Skip trailers up to the final empty line
+                while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return b"".join(parts)
+            parts.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def do_POST(self) -> None:
+        raw = self._read_body()
+        try:
+            request = json.loads(raw) if raw else {}
+        except ValueError:
+            self.send_error(400)
+            return
+        self.server.record_request(self.path, len(raw), request)
+
+        if self.path == '/api/show':
+            self._send_json({"modelfile": "", "parameters": "", "template": "", "details": {}})
+        elif self.path in ('/api/chat', '/api/generate'):
+            self._stream(request, chat=self.path == '/api/chat')
+        else:
+            self.send_error(404)
+
+    def _write_chunk(self, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload).encode('utf-8') + b"\n"
+        if self._gzip:
+            # Flush after every line, like a proxy with buffering turned off
+            data = self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        self._write_raw(data)
+
+    def _write_raw(self, data: bytes) -> None:
+        if data:
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, request: Dict[str, Any], chat: bool) -> None:
+        profile = self.server.profile
+        rng = random.Random(profile.seed)
+        started = time.monotonic()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self._gzip = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if self._wants_gzip() else None
+        if self._gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+
+        if profile.first_token_delay:
+            time.sleep(profile.first_token_delay)
+        first_token_at = time.monotonic()
+
+        thinking = generate_tokens(profile.thinking_tokens, rng)
+        response = tokenize(profile.text) if profile.text is not None else generate_tokens(profile.tokens, rng)
+        want_logprobs = profile.logprobs or bool(request.get('logprobs'))
+        top_k = request.get('top_logprobs') or profile.top_logprobs
+
+        interval = profile.chunk_tokens / profile.rate if profile.rate else 0.0
+        next_at = time.monotonic()
+        for field, tokens in (('thinking', thinking), ('content', response)):
+            for i in range(0, len(tokens), profile.chunk_tokens):
+                piece = tokens[i:i + profile.chunk_tokens]
+                text = "".join(piece)
+                if chat:
+                    chunk: Dict[str, Any] = {"model": request.get('model'), "message": {"role": "assistant", field: text}, "done": False}
+                else:
+                    chunk = {"model": request.get('model'), "response" if field == 'content' else "thinking": text, "done": False}
+                if want_logprobs and field == 'content':
+                    chunk["logprobs"] = [
+                        {"token": tok, "logprob": -rng.random(),
+                         "top_logprobs": [{"token": rng.choice(WORDS), "logprob": -rng.random() * 5} for _ in range(top_k)]}
+                        for tok in piece
+                    ]
+                try:
+                    self._write_chunk(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                if interval:
+                    next_at += interval
+                    delay = next_at - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+        eval_ns = int((time.monotonic() - first_token_at) * 1e9) or 1
+        final: Dict[str, Any] = {
+            "model": request.get('model'),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.monotonic() - started) * 1e9),
+            "load_duration": int(profile.first_token_delay * 1e9),
+            "prompt_eval_count": len(json.dumps(request.get('messages') or request.get('prompt') or "")) // 4,
+            "prompt_eval_duration": 0,
+            "eval_count": len(thinking) + len(response),
+            "eval_duration": eval_ns,
+        }
+        if chat:
+            final["message"] = {"role": "assistant", "content": ""}
+        else:
+            final["response"] = ""
+        try:
+            self._write_chunk(final)
+            if self._gzip:
+                self._write_raw(self._gzip.flush())
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class FakeOllama(ThreadingHTTPServer):
+    """Fake Ollama server running on a background thread; use as a context manager."""
+    daemon_threads = True
+
+    def __init__(self, profile: Optional[StreamProfile] = None, host: str = '127.0.0.1', port: int = 0,
+                 gzip: bool = False) -> None:
+        super().__init__((host, port), _Handler)
+        self.profile: StreamProfile = profile or StreamProfile()
+        # Compress responses for clients that accept gzip, like nginx with gzip on
+        self.gzip = gzip
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_request(self, path: str, body_bytes: int, request: Dict[str, Any]) -> None:
+        images = len(request.get('images') or [])
+        for msg in request.get('messages') or []:
+            images += len(msg.get('images') or [])
+        with self._lock:
+            self.requests.append({"path": path, "body_bytes": body_bytes, "images": images})
+
+    def start(self) -> 'FakeOllama':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> 'FakeOllama':
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve fake Ollama NDJSON streams.")
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--tokens', type=int, default=200, help="Response tokens per stream")
+    parser.add_argument('--rate', type=float, default=40.0, help="Tokens per second (0 = unthrottled)")
+    parser.add_argument('--chunk-tokens', type=int, default=1, help="Tokens per NDJSON chunk")
+    parser.add_argument('--thinking', type=int, default=0, help="Thinking tokens before the response")
+    parser.add_argument('--logprobs', action='store_true', help="Always include logprobs")
+    parser.add_argument('--top-logprobs', type=int, default=0)
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument('--text-file', help="Replay this file's text instead of generated words")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--gzip', action='store_true', help="Gzip responses when the client accepts it")
+    args = parser.parse_args()
+
+    text = None
+    if args.text_file:
+        with open(args.text_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+    profile = StreamProfile(tokens=args.tokens, rate=args.rate, chunk_tokens=args.chunk_tokens,
+                            thinking_tokens=args.thinking, logprobs=args.logprobs,
+                            top_logprobs=args.top_logprobs, first_token_delay=args.delay,
+                            text=text, seed=args.seed)
+    server = FakeOllama(profile, port=args.port, gzip=args.gzip)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Synthetic chat history generator.
+
+Builds a gnollama.db with the app's current schema and a realistic spread of
+chat sizes (a few very long chats, many short ones), image blobs and some
+empty chats. Output is seeded, so the same arguments give the same database.
+
+    python -m benchmarks.generate_history history.db --chats 10000 --messages 1000000 --images 5000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .common import measure
+from .fake_ollama import WORDS
+
+from src.database import DatabaseManager
+
+class _TextSource:
+    """Cuts random slices out of a fixed word pool, far faster than drawing every word."""
+
+    def __init__(self, rng: random.Random, pool_size: int = 20000) -> None:
+        self.rng = rng
+        self.words = [rng.choice(WORDS) for _ in range(pool_size)]
+
+    def __call__(self, low: int, high: int) -> str:
+        n = self.rng.randint(low, high)
+        start = self.rng.randrange(len(self.words) - n)
+        return " ".join(self.words[start:start + n])
+
+def _chat_sizes(rng: random.Random, chats: int, messages: int) -> List[int]:
+    """Splits the message total over chats with a long-tailed distribution."""
+    weights = [rng.lognormvariate(0, 1.2) for _ in range(chats)]
+    scale = messages / sum(weights)
+    sizes = [max(int(w * scale), 1) for w in weights]
+    # Fix rounding so the total matches exactly
+    diff = messages - sum(sizes)
+    i = 0
+    while diff != 0:
+        idx = i % chats
+        if diff > 0:
+            sizes[idx] += 1
+            diff -= 1
+        elif sizes[idx] > 1:
+            sizes[idx] -= 1
+            diff += 1
+        i += 1
+    return sizes
+
+def _messages(rng: random.Random, text: _TextSource, chat_id: str, count: int) -> Iterator[Tuple[Any, ...]]:
+    api_details = json.dumps({"endpoint": "chat", "model": "llama3:8b", "options": {"temperature": 0.7}})
+    for idx in range(count):
+        if idx % 2 == 0:
+            yield (chat_id, "user", text(5, 60), None, None, None, idx)
+        else:
+            thinking = text(20, 120) if rng.random() < 0.3 else None
+            yield (chat_id, "assistant", text(40, 400), "llama3:8b", thinking, api_details, idx)
+
+def generate(path: str, chats: int, messages: int, images: int, image_kib: int,
+             empty_chats: int, seed: int = 1234) -> Dict[str, Any]:
+    """Creates the database at path and returns what was generated."""
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rng = random.Random(seed)
+    text = _TextSource(rng)
+    DatabaseManager(path)  # Creates the schema and runs all migrations
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA synchronous = OFF;")
+    now = time.time()
+    host_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    conn.execute("INSERT INTO hosts (id, name, hostname, is_default) VALUES (?, ?, ?, 1)",
+                 (host_id, "Local", "http://localhost:11434"))
+
+    sizes = _chat_sizes(rng, chats, messages)
+    chat_ids: List[str] = []
+    for n in range(chats + empty_chats):
+        chat_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        created = now - rng.uniform(0, 365 * 86400)
+        conn.execute("""
+            INSERT INTO chats (id, title, created_at, updated_at, model, system_prompt, host_id, options, is_pinned)
+            VALUES (?, ?, ?, ?, ?, NULL, ?, ?, ?)
+        """, (chat_id, text(2, 6).capitalize(), created, created + rng.uniform(0, 3600), "llama3:8b",
+              host_id, json.dumps({"temperature": 0.7}), 1 if rng.random() < 0.01 else 0))
+        if n < chats:
+            chat_ids.append(chat_id)
+
+    insert = """
+        INSERT INTO messages (chat_id, role, content, model, thinking_content, api_details, order_index)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+    for chat_id, size in zip(chat_ids, sizes):
+        conn.executemany(insert, _messages(rng, text, chat_id, size))
+    conn.commit()
+
+    # Attach images to random user messages
+    image_bytes = image_kib * 1024
+    if images:
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM messages WHERE role = 'user'")]
+        for message_id in rng.sample(user_ids, min(images, len(user_ids))):
+            conn.execute("INSERT INTO message_images (message_id, image_data) VALUES (?, ?)",
+                         (message_id, sqlite3.Binary(rng.randbytes(image_bytes))))
+        conn.commit()
+
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    conn.close()
+    return {
+        "chats": chats,
+        "empty_chats": empty_chats,
+        "messages": messages,
+        "images": images,
+        "largest_chat": max(sizes) if sizes else 0,
+        "db_mib": os.path.getsize(path) / (1024 * 1024),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('output', help="Path of the database to create")
+    parser.add_argument('--chats', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=1000000, help="Total messages over all chats")
+    parser.add_argument('--images', type=int, default=5000, help="Image blobs attached to user messages")
+    parser.add_argument('--image-kib', type=int, default=200, help="Size of each image blob")
+    parser.add_argument('--empty-chats', type=int, default=500, help="Chats without messages")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    with measure(trace_memory=False) as m:
+        info = generate(args.output, args.chats, args.messages, args.images, args.image_kib,
+                        args.empty_chats, args.seed)
+    print(f"Generated {args.output} in {m.wall_s:.1f}s: {json.dumps(info)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Runs the benchmark suite.
+
+    python -m benchmarks.run [stream] [persistence] [database] [markdown] [render] [--quick] [--json results.json]
+
+With no names every benchmark runs; the rendering benchmark is skipped when
+GTK has no display. Without --quick the database benchmark first generates a
+history of 10k chats and 1M messages, which takes a while.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from typing import Any, Dict
+
+from .common import print_table, write_json
+from . import bench_database, bench_markdown, bench_persistence, bench_render, bench_stream
+from .generate_history import generate
+
+BENCHMARKS = ['stream', 'persistence', 'database', 'markdown', 'render']
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the gnollama benchmarks.")
+    parser.add_argument('names', nargs='*', metavar='name', help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--quick', action='store_true', help="Smaller workloads for a fast smoke run")
+    parser.add_argument('--json', help="Write raw results to this file")
+    args = parser.parse_args()
+    names = args.names or BENCHMARKS
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    results: Dict[str, Any] = {"quick": args.quick}
+    if 'stream' in names:
+        results['stream'] = bench_stream.run(args.quick)
+        print_table("Streaming (ollama.chat)", results['stream'])
+    if 'persistence' in names:
+        results['persistence'] = bench_persistence.run(args.quick)
+        print_table("Persistence (DatabaseManager)", results['persistence'])
+    if 'database' in names:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "history.db")
+            if args.quick:
+                results['dataset'] = generate(db_path, chats=500, messages=20000, images=100, image_kib=64, empty_chats=50)
+            else:
+                results['dataset'] = generate(db_path, chats=10000, messages=1000000, images=5000, image_kib=200, empty_chats=500)
+            results['database'] = bench_database.run(db_path)
+        print_table("Database operations", results['database'])
+    if 'markdown' in names:
+        results['markdown'] = bench_markdown.run(args.quick)
+        print_table("Markdown parsing per flush", results['markdown'])
+    if 'render' in names:
+        if bench_render.init_gtk():
+            results['render'] = bench_render.run(args.quick)
+            print_table("Rendering (MarkdownView)", results['render'])
+        else:
+            print("\nSkipping rendering benchmark: GTK 4 with a display is not available", file=sys.stderr)
+    write_json(args.json, results)
+
+if __name__ == '__main__':
+    main()
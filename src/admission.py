@@ -0,0 +1,131 @@
+import threading
+from typing import Any, Dict, List, Optional, Set
+from . import ollama
+from .scheduler import TaskScheduler, LANE_STREAM, LANE_METADATA, PRIORITY_LOW
+
+# Waiting longer than this before the first chunk, beyond load and prompt
+# evaluation time, means the server queued the request.
+QUEUE_WAIT_THRESHOLD = 0.5
+
+# Consecutive unqueued runs at the current limit before probing one higher.
+CLEAN_RUNS_BEFORE_PROBE = 3
+
+class _HostState:
+    """Admission state for a single Ollama host."""
+    __slots__ = ("configured", "learned", "clean_runs", "models")
+
+    def __init__(self) -> None:
+        self.configured: Optional[int] = None
+        self.learned: int = 1
+        self.clean_runs: int = 0
+        self.models: Optional[Set[str]] = None
+
+class AdmissionController:
+    """
+    Client-side admission control for generation streams.
+
+    Each host gets a concurrency limit on the scheduler's stream lane, so
+    excess requests wait in a visible client queue instead of stalling
+    opaquely on the server. The limit comes from the host configuration
+    or, when unset, is learned from observed server-side queueing.
+    """
+
+    def __init__(self, scheduler: TaskScheduler) -> None:
+        self.scheduler: TaskScheduler = scheduler
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostState] = {}
+
+    def _state(self, hostname: str) -> _HostState:
+        state = self._hosts.get(hostname)
+        if state is None:
+            state = self._hosts[hostname] = _HostState()
+            self.scheduler.set_host_limit(LANE_STREAM, hostname, state.learned)
+        return state
+
+    def configure_hosts(self, hosts: List[Dict[str, Any]]) -> None:
+        """Applies configured parallel limits from the host list."""
+        with self._lock:
+            for host in hosts:
+                state = self._state(host['hostname'])
+                state.configured = host.get('max_parallel') or None
+                self.scheduler.set_host_limit(LANE_STREAM, host['hostname'], self._limit(state))
+
+    def _limit(self, state: _HostState) -> int:
+        return state.configured if state.configured else state.learned
+
+    def limit(self, hostname: str) -> int:
+        """Returns the current parallel request limit for a host."""
+        with self._lock:
+            return self._limit(self._state(hostname))
+
+    def is_saturated(self, hostname: str) -> bool:
+        """Whether a new request for the host would have to wait in the client queue."""
+        limit = self.limit(hostname)
+        busy = self.scheduler.running_count(LANE_STREAM, hostname) + self.scheduler.queued_count(LANE_STREAM, hostname)
+        return busy >= limit
+
+    def observe(self, hostname: str, concurrency: int, first_chunk_s: float,
+                load_duration: int = 0, prompt_eval_duration: int = 0) -> None:
+        """
+        Updates the learned limit from a finished request.
+
+        Args:
+            hostname: The host the request ran on.
+            concurrency: Streams running on the host when the request started, itself included.
+            first_chunk_s: Seconds from sending the request to its first chunk.
+            load_duration: Server reported model load time in nanoseconds.
+            prompt_eval_duration: Server reported prompt evaluation time in nanoseconds.
+        """
+        queue_wait = first_chunk_s - (load_duration + prompt_eval_duration) / 1e9
+        with self._lock:
+            state = self._state(hostname)
+            if queue_wait > QUEUE_WAIT_THRESHOLD and concurrency > 1:
+                # The server held this request back, so it runs fewer than `concurrency` at once.
+                state.learned = max(min(state.learned, concurrency - 1), 1)
+                state.clean_runs = 0
+            elif concurrency >= state.learned:
+                state.clean_runs += 1
+                if state.clean_runs >= CLEAN_RUNS_BEFORE_PROBE:
+                    state.learned += 1
+                    state.clean_runs = 0
+            if not state.configured:
+                self.scheduler.set_host_limit(LANE_STREAM, hostname, state.learned)
+
+    def note_models(self, hostname: str, models: List[str]) -> None:
+        """Records which models a host serves, for overflow routing."""
+        with self._lock:
+            self._state(hostname).models = set(models)
+
+    def refresh_models(self, hosts: List[Dict[str, Any]]) -> None:
+        """Fetches model lists for all hosts in the background so overflow routing knows them."""
+        def fetch(hostname: str) -> None:
+            try:
+                self.note_models(hostname, ollama.fetch_models(hostname))
+            except ollama.OllamaError:
+                pass
+
+        for host in hosts:
+            self.scheduler.schedule(LANE_METADATA, fetch, host['hostname'], priority=PRIORITY_LOW)
+
+    def known_models(self, hostname: str) -> Optional[Set[str]]:
+        with self._lock:
+            state = self._hosts.get(hostname)
+            return set(state.models) if state and state.models is not None else None
+
+    def pick_overflow_host(self, hosts: List[Dict[str, Any]], model: str,
+                           exclude: str) -> Optional[Dict[str, Any]]:
+        """Returns another host that serves the model and has spare capacity, if any."""
+        best = None
+        best_free = 0
+        for host in hosts:
+            hostname = host['hostname']
+            if hostname == exclude:
+                continue
+            models = self.known_models(hostname)
+            if not models or model not in models:
+                continue
+            busy = self.scheduler.running_count(LANE_STREAM, hostname) + self.scheduler.queued_count(LANE_STREAM, hostname)
+            free = self.limit(hostname) - busy
+            if free > best_free:
+                best, best_free = host, free
+        return best
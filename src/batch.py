@@ -0,0 +1,332 @@
+"""
+Headless batch prompt runner.
+
+Reads prompts from a JSONL file, runs them against the hosts configured in
+gnollama.db with bounded concurrency and streams one JSON result per line.
+Prompts that already have a successful result in the output file are skipped,
+so an interrupted run can simply be started again.
+
+Usage: gnollama batch INPUT.jsonl -o OUTPUT.jsonl [options]
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, TextIO, Union
+
+from . import ollama
+from .database import DatabaseManager
+from .metrics import build_metric, final_counters, tokens_per_second
+from .payload import FileImage
+
+def default_db_path() -> str:
+    """Returns the path of the database used by the desktop app."""
+    data_dir = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(data_dir, 'gnollama', 'gnollama.db')
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    """Loads prompt records, giving records without an 'id' one based on their line number."""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {'prompt': record}
+            record.setdefault('id', f"line-{line_no}")
+            records.append(record)
+    return records
+
+def completed_ids(path: str) -> Set[str]:
+    """Returns IDs that already have a successful result in the output file."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # Line cut short by a crash; that prompt will be run again
+            if result.get('status') == 'ok':
+                done.add(str(result.get('id')))
+    return done
+
+def open_output(path: str) -> TextIO:
+    """Opens the output file for appending, terminating a partially written last line."""
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+    out = open(path, 'a', encoding='utf-8')
+    if needs_newline:
+        out.write('\n')
+    return out
+
+def resolve_host(hosts: List[Dict[str, Any]], key: str) -> Dict[str, Any]:
+    """Finds a configured host by ID, name or URL; unknown URLs are used as-is."""
+    for host in hosts:
+        if key in (host['id'], host['name'], host['hostname']):
+            return host
+    if key.startswith('http://') or key.startswith('https://'):
+        return {'id': None, 'name': key, 'hostname': key, 'max_parallel': None}
+    raise SystemExit(f"Unknown host: {key}")
+
+def load_images(images: Optional[List[str]], base_dir: str) -> Optional[List[Union[str, FileImage]]]:
+    """Accepts base64 strings or image file paths (relative to the input file)."""
+    if not images:
+        return None
+    encoded = []
+    for img in images:
+        path = img if os.path.isabs(img) else os.path.join(base_dir, img)
+        if len(img) < 4096 and os.path.isfile(path):
+            # Streamed from the file when the request body is sent
+            encoded.append(FileImage(path))
+        else:
+            encoded.append(img)
+    return encoded
+
+class BatchRunner:
+    """Runs prompt records across hosts, one worker thread per host slot."""
+
+    def __init__(self, hosts: List[Dict[str, Any]], defaults: Dict[str, Any], out: TextIO,
+                 concurrency: int, per_host: int, base_dir: str,
+                 db: Optional[DatabaseManager] = None) -> None:
+        self.hosts = hosts
+        self.db = db
+        self.defaults = defaults
+        self.out = out
+        self.base_dir = base_dir
+        self.write_lock = threading.Lock()
+        self.shared: 'queue.Queue[Dict[str, Any]]' = queue.Queue()
+        self.pinned: Dict[str, 'queue.Queue[Dict[str, Any]]'] = {h['hostname']: queue.Queue() for h in hosts}
+        self.slots = self._plan_slots(concurrency, per_host)
+        self.total = 0
+        self.finished = 0
+        self.failed = 0
+
+    def _plan_slots(self, concurrency: int, per_host: int) -> List[Dict[str, Any]]:
+        """Spreads up to `concurrency` worker slots over the hosts, honouring each host's limit."""
+        limits = {h['hostname']: h.get('max_parallel') or per_host for h in self.hosts}
+        slots: List[Dict[str, Any]] = []
+        while len(slots) < concurrency:
+            added = False
+            for host in self.hosts:
+                used = sum(1 for s in slots if s['hostname'] == host['hostname'])
+                if used < limits[host['hostname']] and len(slots) < concurrency:
+                    slots.append(host)
+                    added = True
+            if not added:
+                break
+        return slots
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.total += 1
+        host_key = record.get('host')
+        if host_key:
+            host = resolve_host(self.hosts, host_key)
+            if host['hostname'] not in self.pinned:
+                raise SystemExit(f"Host {host_key} is not one of the hosts selected for this run")
+            if not any(s['hostname'] == host['hostname'] for s in self.slots):
+                raise SystemExit(f"Host {host_key} got no worker slot; raise --concurrency")
+            self.pinned[host['hostname']].put(record)
+        else:
+            self.shared.put(record)
+
+    def _next(self, hostname: str) -> Optional[Dict[str, Any]]:
+        for q in (self.pinned[hostname], self.shared):
+            try:
+                return q.get_nowait()
+            except queue.Empty:
+                continue
+        return None
+
+    def _worker(self, host: Dict[str, Any]) -> None:
+        while True:
+            record = self._next(host['hostname'])
+            if record is None:
+                return
+            result = self.run_record(host, record)
+            self._write(result)
+
+    def _write(self, result: Dict[str, Any]) -> None:
+        with self.write_lock:
+            self.out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            self.out.flush()
+            os.fsync(self.out.fileno())
+            self.finished += 1
+            if result['status'] != 'ok':
+                self.failed += 1
+            print(f"[{self.finished}/{self.total}] {result['id']} {result['host']} "
+                  f"{result['model']}: {result['status']}", file=sys.stderr)
+
+    def run_record(self, host: Dict[str, Any], record: Dict[str, Any]) -> Dict[str, Any]:
+        """Runs a single prompt record and returns its result line."""
+        settings = dict(self.defaults)
+        settings.update({k: v for k, v in record.items() if v is not None})
+        model = settings.get('model')
+        result: Dict[str, Any] = {
+            'id': record['id'],
+            'host': host['name'],
+            'model': model,
+            'status': 'ok',
+            'response': "",
+            'thinking': "",
+            'metrics': {},
+            'ttft_s': None,
+            'tokens_per_s': None,
+            'started_at': time.time(),
+        }
+        if not model:
+            result['status'] = 'error'
+            result['error'] = "No model given (use --model or a 'model' field)"
+            return result
+
+        images = load_images(settings.get('images'), self.base_dir)
+        common = dict(
+            host=host['hostname'],
+            model=model,
+            options=settings.get('options') or None,
+            thinking=settings.get('think'),
+            logprobs=bool(settings.get('logprobs', False)),
+            top_logprobs=settings.get('top_logprobs'),
+            images=images
+        )
+        if 'messages' in record or settings.get('endpoint') == 'chat':
+            result['endpoint'] = 'chat'
+            messages = list(record.get('messages') or [{"role": "user", "content": settings.get('prompt', '')}])
+            if settings.get('system') and not any(m.get('role') == 'system' for m in messages):
+                messages.insert(0, {"role": "system", "content": settings['system']})
+            stream = ollama.chat(messages=messages, **common)
+        else:
+            result['endpoint'] = 'generate'
+            stream = ollama.generate(prompt=settings.get('prompt', ''), system=settings.get('system'), **common)
+
+        response_parts: List[str] = []
+        thinking_parts: List[str] = []
+        sent_at = time.monotonic()
+        try:
+            for chunk in stream:
+                if 'error' in chunk:
+                    result['status'] = 'error'
+                    result['error'] = chunk['error']
+                    break
+                message = chunk.get('message', {})
+                thinking = chunk.get('thinking') or message.get('thinking', '')
+                content = chunk.get('response') or message.get('content', '')
+                if (thinking or content) and result['ttft_s'] is None:
+                    result['ttft_s'] = time.monotonic() - sent_at
+                if thinking:
+                    thinking_parts.append(thinking)
+                if content:
+                    response_parts.append(content)
+                if chunk.get('done', False):
+                    result['metrics'] = final_counters(chunk)
+                    result['tokens_per_s'] = tokens_per_second(chunk)
+                    self._record_metric(host, model, result['endpoint'], common['options'], chunk, result['ttft_s'])
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+
+        if result['status'] == 'ok' and not result['metrics']:
+            result['status'] = 'error'
+            result['error'] = "Stream ended before the final chunk"
+        result['response'] = "".join(response_parts)
+        result['thinking'] = "".join(thinking_parts)
+        result['finished_at'] = time.time()
+        return result
+
+    def _record_metric(self, host: Dict[str, Any], model: str, endpoint: str,
+                       options: Optional[Dict[str, Any]], chunk: Dict[str, Any], ttft_s: Optional[float]) -> None:
+        """Adds the run to the app's performance history."""
+        if not self.db:
+            return
+        try:
+            self.db.add_generation_metric(build_metric(host['hostname'], model, endpoint, options, chunk, ttft_s))
+        except Exception as e:
+            print(f"Error saving generation metrics: {e}", file=sys.stderr)
+
+    def run(self) -> int:
+        threads = [threading.Thread(target=self._worker, args=(host,), daemon=True) for host in self.slots]
+        for t in threads:
+            t.start()
+        for t in threads:
+            while t.is_alive():
+                t.join(0.5)
+        return 1 if self.failed else 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='gnollama batch', description="Run prompts from a JSONL file without the GUI.")
+    parser.add_argument('input', help="JSONL file; each line has 'prompt' or 'messages' plus optional "
+                                      "'id', 'model', 'host', 'system', 'options', 'think', 'images'")
+    parser.add_argument('-o', '--output', required=True, help="JSONL file results are appended to")
+    parser.add_argument('--host', action='append', default=[],
+                        help="Host name, ID or URL to use (repeatable); defaults to the default host")
+    parser.add_argument('--all-hosts', action='store_true', help="Spread prompts over every configured host")
+    parser.add_argument('--model', help="Model to use when a record does not name one")
+    parser.add_argument('--endpoint', choices=['generate', 'chat'], default='generate')
+    parser.add_argument('--chat', metavar='CHAT_ID', help="Use the model, host, system prompt and options of a saved chat")
+    parser.add_argument('-j', '--concurrency', type=int, default=4, help="Maximum requests in flight overall")
+    parser.add_argument('--per-host', type=int, default=1,
+                        help="Requests in flight per host when the host has no parallel limit configured")
+    parser.add_argument('--db', default=default_db_path(), help="Path to gnollama.db")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if not os.path.exists(args.db):
+        print(f"Database not found: {args.db}", file=sys.stderr)
+        return 2
+    db = DatabaseManager(args.db)
+    configured = db.get_all_hosts()
+
+    defaults: Dict[str, Any] = {'endpoint': args.endpoint}
+    chat_host = None
+    if args.chat:
+        chat = db.get_chat(args.chat)
+        if not chat:
+            print(f"Chat not found: {args.chat}", file=sys.stderr)
+            return 2
+        options = dict(chat.get('options') or {})
+        defaults['think'] = options.pop('thinking_val', None)
+        defaults['logprobs'] = options.pop('logprobs', False)
+        defaults['top_logprobs'] = options.pop('top_logprobs', None)
+        defaults.update({'model': chat.get('model'), 'system': chat.get('system'), 'options': options})
+        chat_host = chat.get('host')
+    if args.model:
+        defaults['model'] = args.model
+
+    if args.all_hosts:
+        hosts = configured
+    elif args.host:
+        hosts = [resolve_host(configured, key) for key in args.host]
+    else:
+        hosts = [h for h in configured if h['id'] == chat_host] or [h for h in configured if h.get('default')] or configured[:1]
+    if not hosts:
+        print("No hosts configured", file=sys.stderr)
+        return 2
+
+    done = completed_ids(args.output)
+    records = [r for r in load_records(args.input) if str(r['id']) not in done]
+    if done:
+        print(f"Resuming: {len(done)} prompt(s) already completed", file=sys.stderr)
+
+    with open_output(args.output) as out:
+        runner = BatchRunner(hosts, defaults, out, max(args.concurrency, 1), max(args.per_host, 1),
+                             os.path.dirname(os.path.abspath(args.input)), db=db)
+        for record in records:
+            runner.add(record)
+        try:
+            return runner.run()
+        except KeyboardInterrupt:
+            print("Interrupted; run again with the same arguments to resume", file=sys.stderr)
+            return 130
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,27 @@
-import base64
-from typing import List, Optional, Any, Dict
+import bisect
+import math
+from array import array
+from typing import List, Optional, Any, Dict, Callable
 from gi.repository import Gtk, GObject, Pango, GLib, Gdk
 from .markdown_view import MarkdownView
+from .images import BUBBLE_THUMBNAIL_SIZE, show_thumbnail, thumbnail_picture, thumbnails
+from .instrumentation import StreamTimings, histogram_labels
+from .logprobs import LogprobTrace
+
+# Heatmap shading by token probability: (lower bound, tag); confident tokens stay unshaded
+HEATMAP_BUCKETS = [(0.9, None), (0.6, "logprob-medium"), (0.3, "logprob-low"), (0.0, "logprob-very-low")]
+HEATMAP_TAGS = [
+    ("logprob-medium", "rgba(246, 211, 45, 0.3)"),
+    ("logprob-low", "rgba(255, 120, 0, 0.35)"),
+    ("logprob-very-low", "rgba(224, 27, 36, 0.4)"),
+]
+
+def heatmap_tag(probability: float) -> Optional[str]:
+    """Returns the text tag that shades a token of the given probability."""
+    for bound, tag in HEATMAP_BUCKETS:
+        if probability >= bound:
+            return tag
+    return HEATMAP_BUCKETS[-1][1]
 
 @Gtk.Template(resource_path='/io/github/jackrabbithanna/Gnollama/user_bubble.ui')
 class UserBubble(Gtk.ListBoxRow):
@@ -11,31 +31,24 @@ class UserBubble(Gtk.ListBoxRow):
     images_box: Gtk.Box = Gtk.Template.Child()
     label: Gtk.Label = Gtk.Template.Child()
 
-    def __init__(self, text: str, images: Optional[List[str]] = None, **kwargs: Any) -> None:
+    def __init__(self, text: str, images: Optional[List[str]] = None,
+                 image_paths: Optional[List[str]] = None, **kwargs: Any) -> None:
         super().__init__(**kwargs)
         self.init_template()
         self.label.set_text(text)
-        
-        if images:
-            self.images_box.set_visible(True)
-            for img_b64 in images:
-                try:
-                    start_idx = 0
-                    if "," in img_b64:
-                        start_idx = img_b64.find(",") + 1
-                    
-                    img_data = base64.b64decode(img_b64[start_idx:])
-                    bytes_data = GLib.Bytes.new(img_data)
-                    texture = Gdk.Texture.new_from_bytes(bytes_data)
-                    
-                    picture = Gtk.Picture.new_for_paintable(texture)
-                    picture.set_content_fit(Gtk.ContentFit.SCALE_DOWN)
-                    picture.set_size_request(200, 200)
-                    picture.set_can_shrink(True)
-                    
-                    self.images_box.append(picture)
-                except Exception as e:
-                    print(f"Failed to load image in bubble: {e}")
+
+        # Decoded and downscaled on the images lane; placeholders until then
+        for img_b64 in images or []:
+            thumbnails.load_base64(img_b64, BUBBLE_THUMBNAIL_SIZE, self._add_picture())
+        for path in image_paths or []:
+            thumbnails.load_file(path, BUBBLE_THUMBNAIL_SIZE, self._add_picture())
+
+    def _add_picture(self) -> Callable[[Gdk.Texture], None]:
+        """Appends a placeholder picture and returns the callback that fills it in."""
+        self.images_box.set_visible(True)
+        picture = thumbnail_picture(200, 200)
+        self.images_box.append(picture)
+        return lambda texture: show_thumbnail(picture, texture)
 
 @Gtk.Template(resource_path='/io/github/jackrabbithanna/Gnollama/ai_bubble.ui')
 class AiBubble(Gtk.ListBoxRow):
@@ -44,14 +57,16 @@ class AiBubble(Gtk.ListBoxRow):
 
     bubble_box: Gtk.Box = Gtk.Template.Child()
     header: Gtk.Label = Gtk.Template.Child()
+    status_label: Gtk.Label = Gtk.Template.Child()
     api_expander: Gtk.Expander = Gtk.Template.Child()
     thinking_expander: Gtk.Expander = Gtk.Template.Child()
-    thinking_label: Gtk.Label = Gtk.Template.Child()
+    thinking_view: Gtk.TextView = Gtk.Template.Child()
 
     def __init__(self, model_name: Optional[str] = None, **kwargs: Any) -> None:
         super().__init__(**kwargs)
         self.init_template()
         
+        self.model_name = model_name
         if model_name:
             self.header.set_visible(True)
             self.header.set_label(f"Ollama ({model_name})")
@@ -63,8 +78,39 @@ class AiBubble(Gtk.ListBoxRow):
         self.bubble_box.append(self.markdown_view)
         
         self.full_text: str = ""
-        self.thinking_text: str = ""
         self._update_scheduled: bool = False
+        self._update_source: int = 0
+        # Thinking chunks not yet in the text buffer
+        self._thinking_pending: List[str] = []
+        self._thinking_tick: int = 0
+        self.thinking_expander.connect("notify::expanded", self._on_thinking_expanded)
+        # Logprobs heatmap, created when the first logprobs arrive
+        self.logprobs_trace: Optional[LogprobTrace] = None
+        self.logprobs_expander: Optional[Gtk.Expander] = None
+        self.logprobs_view: Optional[Gtk.TextView] = None
+        self._logprob_offsets = array('I')
+        self._logprobs_tick: int = 0
+        # Client-side stream timings, set by the tab that owns the request
+        self.timings: Optional[StreamTimings] = None
+
+    def set_queue_position(self, position: Optional[int]) -> None:
+        """Shows the request's place in the client-side host queue, or hides it when None."""
+        if position is None:
+            self.status_label.set_visible(False)
+            return
+        self.status_label.set_label(_("Waiting for host: position {0} in queue").format(position))
+        self.status_label.set_visible(True)
+
+    def set_cached(self) -> None:
+        """Marks the response as replayed from the response cache rather than generated."""
+        self.status_label.set_label(_("Replayed from the response cache"))
+        self.status_label.set_visible(True)
+
+    def set_host_name(self, host_name: str) -> None:
+        """Shows which host answered when the request was routed away from the selected one."""
+        if self.model_name:
+            self.header.set_visible(True)
+            self.header.set_label(f"Ollama ({self.model_name}) — {host_name}")
 
     def set_api_details(self, details_dict: Dict[str, Any]) -> None:
         """Displays the raw API request details in an expander."""
@@ -80,24 +126,62 @@ class AiBubble(Gtk.ListBoxRow):
         
         if not self._update_scheduled:
             self._update_scheduled = True
-            GLib.timeout_add(50, self._flush_update)
+            self._update_source = GLib.timeout_add(50, self._flush_update)
             
     def _flush_update(self) -> bool:
         """Flushes the accumulated text to the MarkdownView."""
         self.markdown_view.update(self.full_text)
         self._update_scheduled = False
+        self._update_source = 0
+        if self.timings:
+            self.timings.mark_render()
         return False
+
+    def flush(self) -> None:
+        """Renders any text still waiting for the next scheduled flush."""
+        if self._update_scheduled:
+            GLib.source_remove(self._update_source)
+            self._flush_update()
         
     def append_thinking(self, text: str) -> None:
-        """Appends text to the thinking section."""
+        """Appends text to the thinking section.
+
+        Chunks are queued and appended to the text buffer once per frame, and
+        only while the expander is open; a collapsed section catches up when
+        it is expanded.
+        """
         if not self.thinking_expander.get_visible():
             self.thinking_expander.set_visible(True)
-        
-        self.thinking_text += text
-        self.thinking_label.set_label(self.thinking_text)
 
-    def show_stats(self, stats: Dict[str, Any]) -> None:
-        """Displays generation performance statistics."""
+        self._thinking_pending.append(text)
+        self._schedule_thinking_flush()
+
+    def _schedule_thinking_flush(self) -> None:
+        if self._thinking_tick or not self._thinking_pending:
+            return
+        if self.thinking_expander.get_expanded():
+            self._thinking_tick = self.thinking_view.add_tick_callback(self._flush_thinking)
+
+    def _flush_thinking(self, widget: Gtk.Widget, frame_clock: Gdk.FrameClock) -> bool:
+        """Appends the queued thinking chunks to the end of the buffer."""
+        self._thinking_tick = 0
+        if self._thinking_pending:
+            buffer = self.thinking_view.get_buffer()
+            buffer.insert(buffer.get_end_iter(), "".join(self._thinking_pending))
+            self._thinking_pending.clear()
+            if self.timings:
+                self.timings.mark_render()
+        return GLib.SOURCE_REMOVE
+
+    def _on_thinking_expanded(self, expander: Gtk.Expander, pspec: GObject.ParamSpec) -> None:
+        if expander.get_expanded():
+            self._schedule_thinking_flush()
+        elif self._thinking_tick:
+            self.thinking_view.remove_tick_callback(self._thinking_tick)
+            self._thinking_tick = 0
+
+    def show_stats(self, stats: Dict[str, Any], client: Optional[Dict[str, Any]] = None) -> None:
+        """Displays generation performance statistics, plus client-side timings when given."""
         total_duration = stats.get('total_duration', 0) / 1e9
         load_duration = stats.get('load_duration', 0) / 1e9
         prompt_eval_count = stats.get('prompt_eval_count', 0)
@@ -117,49 +201,138 @@ class AiBubble(Gtk.ListBoxRow):
         label.add_css_class("dim-label")
         self.bubble_box.append(label)
 
-    def append_logprobs(self, logprobs_data: Any) -> None:
-        """Appends logprobs data to a text view in an expander."""
-        if not hasattr(self, 'active_logprobs_label') or self.active_logprobs_label is None:
-            # Create expander for logprobs
-            expander = Gtk.Expander(label=_("Logprobs"))
-            expander.set_hexpand(True)
-            expander.set_halign(Gtk.Align.FILL)
-            
-            # Use ScrolledWindow + TextView for performance with large data
-            scrolled = Gtk.ScrolledWindow()
-            scrolled.set_min_content_height(150)
-            scrolled.set_propagate_natural_height(True)
-            
-            text_view = Gtk.TextView()
-            text_view.set_wrap_mode(Gtk.WrapMode.WORD_CHAR)
-            text_view.set_editable(False)
-            text_view.set_monospace(True)
-            text_view.set_bottom_margin(6)
-            text_view.set_top_margin(6)
-            text_view.set_left_margin(6)
-            text_view.set_right_margin(6)
-            
-            scrolled.set_child(text_view)
-            expander.set_child(scrolled)
-            self.bubble_box.append(expander)
-            
-            self.active_logprobs_label = text_view # Reusing variable name for TextView
+        if client:
+            self._show_client_timings(client)
 
-        buffer = self.active_logprobs_label.get_buffer()
-        end_iter = buffer.get_end_iter()
-        
-        # Format logprobs data compactly
-        text_chunk = ""
-        import json
-        if isinstance(logprobs_data, list):
-            for item in logprobs_data:
-                if isinstance(item, dict):
-                    token = item.get('token', '')
-                    logprob = item.get('logprob', 0.0)
-                    text_chunk += f"Token: {repr(token):<15} Logprob: {logprob:.4f}\n"
-                else:
-                    text_chunk += str(item) + "\n"
+    def _show_client_timings(self, client: Dict[str, Any]) -> None:
+        """Shows TTFT, inter-token gaps and render lag measured in the app."""
+        def ms(value: Optional[float]) -> str:
+            return f"{value:.0f}ms" if value is not None else "–"
+
+        parts = [
+            f"TTFT: {ms(client['ttft_ms'])} (first byte {ms(client['first_byte_ms'])})",
+            f"Token gap p50/p95: {ms(client['gap_p50_ms'])}/{ms(client['gap_p95_ms'])}, jitter {ms(client['jitter_ms'])}",
+            f"Render lag p50/p95: {ms(client['render_lag_p50_ms'])}/{ms(client['render_lag_p95_ms'])}",
+        ]
+        if client.get('malformed_lines'):
+            parts.append(_("{0} malformed lines skipped").format(client['malformed_lines']))
+        label = Gtk.Label(label=" | ".join(parts))
+        label.set_xalign(0)
+        label.set_halign(Gtk.Align.START)
+        label.set_wrap(True)
+        label.add_css_class("dim-label")
+
+        histogram = client['gap_histogram']
+        peak = max(histogram) if histogram else 0
+        rows = [_("Inter-token gaps")]
+        for bucket, count in zip(histogram_labels(), histogram):
+            bar = "█" * round(20 * count / peak) if peak else ""
+            rows.append(f"{bucket:>12}  {bar} {count}")
+        label.set_tooltip_markup(f"<tt>{GLib.markup_escape_text(chr(10).join(rows))}</tt>")
+        self.bubble_box.append(label)
+
+    def update_logprobs(self, trace: LogprobTrace) -> None:
+        """Shows the logprobs of the response as a token heatmap in an expander.
+
+        Called whenever the trace grows. Tokens are only rendered while the
+        expander is open, appending whatever arrived since the last frame.
+        """
+        if self.logprobs_expander is None:
+            self.logprobs_trace = trace
+            self.logprobs_expander = Gtk.Expander(label=_("Logprobs"))
+            self.logprobs_expander.set_hexpand(True)
+            self.logprobs_expander.set_halign(Gtk.Align.FILL)
+            self.logprobs_expander.connect("notify::expanded", self._on_logprobs_expanded)
+            self.bubble_box.append(self.logprobs_expander)
+        self._schedule_logprobs_render()
+
+    def _create_logprobs_view(self) -> None:
+        """Builds the heatmap view the first time the expander is opened."""
+        # Use ScrolledWindow + TextView for performance with large data
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.set_min_content_height(150)
+        scrolled.set_max_content_height(400)
+        scrolled.set_propagate_natural_height(True)
+
+        text_view = Gtk.TextView()
+        text_view.set_wrap_mode(Gtk.WrapMode.WORD_CHAR)
+        text_view.set_editable(False)
+        text_view.set_cursor_visible(False)
+        text_view.set_monospace(True)
+        text_view.set_bottom_margin(6)
+        text_view.set_top_margin(6)
+        text_view.set_left_margin(6)
+        text_view.set_right_margin(6)
+        text_view.set_has_tooltip(True)
+        text_view.connect("query-tooltip", self._on_logprobs_tooltip)
+
+        buffer = text_view.get_buffer()
+        for name, color in HEATMAP_TAGS:
+            rgba = Gdk.RGBA()
+            rgba.parse(color)
+            buffer.create_tag(name, background_rgba=rgba)
+
+        scrolled.set_child(text_view)
+        self.logprobs_expander.set_child(scrolled)
+        self.logprobs_view = text_view
+
+    def _schedule_logprobs_render(self) -> None:
+        if self._logprobs_tick or not self.logprobs_expander.get_expanded():
+            return
+        if self.logprobs_view is None:
+            self._create_logprobs_view()
+        if len(self.logprobs_trace) > len(self._logprob_offsets):
+            self._logprobs_tick = self.logprobs_view.add_tick_callback(self._render_logprobs)
+
+    def _render_logprobs(self, widget: Gtk.Widget, frame_clock: Gdk.FrameClock) -> bool:
+        """Appends the tokens not rendered yet, one insert per run of equally shaded tokens."""
+        self._logprobs_tick = 0
+        trace = self.logprobs_trace
+        buffer = self.logprobs_view.get_buffer()
+        offset = buffer.get_char_count()
+        run: List[str] = []
+        run_tag: Optional[str] = None
+        for index in range(len(self._logprob_offsets), len(trace)):
+            token = trace.token(index)
+            tag = heatmap_tag(trace.probability(index))
+            if tag != run_tag and run:
+                self._insert_logprob_run(buffer, "".join(run), run_tag)
+                run = []
+            run_tag = tag
+            run.append(token)
+            self._logprob_offsets.append(offset)
+            offset += len(token)
+        if run:
+            self._insert_logprob_run(buffer, "".join(run), run_tag)
+        return GLib.SOURCE_REMOVE
+
+    @staticmethod
+    def _insert_logprob_run(buffer: Gtk.TextBuffer, text: str, tag: Optional[str]) -> None:
+        if tag:
+            buffer.insert_with_tags_by_name(buffer.get_end_iter(), text, tag)
         else:
-             text_chunk = json.dumps(logprobs_data) + "\n"
-             
-        buffer.insert(end_iter, text_chunk)
+            buffer.insert(buffer.get_end_iter(), text)
+
+    def _on_logprobs_expanded(self, expander: Gtk.Expander, pspec: GObject.ParamSpec) -> None:
+        if expander.get_expanded():
+            self._schedule_logprobs_render()
+        elif self._logprobs_tick:
+            self.logprobs_view.remove_tick_callback(self._logprobs_tick)
+            self._logprobs_tick = 0
+
+    def _on_logprobs_tooltip(self, view: Gtk.TextView, x: int, y: int, keyboard_mode: bool,
+                             tooltip: Gtk.Tooltip) -> bool:
+        """Shows the probability and the top alternatives of the token under the pointer."""
+        bx, by = view.window_to_buffer_coords(Gtk.TextWindowType.WIDGET, x, y)
+        found, text_iter = view.get_iter_at_location(bx, by)
+        if not found or not self._logprob_offsets:
+            return False
+        index = bisect.bisect_right(self._logprob_offsets, text_iter.get_offset()) - 1
+        if index < 0:
+            return False
+        trace = self.logprobs_trace
+        lines = [f"{trace.token(index)!r}  p={trace.probability(index):.3f}  ({trace.logprobs[index]:.3f})"]
+        for token, logprob in trace.alternatives(index):
+            lines.append(f"  {token!r}  p={math.exp(logprob):.3f}")
+        tooltip.set_text("\n".join(lines))
+        return True
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from . import ollama
+from .database import DatabaseManager
+from .vector_index import VectorIndex
+
+# Texts sent per request to the Embed API
+EMBED_BATCH = 32
+# Messages read from the database and appended to the index per step
+INDEX_STEP = 256
+# Longest message prefix embedded; the model truncates longer inputs anyway
+MAX_CHARS = 8000
+# An index file is compacted when fewer than this fraction of its rows are referenced
+COMPACT_RATIO = 0.5
+
+class ChatIndex:
+    """
+    Embeds chat messages in the background and searches them by meaning.
+
+    Every embedding model has its own VectorIndex file under vectors/ next to
+    the database; the message_embeddings table maps its rows back to messages.
+    Saving a chat queues that chat for indexing and configure() queues a
+    backfill of all messages, run one at a time on the background lane.
+    """
+
+    def __init__(self, db: DatabaseManager, storage_dir: str) -> None:
+        self.db = db
+        self.vectors_dir = os.path.join(storage_dir, "vectors")
+        self.host: Optional[str] = None
+        self.model: str = ""
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._lock = threading.Lock()
+        # Held while an index file is rewritten and its rows renumbered, so a
+        # search never reads new rows against the old mapping
+        self._rows_lock = threading.Lock()
+        # Chats waiting to be indexed; None stands for all of them
+        self._queued: Set[Optional[str]] = set()
+        self._running = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.host and self.model)
+
+    def configure(self, host: Optional[str], model: str) -> None:
+        """Sets the host and embedding model (empty to disable) and backfills the index."""
+        self.host, self.model = host, model
+        self.schedule_update()
+
+    def schedule_update(self, chat_id: Optional[str] = None) -> None:
+        """Queues embedding the new and edited messages of a chat, or of every chat."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._queued.add(chat_id)
+            if self._running:
+                return
+            self._running = True
+
+        from .session import worker
+        from .scheduler import LANE_BACKGROUND, PRIORITY_LOW
+        worker.schedule(LANE_BACKGROUND, self._run, priority=PRIORITY_LOW)
+
+    def _run(self) -> None:
+        """Drains the queue; a single run at a time keeps appends and compaction ordered."""
+        while True:
+            with self._lock:
+                if not self._queued:
+                    self._running = False
+                    return
+                chat_ids = [None] if None in self._queued else list(self._queued)
+                self._queued.clear()
+            host, model = self.host, self.model
+            if not host or not model:
+                continue
+            try:
+                for chat_id in chat_ids:
+                    count = self.update(host, model, chat_id)
+                    if count and chat_id is None:
+                        print(f"Embedded {count} messages with {model}")
+            except Exception as e:
+                print(f"Error embedding chat messages: {e}")
+
+    def _index(self, model: str) -> VectorIndex:
+        with self._lock:
+            index = self._indexes.get(model)
+            if index is None:
+                digest = hashlib.sha1(model.encode('utf-8')).hexdigest()[:8]
+                slug = re.sub(r'[^A-Za-z0-9._-]+', '_', model)
+                index = VectorIndex(os.path.join(self.vectors_dir, f"{slug}-{digest}.f32"))
+                rows = self.db.get_embedding_rows(model)
+                if rows and rows[-1] >= len(index):
+                    print(f"Vector index for {model} is incomplete, embedding all messages again")
+                    self.db.delete_embeddings(model)
+                self._indexes[model] = index
+            return index
+
+    def _reset(self, model: str) -> VectorIndex:
+        """Drops the index of a model whose embeddings changed dimension."""
+        with self._lock:
+            index = self._indexes.pop(model, None)
+        if index is not None:
+            index.close()
+            os.remove(index.path)
+        self.db.delete_embeddings(model)
+        return self._index(model)
+
+    def _compact(self, model: str, index: VectorIndex) -> None:
+        """Rewrites the index without rows of deleted or re-embedded messages."""
+        with self._rows_lock:
+            rows = self.db.get_embedding_rows(model)
+            if len(rows) < len(index) * COMPACT_RATIO:
+                index.compact(rows)
+                self.db.renumber_embeddings(model, rows)
+
+    def update(self, host: str, model: str, chat_id: Optional[str] = None) -> int:
+        """Embeds the messages that have no current embedding and returns how many there were."""
+        index = self._index(model)
+        if chat_id is None:
+            self._compact(model, index)
+
+        total = 0
+        while True:
+            pending = self.db.get_unembedded_messages(model, chat_id, INDEX_STEP)
+            if not pending:
+                break
+            texts = [msg["content"][:MAX_CHARS] for msg in pending]
+            vectors = ollama.embed(host, model, texts, batch_size=EMBED_BATCH)
+            try:
+                first = index.append(vectors)
+            except ValueError as e:
+                print(f"Embeddings of {model} changed ({e}), rebuilding its index")
+                index = self._reset(model)
+                first = index.append(vectors)
+            self.db.add_message_embeddings(model, [
+                dict(msg, row=first + i) for i, msg in enumerate(pending)
+            ])
+            total += len(pending)
+            if len(pending) < INDEX_STEP:
+                break
+        return total
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Returns the messages closest in meaning to query, best first, each with
+        chat_id, order_index, role, content, title, updated_at and score.
+        Embeds the query, so call it off the main thread.
+        """
+        host, model = self.host, self.model
+        if not host or not model or not query.strip():
+            return []
+        vector = ollama.embed(host, model, [query])[0]
+        # Fetch extra rows, since some belong to deleted or edited messages
+        with self._rows_lock:
+            hits = self._index(model).search(vector, limit * 3)
+            messages = self.db.get_embedded_messages(model, [row for row, _score in hits])
+        results = []
+        for row, score in hits:
+            msg = messages.get(row)
+            if msg is not None:
+                results.append(dict(msg, score=score))
+                if len(results) == limit:
+                    break
+        return results
@@ -0,0 +1,91 @@
+from typing import Any, Callable, Dict, List
+from gi.repository import Adw, Gtk, GLib
+from .storage import ChatStorage
+
+# Characters of the matching message shown under the chat title
+SNIPPET_LENGTH = 160
+
+def snippet(content: str) -> str:
+    text = " ".join(content.split())
+    if len(text) > SNIPPET_LENGTH:
+        text = text[:SNIPPET_LENGTH].rstrip() + "…"
+    return text
+
+@Gtk.Template(resource_path='/io/github/jackrabbithanna/Gnollama/chat_search.ui')
+class ChatSearchWindow(Adw.Window):
+    """Window searching the messages of all chats by meaning, using the embedding index."""
+    __gtype_name__ = 'ChatSearchWindow'
+
+    search_entry: Gtk.SearchEntry = Gtk.Template.Child()
+    status_label: Gtk.Label = Gtk.Template.Child()
+    results_list: Gtk.ListBox = Gtk.Template.Child()
+
+    def __init__(self, storage: ChatStorage, on_open_chat: Callable[[str], None], **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.storage: ChatStorage = storage
+        self.on_open_chat = on_open_chat
+        self.rows: List[Gtk.Widget] = []
+        # Incremented per query so results of superseded queries are dropped
+        self.generation: int = 0
+
+        self.search_entry.connect("search-changed", self.on_search_changed)
+        self.search_entry.connect("activate", self.on_search_changed)
+        if not self.storage.chat_index.enabled:
+            self.search_entry.set_sensitive(False)
+            self.status_label.set_label(
+                _("Set an embedding model to search chats: gsettings set io.github.jackrabbithanna.Gnollama embedding-model nomic-embed-text")
+            )
+
+    def on_search_changed(self, entry: Gtk.SearchEntry) -> None:
+        """Embeds the query and searches the index in the background."""
+        self.generation += 1
+        generation = self.generation
+        query = entry.get_text().strip()
+        if not query:
+            self.populate(generation, [])
+            self.status_label.set_label("")
+            return
+        self.status_label.set_label(_("Searching..."))
+
+        def thread_func() -> None:
+            try:
+                results = self.storage.chat_index.search(query)
+                GLib.idle_add(self.populate, generation, results)
+            except Exception as e:
+                print(f"Error searching chats: {e}")
+                GLib.idle_add(self.show_error, generation, str(e))
+
+        from .session import worker
+        from .scheduler import LANE_METADATA
+        worker.schedule(LANE_METADATA, thread_func)
+
+    def show_error(self, generation: int, message: str) -> bool:
+        if generation == self.generation:
+            self.status_label.set_label(_("Search failed: {0}").format(message))
+        return False
+
+    def populate(self, generation: int, results: List[Dict[str, Any]]) -> bool:
+        if generation != self.generation:
+            return False
+        for row in self.rows:
+            self.results_list.remove(row)
+        self.rows.clear()
+
+        if self.search_entry.get_text().strip():
+            self.status_label.set_label(
+                _("{0} matching messages").format(len(results)) if results else _("No matching messages")
+            )
+        for result in results:
+            row = Adw.ActionRow()
+            row.set_title(GLib.markup_escape_text(result['title']))
+            row.set_subtitle(GLib.markup_escape_text(snippet(result['content'])))
+            row.set_subtitle_lines(2)
+            score = Gtk.Label(label=f"{result['score']:.2f}")
+            score.add_css_class("dim-label")
+            score.set_tooltip_text(_("Similarity"))
+            row.add_suffix(score)
+            row.set_activatable(True)
+            row.connect("activated", lambda r, chat_id=result['chat_id']: self.on_open_chat(chat_id))
+            self.results_list.append(row)
+            self.rows.append(row)
+        return False
@@ -0,0 +1,168 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import ollama
+from .database import DatabaseManager
+from .summarizer import host_idle
+from .tokens import DEFAULT_NUM_CTX, TokenCounter
+
+# Share of the context window the summary and uncompacted messages may fill before compacting
+COMPACT_SHARE = 0.5
+# Share of the context window of recent messages kept word for word
+RECENT_SHARE = 0.25
+# Messages always kept word for word: the last two turns
+MIN_RECENT = 4
+# Share of the context window of old messages folded into the summary per request
+FOLD_SHARE = 0.5
+# Longest summary, as a share of the context window
+SUMMARY_SHARE = 0.125
+# Seconds to wait before checking again while the host is generating
+IDLE_RETRY_S = 5.0
+
+SYSTEM_PROMPT = (
+    "You maintain the summary of a long conversation between a user and an assistant, "
+    "which replaces its oldest messages so the conversation can go on. Keep the facts, "
+    "names, numbers, code, decisions, preferences and open questions needed to continue; "
+    "drop greetings and repetition. Write in the third person, as plain text."
+)
+
+SUMMARY_TEMPLATE = "Summary of the earlier conversation, whose messages are no longer shown:\n\n{summary}"
+
+def summary_message(summary: str) -> Dict[str, str]:
+    """The synthetic message sent in place of the compacted messages."""
+    return {"role": "system", "content": SUMMARY_TEMPLATE.format(summary=summary)}
+
+def context_size(options: Optional[Dict[str, Any]]) -> int:
+    return (options or {}).get('num_ctx') or DEFAULT_NUM_CTX
+
+def recent_start(messages: List[Dict[str, Any]], budget: int, count: Callable[[str], int]) -> int:
+    """
+    Index of the first message kept word for word: the newest messages that fit
+    in budget tokens, at least MIN_RECENT of them, starting with a user message.
+    """
+    start = len(messages)
+    used = 0
+    while start > 0:
+        tokens = count(messages[start - 1]["content"] or "")
+        if len(messages) - start >= MIN_RECENT and used + tokens > budget:
+            break
+        used += tokens
+        start -= 1
+    # Never separate a reply from its prompt
+    while 0 < start < len(messages) and messages[start]["role"] != "user":
+        start -= 1
+    return start
+
+class ConversationCompactor:
+    """
+    Folds the oldest messages of long chats into a summary, in the background.
+
+    After a chat is saved, if its summary and uncompacted messages fill more
+    than COMPACT_SHARE of the context window, the messages before the recent
+    ones are folded into the summary with the chat's own model, FOLD_SHARE of
+    the window at a time. The messages stay in the database; ChatStrategy
+    sends the summary in their place, so prompts stay bounded however long
+    the chat grows. Runs on the background lane and waits while the host is generating.
+    """
+
+    def __init__(self, db: DatabaseManager, tokens: TokenCounter) -> None:
+        self.db = db
+        self.tokens = tokens
+        self._lock = threading.Lock()
+        # Chats with a run queued or in progress, and the latest settings to use
+        self._pending: Dict[str, Tuple[str, str, Optional[Dict[str, Any]]]] = {}
+        self._requested: Dict[str, bool] = {}
+
+    def schedule(self, chat_id: str, host_id: Optional[str], model: Optional[str],
+                 options: Optional[Dict[str, Any]]) -> None:
+        """Requests a compaction check of a chat; called after every save."""
+        host = self.db.get_host(host_id) if host_id else None
+        if not host or not model:
+            return
+        with self._lock:
+            running = chat_id in self._pending
+            self._pending[chat_id] = (host['hostname'], model, options)
+            self._requested[chat_id] = True
+            if running:
+                return
+        self._start(chat_id)
+
+    def _start(self, chat_id: str) -> None:
+        from .session import worker
+        from .scheduler import LANE_BACKGROUND, PRIORITY_LOW
+        worker.schedule(LANE_BACKGROUND, self._run, chat_id, priority=PRIORITY_LOW, host=self._pending[chat_id][0])
+
+    def _run(self, chat_id: str) -> None:
+        while True:
+            with self._lock:
+                self._requested[chat_id] = False
+                host, model, options = self._pending[chat_id]
+            if not host_idle(host):
+                # Check back later instead of holding the background worker
+                timer = threading.Timer(IDLE_RETRY_S, self._start, (chat_id,))
+                timer.daemon = True
+                timer.start()
+                return
+            try:
+                compacted = self.step(chat_id, host, model, options)
+            except Exception as e:
+                print(f"Error compacting chat {chat_id}: {e}")
+                compacted = False
+            if not compacted:
+                with self._lock:
+                    if not self._requested[chat_id]:
+                        del self._pending[chat_id]
+                        del self._requested[chat_id]
+                        return
+
+    def step(self, chat_id: str, host: str, model: str, options: Optional[Dict[str, Any]]) -> bool:
+        """Folds one batch of old messages into the summary. Returns False when the chat is short enough."""
+        summary, count = self.db.get_chat_compaction(chat_id)
+        messages = self.db.get_message_texts(chat_id, count)
+        num_ctx = context_size(options)
+        tokens = lambda text: self.tokens.estimate(model, text)
+        total = tokens(summary or "") + sum(tokens(m["content"] or "") for m in messages)
+        if total <= num_ctx * COMPACT_SHARE:
+            return False
+
+        start = recent_start(messages, int(num_ctx * RECENT_SHARE), tokens)
+        fold: List[Dict[str, Any]] = []
+        budget = int(num_ctx * FOLD_SHARE * self.tokens.chars_per_token(model))
+        for msg in messages[:start]:
+            content = msg["content"] or ""
+            if fold and len(content) > budget:
+                break
+            fold.append(dict(msg, content=content[:budget]))
+            budget -= len(fold[-1]["content"])
+        if len(fold) < start:
+            # Stop at the end of a turn, so what is sent after the summary starts with a prompt
+            while len(fold) > 1 and fold[-1]["role"] != "assistant":
+                fold.pop()
+        if not fold:
+            return False
+
+        summary = self.fold(host, model, summary, fold, options)
+        if not summary:
+            return False
+        return self.db.update_chat_compaction(chat_id, summary, fold[-1]["order_index"] + 1, count)
+
+    def fold(self, host: str, model: str, summary: Optional[str], messages: List[Dict[str, Any]],
+             options: Optional[Dict[str, Any]]) -> str:
+        """Returns the summary updated with the given messages."""
+        lines = []
+        if summary:
+            lines += ["Summary so far:", summary, "", "Messages that follow it:"]
+        else:
+            lines.append("Messages:")
+        for msg in messages:
+            if msg["role"] in ("user", "assistant"):
+                lines.append(f"{msg['role'].capitalize()}: {msg['content']}")
+        lines += ["", "Write the updated summary of the whole conversation so far."]
+
+        num_ctx = context_size(options)
+        generation = {"temperature": 0.2, "num_predict": int(num_ctx * SUMMARY_SHARE)}
+        if (options or {}).get('num_ctx'):
+            # The same context size as the chat, so the model is not reloaded
+            generation["num_ctx"] = num_ctx
+        response = ollama.complete(host, model, "\n".join(lines), system=SYSTEM_PROMPT, options=generation)
+        return response.get("response", "").strip()
@@ -0,0 +1,324 @@
+import time
+from typing import List, Optional, Any, Dict, Callable
+from gi.repository import Gtk, GLib
+from . import ollama
+from .metrics import build_metric, final_counters, tokens_per_second
+from .logprobs import LogprobTrace
+from .storage import ChatStorage
+from .bubbles import AiBubble
+
+from .widgets.chat_input import ChatInput
+from .widgets.options_panel import OptionsPanel
+
+def format_run_stats(result: Dict[str, Any]) -> str:
+    """Formats the per-model numbers shown under a comparison column."""
+    parts = []
+    if result.get('ttft_s') is not None:
+        parts.append(f"TTFT: {result['ttft_s']:.2f}s")
+    if result.get('tokens_per_s') is not None:
+        parts.append(f"{result['tokens_per_s']:.1f} tokens/s")
+    total = result.get('metrics', {}).get('total_duration')
+    if total is not None:
+        parts.append(f"Total: {total / 1e9:.2f}s")
+    return " | ".join(parts)
+
+class CompareColumn(Gtk.Box):
+    """One model/host pair in a comparison run."""
+
+    def __init__(self, hosts: List[Dict[str, Any]], on_remove: Callable[['CompareColumn'], None], **kwargs: Any) -> None:
+        super().__init__(orientation=Gtk.Orientation.VERTICAL, spacing=6, **kwargs)
+        self.set_size_request(320, -1)
+        self.hosts: List[Dict[str, Any]] = hosts
+        self.models: List[str] = []
+
+        header = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        self.host_dropdown = Gtk.DropDown.new_from_strings([h['name'] for h in hosts])
+        self.host_dropdown.set_tooltip_text(_("Ollama Host"))
+        self.model_dropdown = Gtk.DropDown.new_from_strings([])
+        self.model_dropdown.set_hexpand(True)
+        self.model_dropdown.set_tooltip_text(_("Select Model"))
+
+        remove_btn = Gtk.Button.new_from_icon_name("window-close-symbolic")
+        remove_btn.add_css_class("flat")
+        remove_btn.set_tooltip_text(_("Remove Model"))
+        remove_btn.connect("clicked", lambda btn: on_remove(self))
+
+        header.append(self.host_dropdown)
+        header.append(self.model_dropdown)
+        header.append(remove_btn)
+        self.append(header)
+
+        self.stats_label = Gtk.Label()
+        self.stats_label.set_xalign(0)
+        self.stats_label.add_css_class("dim-label")
+        self.append(self.stats_label)
+
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.set_vexpand(True)
+        scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        self.list_box = Gtk.ListBox()
+        self.list_box.set_selection_mode(Gtk.SelectionMode.NONE)
+        self.list_box.add_css_class("content")
+        scrolled.set_child(self.list_box)
+        self.append(scrolled)
+
+        for i, h in enumerate(hosts):
+            if h.get('default', False):
+                self.host_dropdown.set_selected(i)
+                break
+        self.host_dropdown.connect('notify::selected-item', self.on_host_changed)
+        self.on_host_changed()
+
+    def get_host(self) -> Optional[Dict[str, Any]]:
+        idx = self.host_dropdown.get_selected()
+        if idx != Gtk.INVALID_LIST_POSITION and idx < len(self.hosts):
+            return self.hosts[idx]
+        return None
+
+    def get_model(self) -> Optional[str]:
+        item = self.model_dropdown.get_selected_item()
+        return item.get_string() if item else None
+
+    def on_host_changed(self, *args: Any) -> None:
+        host = self.get_host()
+        if not host:
+            return
+
+        def thread_func() -> None:
+            try:
+                models = ollama.fetch_models(host['hostname'])
+            except ollama.OllamaError:
+                models = []
+            GLib.idle_add(self.set_models, models)
+
+        from .session import worker
+        from .scheduler import LANE_METADATA, PRIORITY_HIGH
+        worker.schedule(LANE_METADATA, thread_func, priority=PRIORITY_HIGH)
+
+    def set_models(self, models: List[str]) -> None:
+        self.models = models
+        self.model_dropdown.set_model(Gtk.StringList.new(models))
+
+    def start_run(self) -> AiBubble:
+        """Clears the previous answer and returns the bubble for a new one."""
+        child = self.list_box.get_first_child()
+        while child:
+            next_child = child.get_next_sibling()
+            self.list_box.remove(child)
+            child = next_child
+        self.stats_label.set_label(_("Waiting for host..."))
+        bubble = AiBubble(model_name=self.get_model())
+        self.list_box.append(bubble)
+        return bubble
+
+@Gtk.Template(resource_path='/io/github/jackrabbithanna/Gnollama/compare_tab.ui')
+class CompareTab(Gtk.Box):
+    """Sends the same prompt to several models and/or hosts and streams them side by side."""
+    __gtype_name__ = 'CompareTab'
+
+    columns_box: Gtk.Box = Gtk.Template.Child()
+    add_column_button: Gtk.Button = Gtk.Template.Child()
+    save_button: Gtk.Button = Gtk.Template.Child()
+    summary_label: Gtk.Label = Gtk.Template.Child()
+    chat_input: ChatInput = Gtk.Template.Child()
+    options_panel: OptionsPanel = Gtk.Template.Child()
+
+    def __init__(self, tab_label: Optional[Gtk.Label] = None, storage: Optional[ChatStorage] = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.init_template()
+        self.tab_label = tab_label
+        self.mode = 'compare'
+
+        if not storage:
+            storage = ChatStorage()
+        self.storage = storage
+
+        self.columns: List[CompareColumn] = []
+        self.pending_runs: int = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+        # Host and model are chosen per column
+        self.chat_input.model_dropdown.set_visible(False)
+        self.options_panel.storage = self.storage
+        self.options_panel.update_hosts()
+        self.options_panel.host_dropdown.get_parent().set_visible(False)
+        self.options_panel.overflow_check.set_visible(False)
+        self.options_panel.cache_check.set_visible(False)
+
+        self.add_column_button.connect('clicked', lambda btn: self.add_column())
+        self.save_button.connect('clicked', self.on_save_clicked)
+        self.chat_input.send_button.connect('clicked', self.on_send_clicked)
+        self.chat_input.entry.connect('activate', self.on_send_clicked)
+
+        self.add_column()
+        self.add_column()
+
+    def add_column(self) -> None:
+        column = CompareColumn(self.storage.get_all_hosts(), self.remove_column)
+        self.columns_box.append(column)
+        self.columns.append(column)
+
+    def remove_column(self, column: CompareColumn) -> None:
+        if column in self.columns and len(self.columns) > 1:
+            self.columns.remove(column)
+            self.columns_box.remove(column)
+
+    def on_send_clicked(self, *args: Any) -> None:
+        prompt = self.chat_input.entry.get_text().strip()
+        if not prompt or self.pending_runs:
+            return
+
+        if self.tab_label:
+            truncated = prompt[:20] + "..." if len(prompt) > 20 else prompt
+            self.tab_label.set_label(truncated)
+        self.chat_input.entry.set_text("")
+
+        from .session import worker
+        from .scheduler import LANE_STREAM, LANE_IMAGES
+        from .images import prepare_uploads, upload_options
+
+        # Preprocessed once on the images lane and shared by every column
+        image_upload = None
+        if self.chat_input.selected_image_paths:
+            image_upload = worker.schedule(LANE_IMAGES, prepare_uploads,
+                                           list(self.chat_input.selected_image_paths), upload_options())
+            self.chat_input.on_clear_image_clicked(None)
+
+        logprobs = self.options_panel.logprobs_check.get_active()
+        top_logprobs = None
+        if logprobs:
+            try:
+                top_logprobs = int(self.options_panel.top_logprobs_entry.get_text().strip())
+            except ValueError:
+                pass
+
+        system = self.options_panel.system_prompt_entry.get_text().strip()
+        options = self.options_panel.get_options_from_ui()
+        req_data = {
+            'prompt': prompt,
+            'image_upload': image_upload,
+            'system': system or None,
+            'options': options or None,
+            'thinking': self.chat_input.get_thinking_value(),
+            'logprobs': logprobs,
+            'top_logprobs': top_logprobs,
+        }
+
+        self.last_run = {'prompt': prompt, 'system': system or None, 'options': options or None, 'results': []}
+        self.save_button.set_sensitive(False)
+        self.summary_label.set_label(_("Running..."))
+
+        runs = []
+        for column in self.columns:
+            host = column.get_host()
+            model = column.get_model()
+            if not host or not model:
+                continue
+            bubble = column.start_run()
+            self.pending_runs += 1
+            runs.append((column, bubble, host, model))
+
+        def fan_out(*_args: Any) -> None:
+            for column, bubble, host, model in runs:
+                worker.schedule(LANE_STREAM, self.run_column, column, bubble, host, model, req_data,
+                                host=host['hostname'])
+
+        if image_upload:
+            # Take stream slots only once the images are ready, so no stream worker waits on them
+            image_upload.add_done_callback(fan_out)
+        else:
+            fan_out()
+
+        if not self.pending_runs:
+            self.summary_label.set_label(_("Select a host and model for at least one column."))
+
+    def run_column(self, column: CompareColumn, bubble: AiBubble, host: Dict[str, Any],
+                   model: str, req_data: Dict[str, Any]) -> None:
+        """Streams one model's answer into its column (runs on a worker thread)."""
+        from .session import streams
+        handle = streams.begin()
+        result: Dict[str, Any] = {
+            'host': host['name'],
+            'hostname': host['hostname'],
+            'model': model,
+            'response': "",
+            'thinking': "",
+            'metrics': {},
+            'ttft_s': None,
+            'tokens_per_s': None,
+        }
+        response_parts: List[str] = []
+        thinking_parts: List[str] = []
+        trace = LogprobTrace()
+        GLib.idle_add(column.stats_label.set_label, _("Generating..."))
+        try:
+            # Already resolved when the column is scheduled; raises if preprocessing failed
+            upload = req_data['image_upload']
+            images = upload.result() if upload else None
+            sent_at = time.monotonic()
+            for chunk in ollama.generate(
+                host=host['hostname'],
+                model=model,
+                prompt=req_data['prompt'],
+                system=req_data['system'],
+                options=req_data['options'],
+                thinking=req_data['thinking'],
+                logprobs=req_data['logprobs'],
+                top_logprobs=req_data['top_logprobs'],
+                images=images
+            ):
+                if handle.cancelled:
+                    break
+                if 'error' in chunk:
+                    result['error'] = chunk['error']
+                    error_header = _("Error")
+                    GLib.idle_add(bubble.append_text, f"\n\n### {error_header}\n\n{chunk['error']}")
+                    break
+
+                thinking = chunk.get('thinking', '')
+                content = chunk.get('response', '')
+                if (thinking or content) and result['ttft_s'] is None:
+                    result['ttft_s'] = time.monotonic() - sent_at
+                if thinking:
+                    thinking_parts.append(thinking)
+                    GLib.idle_add(bubble.append_thinking, thinking)
+                if content:
+                    response_parts.append(content)
+                    GLib.idle_add(bubble.append_text, content)
+                if chunk.get('logprobs'):
+                    trace.extend(chunk['logprobs'])
+                    GLib.idle_add(bubble.update_logprobs, trace)
+
+                if chunk.get('done', False):
+                    result['metrics'] = final_counters(chunk)
+                    result['tokens_per_s'] = tokens_per_second(chunk)
+                    self.storage.record_metric(build_metric(
+                        host['hostname'], model, 'generate', req_data['options'], chunk, result['ttft_s']
+                    ))
+        except Exception as e:
+            result['error'] = str(e)
+            conn_err = _("Connection Error")
+            GLib.idle_add(bubble.append_text, f"\n\n### {conn_err}\n\n{str(e)}")
+        finally:
+            streams.end(handle)
+            result['response'] = "".join(response_parts)
+            result['thinking'] = "".join(thinking_parts)
+            GLib.idle_add(self.on_column_finished, column, result)
+
+    def on_column_finished(self, column: CompareColumn, result: Dict[str, Any]) -> None:
+        column.stats_label.set_label(format_run_stats(result) or result.get('error', ''))
+        if self.last_run is not None:
+            self.last_run['results'].append(result)
+        self.pending_runs -= 1
+        if self.pending_runs == 0:
+            done = len(self.last_run['results']) if self.last_run else 0
+            self.summary_label.set_label(_("{0} model(s) finished").format(done))
+            self.save_button.set_sensitive(True)
+
+    def on_save_clicked(self, btn: Gtk.Button) -> None:
+        if not self.last_run or not self.last_run['results']:
+            return
+        run = self.last_run
+        self.storage.save_comparison(run['prompt'], run['system'], run['options'], run['results'])
+        self.save_button.set_sensitive(False)
+        self.summary_label.set_label(_("Comparison saved"))
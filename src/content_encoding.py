@@ -0,0 +1,119 @@
+import urllib.request
+import zlib
+from typing import Any, Optional, Protocol, Union
+
+# zstd comes from the standard library on Python 3.14+, or the zstandard package
+try:
+    from compression import zstd as _zstd_stdlib
+except ImportError:
+    _zstd_stdlib = None
+try:
+    import zstandard as _zstandard
+except ImportError:
+    _zstandard = None
+
+ZSTD_AVAILABLE = _zstd_stdlib is not None or _zstandard is not None
+
+# Offered on every request; a reverse proxy such as nginx may compress any response
+ACCEPT_ENCODING = "zstd, gzip, deflate" if ZSTD_AVAILABLE else "gzip, deflate"
+
+# Bytes requested from the socket per read
+BLOCK_SIZE = 64 * 1024
+
+class Decompressor(Protocol):
+    def decompress(self, data: bytes) -> bytes: ...
+    def flush(self) -> bytes: ...
+
+class _Deflate:
+    """HTTP deflate is meant to be zlib-wrapped, but some servers send raw deflate."""
+
+    def __init__(self) -> None:
+        self._obj: Optional[Any] = None
+
+    def decompress(self, data: bytes) -> bytes:
+        if self._obj is None:
+            # A zlib stream starts with a header whose 16-bit value is a multiple of 31
+            zlib_wrapped = len(data) >= 2 and (data[0] & 0x0F) == 8 and ((data[0] << 8) | data[1]) % 31 == 0
+            self._obj = zlib.decompressobj(zlib.MAX_WBITS if zlib_wrapped else -zlib.MAX_WBITS)
+        return self._obj.decompress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush() if self._obj is not None else b""
+
+class _Zstd:
+    def __init__(self) -> None:
+        if _zstd_stdlib is not None:
+            self._obj = _zstd_stdlib.ZstdDecompressor()
+        else:
+            self._obj = _zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._obj.decompress(data)
+
+    def flush(self) -> bytes:
+        return b""
+
+def decompressor(encoding: str) -> Optional[Decompressor]:
+    """Returns an incremental decompressor for a Content-Encoding, or None for identity."""
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return None
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _Deflate()
+    if encoding == "zstd" and ZSTD_AVAILABLE:
+        return _Zstd()
+    raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+
+class DecodedResponse:
+    """
+    Reads an HTTP response body, decompressing it incrementally as it arrives.
+
+    read1() returns as soon as some decompressed bytes are available, so
+    NDJSON streams keep their latency when a proxy compresses them.
+    """
+
+    def __init__(self, response: Any) -> None:
+        self.response = response
+        self.raw_bytes: int = 0
+        self._decoder = decompressor(response.headers.get('Content-Encoding', ''))
+        self._eof = False
+
+    def read1(self, size: int = BLOCK_SIZE) -> bytes:
+        read = getattr(self.response, 'read1', self.response.read)
+        while not self._eof:
+            block = read(size)
+            self.raw_bytes += len(block)
+            if not block:
+                self._eof = True
+                return self._decoder.flush() if self._decoder else b""
+            if self._decoder is None:
+                return block
+            data = self._decoder.decompress(block)
+            if data:
+                return data
+            # Only compressed framing arrived; an empty result would mean EOF
+        return b""
+
+    def read(self) -> bytes:
+        """Returns the whole decompressed body."""
+        parts = []
+        while True:
+            block = self.read1()
+            if not block:
+                return b"".join(parts)
+            parts.append(block)
+
+def urlopen(req: Union[str, urllib.request.Request], timeout: Optional[float] = None) -> Any:
+    """urllib.request.urlopen that offers compressed responses."""
+    if isinstance(req, str):
+        req = urllib.request.Request(req)
+    req.add_header('Accept-Encoding', ACCEPT_ENCODING)
+    if timeout is None:
+        return urllib.request.urlopen(req)
+    return urllib.request.urlopen(req, timeout=timeout)
+
+def read_body(response: Any) -> bytes:
+    """Reads and decompresses a whole response (or HTTPError) body."""
+    return DecodedResponse(response).read()
@@ -2,7 +2,10 @@ import sqlite3
 import os
 import json
 import base64
-from typing import List, Dict, Any, Optional
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple
+from .logprobs import LogprobTrace
+from .payload import image_bytes
 
 # Sequential migrations list
 # Add future SQL scripts to this array to run sequentially.
@@ -16,9 +19,120 @@ MIGRATIONS: List[str] = [
     # Version 3: Add is_pinned to chats table
     """
     ALTER TABLE chats ADD COLUMN is_pinned INTEGER DEFAULT 0;
+    """,
+    # Version 4: Add optional per-host parallel request limit (NULL = learn it)
+    """
+    ALTER TABLE hosts ADD COLUMN max_parallel INTEGER;
+    """,
+    # Version 5: Add comparisons table for multi-model comparison runs
+    """
+    CREATE TABLE IF NOT EXISTS comparisons (
+        id TEXT PRIMARY KEY,
+        prompt TEXT NOT NULL,
+        system_prompt TEXT,
+        options TEXT,
+        created_at REAL NOT NULL,
+        results TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_comparisons_created_at ON comparisons(created_at);
+    """,
+    # Version 6: Add per-request generation metrics
+    """
+    CREATE TABLE IF NOT EXISTS generation_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at REAL NOT NULL,
+        host TEXT NOT NULL,
+        model TEXT NOT NULL,
+        endpoint TEXT,
+        chat_id TEXT,
+        options TEXT,
+        ttft_ms REAL,
+        tokens_per_s REAL,
+        load_ms REAL,
+        total_ms REAL,
+        prompt_eval_count INTEGER,
+        prompt_eval_ms REAL,
+        eval_count INTEGER,
+        eval_ms REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_generation_metrics_created_at ON generation_metrics(created_at);
+    CREATE INDEX IF NOT EXISTS idx_generation_metrics_model_host ON generation_metrics(model, host, created_at);
+    """,
+    # Version 7: Add logprobs of assistant messages, stored as a LogprobTrace blob
+    """
+    ALTER TABLE messages ADD COLUMN logprobs BLOB;
+    """,
+    # Version 8: Map rows of the per-model vector index files to messages.
+    # Messages are rewritten on every save, so they are keyed by chat and position.
+    """
+    CREATE TABLE IF NOT EXISTS message_embeddings (
+        model TEXT NOT NULL,
+        row INTEGER NOT NULL,
+        chat_id TEXT NOT NULL,
+        order_index INTEGER NOT NULL,
+        content_hash TEXT NOT NULL,
+        PRIMARY KEY (model, row),
+        FOREIGN KEY(chat_id) REFERENCES chats(id) ON DELETE CASCADE
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_message_embeddings_message ON message_embeddings(model, chat_id, order_index);
+    CREATE INDEX IF NOT EXISTS idx_message_embeddings_chat_id ON message_embeddings(chat_id);
+    """,
+    # Version 9: Add indexed files of document folders and their embedded chunks
+    """
+    CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        folder TEXT NOT NULL,
+        model TEXT NOT NULL,
+        path TEXT NOT NULL,
+        mtime REAL NOT NULL,
+        size INTEGER NOT NULL,
+        content_hash TEXT NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_path ON documents(folder, model, path);
+    CREATE TABLE IF NOT EXISTS document_chunks (
+        document_id INTEGER NOT NULL,
+        chunk_index INTEGER NOT NULL,
+        row INTEGER NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (document_id, chunk_index),
+        FOREIGN KEY(document_id) REFERENCES documents(id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS idx_document_chunks_row ON document_chunks(row);
+    """,
+    # Version 10: Add generated chat summaries and where a chat's title came from.
+    # 'truncated' titles (the first prompt, cut) may be replaced by a generated one;
+    # titles that do not match the first prompt were renamed by the user.
+    """
+    ALTER TABLE chats ADD COLUMN summary TEXT;
+    ALTER TABLE chats ADD COLUMN summary_count INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE chats ADD COLUMN title_source TEXT NOT NULL DEFAULT 'truncated';
+    UPDATE chats SET title_source = 'user'
+    WHERE title != 'New Chat' AND NOT EXISTS (
+        SELECT 1 FROM messages m
+        WHERE m.chat_id = chats.id AND m.role = 'user'
+            AND instr(ltrim(m.content), rtrim(chats.title, '.')) = 1
+    );
+    """,
+    # Version 11: Add the compacted summary of a chat's oldest messages, which is
+    # sent to the model in place of the first compacted_count messages
+    """
+    ALTER TABLE chats ADD COLUMN compacted_summary TEXT;
+    ALTER TABLE chats ADD COLUMN compacted_count INTEGER NOT NULL DEFAULT 0;
+    """,
+    # Version 12: Add per-model characters per token, calibrated from prompt_eval_count
+    """
+    CREATE TABLE IF NOT EXISTS token_calibration (
+        model TEXT PRIMARY KEY,
+        chars_per_token REAL NOT NULL,
+        samples INTEGER NOT NULL DEFAULT 0
+    );
     """
 ]
 
+def content_hash(text: str) -> str:
+    """Short digest of a message's content, used to detect edited messages."""
+    return hashlib.blake2b((text or "").encode('utf-8'), digest_size=12).hexdigest()
+
 class DatabaseManager:
     """Manages SQLite database initialization and operations."""
     
@@ -137,18 +251,24 @@ class DatabaseManager:
                     print(f"CRITICAL: Migration to Version {ver + 1} failed: {e}")
                     raise e
 
+    def checkpoint(self) -> None:
+        """Folds the WAL back into the main database file and truncates it."""
+        with self._get_conn() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
     # --- Hosts CRUD Operations ---
 
     def get_all_hosts(self) -> List[Dict[str, Any]]:
         """Returns all configured hosts from database."""
         with self._get_conn() as conn:
-            cursor = conn.execute("SELECT id, name, hostname, is_default FROM hosts")
+            cursor = conn.execute("SELECT id, name, hostname, is_default, max_parallel FROM hosts")
             return [
                 {
                     "id": row["id"],
                     "name": row["name"],
                     "hostname": row["hostname"],
-                    "default": bool(row["is_default"])
+                    "default": bool(row["is_default"]),
+                    "max_parallel": row["max_parallel"]
                 }
                 for row in cursor.fetchall()
             ]
@@ -156,32 +276,33 @@ class DatabaseManager:
     def get_host(self, host_id: str) -> Optional[Dict[str, Any]]:
         """Returns a specific host by its ID."""
         with self._get_conn() as conn:
-            cursor = conn.execute("SELECT id, name, hostname, is_default FROM hosts WHERE id = ?", (host_id,))
+            cursor = conn.execute("SELECT id, name, hostname, is_default, max_parallel FROM hosts WHERE id = ?", (host_id,))
             row = cursor.fetchone()
             if row:
                 return {
                     "id": row["id"],
                     "name": row["name"],
                     "hostname": row["hostname"],
-                    "default": bool(row["is_default"])
+                    "default": bool(row["is_default"]),
+                    "max_parallel": row["max_parallel"]
                 }
             return None
 
-    def add_host(self, host_id: str, name: str, hostname: str, is_default: bool) -> None:
+    def add_host(self, host_id: str, name: str, hostname: str, is_default: bool, max_parallel: Optional[int] = None) -> None:
         """Adds a host to database."""
         with self._get_conn() as conn:
             conn.execute(
-                "INSERT INTO hosts (id, name, hostname, is_default) VALUES (?, ?, ?, ?)",
-                (host_id, name, hostname, 1 if is_default else 0)
+                "INSERT INTO hosts (id, name, hostname, is_default, max_parallel) VALUES (?, ?, ?, ?, ?)",
+                (host_id, name, hostname, 1 if is_default else 0, max_parallel)
             )
             conn.commit()
 
-    def update_host(self, host_id: str, name: str, hostname: str, is_default: bool) -> None:
+    def update_host(self, host_id: str, name: str, hostname: str, is_default: bool, max_parallel: Optional[int] = None) -> None:
         """Updates an existing host configuration."""
         with self._get_conn() as conn:
             conn.execute(
-                "UPDATE hosts SET name = ?, hostname = ?, is_default = ? WHERE id = ?",
-                (name, hostname, 1 if is_default else 0, host_id)
+                "UPDATE hosts SET name = ?, hostname = ?, is_default = ?, max_parallel = ? WHERE id = ?",
+                (name, hostname, 1 if is_default else 0, max_parallel, host_id)
             )
             conn.commit()
 
@@ -204,7 +325,7 @@ class DatabaseManager:
         """Returns all chats sorted by update time descending, excluding their full messages."""
         with self._get_conn() as conn:
             cursor = conn.execute("""
-                SELECT id, title, created_at, updated_at, model, system_prompt, host_id, options, is_pinned 
+                SELECT id, title, created_at, updated_at, model, system_prompt, host_id, options, is_pinned, summary
                 FROM chats 
                 ORDER BY is_pinned DESC, updated_at DESC
             """)
@@ -226,6 +347,7 @@ class DatabaseManager:
                     "host": row["host_id"],
                     "options": options_dict,
                     "is_pinned": bool(row["is_pinned"]),
+                    "summary": row["summary"],
                     "messages": []  # Empty array by default for list queries
                 })
             return chats
@@ -234,7 +356,8 @@ class DatabaseManager:
         """Returns a specific chat along with all its parsed and ordered messages."""
         with self._get_conn() as conn:
             cursor = conn.execute("""
-                SELECT id, title, created_at, updated_at, model, system_prompt, host_id, options, is_pinned 
+                SELECT id, title, created_at, updated_at, model, system_prompt, host_id, options, is_pinned,
+                    summary, summary_count
                 FROM chats WHERE id = ?
             """, (chat_id,))
             row = cursor.fetchone()
@@ -260,6 +383,8 @@ class DatabaseManager:
                 "host": row["host_id"],
                 "options": options_dict,
                 "is_pinned": bool(row["is_pinned"]),
+                "summary": row["summary"],
+                "summary_count": row["summary_count"],
                 "messages": messages
             }
 
@@ -285,9 +410,116 @@ class DatabaseManager:
             conn.commit()
 
     def update_chat_title(self, chat_id: str, title: str, updated_at: float) -> None:
-        """Updates a chat's title."""
+        """Updates a chat's title as chosen by the user; it is never replaced by a generated one."""
+        with self._get_conn() as conn:
+            conn.execute(
+                "UPDATE chats SET title = ?, title_source = 'user', updated_at = ? WHERE id = ?",
+                (title, updated_at, chat_id)
+            )
+            conn.commit()
+
+    def set_provisional_title(self, chat_id: str, title: str) -> None:
+        """Names a chat that is still called "New Chat", until a title is generated."""
+        with self._get_conn() as conn:
+            conn.execute(
+                "UPDATE chats SET title = ? WHERE id = ? AND title = 'New Chat' AND title_source = 'truncated'",
+                (title, chat_id)
+            )
+            conn.commit()
+
+    def get_chat_title(self, chat_id: str) -> Optional[str]:
+        """Returns a chat's title without loading its messages."""
         with self._get_conn() as conn:
-            conn.execute("UPDATE chats SET title = ?, updated_at = ? WHERE id = ?", (title, updated_at, chat_id))
+            row = conn.execute("SELECT title FROM chats WHERE id = ?", (chat_id,)).fetchone()
+            return row["title"] if row else None
+
+    def get_chats_to_summarize(self, min_new_messages: int, limit: int,
+                               exclude: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns chats, most recently updated first, that have a truncated title
+        and a reply, or at least min_new_messages messages past their summary.
+        """
+        exclude = exclude or []
+        placeholders = ", ".join("?" for chat_id in exclude)
+        with self._get_conn() as conn:
+            cursor = conn.execute(f"""
+                SELECT c.id, c.title, c.title_source, c.summary, c.summary_count, COUNT(m.id) AS message_count
+                FROM chats c
+                JOIN messages m ON m.chat_id = c.id
+                WHERE c.id NOT IN ({placeholders})
+                GROUP BY c.id
+                HAVING (c.title_source = 'truncated' AND COUNT(m.id) >= 2)
+                    OR COUNT(m.id) - c.summary_count >= ?
+                ORDER BY c.updated_at DESC
+                LIMIT ?
+            """, [*exclude, min_new_messages, limit])
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_message_texts(self, chat_id: str, start: int = 0) -> List[Dict[str, Any]]:
+        """Returns the order_index, role and content of a chat's messages from start on, without images."""
+        with self._get_conn() as conn:
+            cursor = conn.execute("""
+                SELECT order_index, role, content FROM messages
+                WHERE chat_id = ? AND order_index >= ?
+                ORDER BY order_index ASC
+            """, (chat_id, start))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def update_chat_summary(self, chat_id: str, summary: str, summary_count: int,
+                            title: Optional[str] = None) -> bool:
+        """
+        Stores a chat's summary of its first summary_count messages and, unless
+        the user named the chat, a generated title. Returns True if the title changed.
+        """
+        with self._get_conn() as conn:
+            conn.execute(
+                "UPDATE chats SET summary = ?, summary_count = ? WHERE id = ?",
+                (summary, summary_count, chat_id)
+            )
+            changed = False
+            if title:
+                cursor = conn.execute(
+                    "UPDATE chats SET title = ?, title_source = 'model' WHERE id = ? AND title_source = 'truncated'",
+                    (title, chat_id)
+                )
+                changed = cursor.rowcount > 0
+            conn.commit()
+            return changed
+
+    def get_chat_compaction(self, chat_id: str) -> Tuple[Optional[str], int]:
+        """Returns a chat's compacted summary and the number of messages it replaces."""
+        with self._get_conn() as conn:
+            row = conn.execute(
+                "SELECT compacted_summary, compacted_count FROM chats WHERE id = ?", (chat_id,)
+            ).fetchone()
+            return (row["compacted_summary"], row["compacted_count"]) if row else (None, 0)
+
+    def update_chat_compaction(self, chat_id: str, summary: str, count: int, previous_count: int) -> bool:
+        """
+        Stores a compacted summary of a chat's first count messages, unless the
+        compaction changed since previous_count was read. Returns True if stored.
+        """
+        with self._get_conn() as conn:
+            cursor = conn.execute(
+                "UPDATE chats SET compacted_summary = ?, compacted_count = ? WHERE id = ? AND compacted_count = ?",
+                (summary, count, chat_id, previous_count)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def get_token_calibration(self) -> Dict[str, Tuple[float, int]]:
+        """Returns the characters per token and sample count of every calibrated model."""
+        with self._get_conn() as conn:
+            cursor = conn.execute("SELECT model, chars_per_token, samples FROM token_calibration")
+            return {row["model"]: (row["chars_per_token"], row["samples"]) for row in cursor.fetchall()}
+
+    def set_token_calibration(self, model: str, chars_per_token: float, samples: int) -> None:
+        """Stores a model's calibrated characters per token."""
+        with self._get_conn() as conn:
+            conn.execute("""
+                INSERT INTO token_calibration (model, chars_per_token, samples) VALUES (?, ?, ?)
+                ON CONFLICT(model) DO UPDATE SET chars_per_token = excluded.chars_per_token, samples = excluded.samples
+            """, (model, chars_per_token, samples))
             conn.commit()
 
     def update_chat_pinned(self, chat_id: str, is_pinned: bool) -> None:
@@ -325,7 +557,7 @@ class DatabaseManager:
         messages = []
         with self._get_conn() as conn:
             cursor = conn.execute("""
-                SELECT id, role, content, model, thinking_content, api_details 
+                SELECT id, role, content, model, thinking_content, api_details, logprobs
                 FROM messages 
                 WHERE chat_id = ? 
                 ORDER BY order_index ASC
@@ -346,6 +578,11 @@ class DatabaseManager:
                         msg["api_details"] = json.loads(row["api_details"])
                     except Exception:
                         pass
+                if row["logprobs"] is not None:
+                    try:
+                        msg["logprobs"] = LogprobTrace.from_bytes(row["logprobs"])
+                    except Exception as e:
+                        print(f"Error decoding logprobs blob: {e}")
                 
                 # Fetch attached images
                 img_cursor = conn.execute("SELECT image_data FROM message_images WHERE message_id = ?", (msg_id,))
@@ -362,16 +599,17 @@ class DatabaseManager:
         return messages
 
     def save_messages(self, chat_id: str, messages: List[Dict[str, Any]]) -> None:
-        """Saves a clean array of messages, replacing older ones. Decodes base64 images into BLOBs."""
+        """Saves a clean array of messages, replacing older ones. Stores base64 or file images as BLOBs."""
         with self._get_conn() as conn:
             # Delete old messages; cascades to delete from message_images too
             conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
             
             for idx, msg in enumerate(messages):
+                logprobs = msg.get("logprobs")
                 cursor = conn.cursor()
                 cursor.execute("""
-                    INSERT INTO messages (chat_id, role, content, model, thinking_content, api_details, order_index)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO messages (chat_id, role, content, model, thinking_content, api_details, logprobs, order_index)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     chat_id,
                     msg.get("role"),
@@ -379,18 +617,16 @@ class DatabaseManager:
                     msg.get("model"),
                     msg.get("thinking_content"),
                     json.dumps(msg.get("api_details")) if msg.get("api_details") else None,
+                    sqlite3.Binary(logprobs.to_bytes()) if logprobs else None,
                     idx
                 ))
                 msg_id = cursor.lastrowid
                 
                 # Save associated images
                 images = msg.get("images", [])
-                for img_b64 in images:
+                for image in images:
                     try:
-                        if "," in img_b64:
-                            img_data = base64.b64decode(img_b64.split(",")[1])
-                        else:
-                            img_data = base64.b64decode(img_b64)
+                        img_data = image_bytes(image)
                         
                         conn.execute("""
                             INSERT INTO message_images (message_id, image_data)
@@ -399,3 +635,243 @@ class DatabaseManager:
                     except Exception as e:
                         print(f"Error decoding or saving image blob: {e}")
             conn.commit()
+
+    # --- Comparison CRUD Operations ---
+
+    def save_comparison(self, comparison_id: str, prompt: str, system_prompt: Optional[str],
+                        options: Optional[Dict[str, Any]], created_at: float, results: List[Dict[str, Any]]) -> None:
+        """Saves a multi-model comparison run as a single record."""
+        with self._get_conn() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO comparisons (id, prompt, system_prompt, options, created_at, results)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                comparison_id,
+                prompt,
+                system_prompt,
+                json.dumps(options) if options else None,
+                created_at,
+                json.dumps(results)
+            ))
+            conn.commit()
+
+    def get_comparisons(self) -> List[Dict[str, Any]]:
+        """Returns all saved comparison runs, newest first."""
+        with self._get_conn() as conn:
+            cursor = conn.execute("""
+                SELECT id, prompt, system_prompt, options, created_at, results
+                FROM comparisons
+                ORDER BY created_at DESC
+            """)
+            comparisons = []
+            for row in cursor.fetchall():
+                try:
+                    results = json.loads(row["results"])
+                except Exception:
+                    results = []
+                comparisons.append({
+                    "id": row["id"],
+                    "prompt": row["prompt"],
+                    "system": row["system_prompt"],
+                    "options": json.loads(row["options"]) if row["options"] else {},
+                    "created_at": row["created_at"],
+                    "results": results
+                })
+            return comparisons
+
+    # --- Generation Metrics Operations ---
+
+    METRIC_COLUMNS = [
+        "created_at", "host", "model", "endpoint", "chat_id", "options", "ttft_ms", "tokens_per_s",
+        "load_ms", "total_ms", "prompt_eval_count", "prompt_eval_ms", "eval_count", "eval_ms"
+    ]
+
+    def add_generation_metric(self, metric: Dict[str, Any]) -> None:
+        """Inserts one generation_metrics row."""
+        values = [metric.get(col) for col in self.METRIC_COLUMNS]
+        options_idx = self.METRIC_COLUMNS.index("options")
+        if values[options_idx] is not None:
+            values[options_idx] = json.dumps(values[options_idx])
+        placeholders = ", ".join("?" for col in self.METRIC_COLUMNS)
+        with self._get_conn() as conn:
+            conn.execute(
+                f"INSERT INTO generation_metrics ({', '.join(self.METRIC_COLUMNS)}) VALUES ({placeholders})",
+                values
+            )
+            conn.commit()
+
+    def get_generation_metrics(self, since: float = 0.0, model: Optional[str] = None,
+                               host: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Returns generation metrics rows created after `since`, oldest first."""
+        query = f"SELECT {', '.join(self.METRIC_COLUMNS)} FROM generation_metrics WHERE created_at >= ?"
+        params: List[Any] = [since]
+        if model:
+            query += " AND model = ?"
+            params.append(model)
+        if host:
+            query += " AND host = ?"
+            params.append(host)
+        query += " ORDER BY created_at ASC"
+        with self._get_conn() as conn:
+            rows = []
+            for row in conn.execute(query, params).fetchall():
+                metric = dict(row)
+                if metric["options"]:
+                    try:
+                        metric["options"] = json.loads(metric["options"])
+                    except Exception:
+                        metric["options"] = None
+                rows.append(metric)
+            return rows
+
+    # --- Message Embedding Operations ---
+
+    def get_unembedded_messages(self, model: str, chat_id: Optional[str] = None,
+                                limit: int = 256) -> List[Dict[str, Any]]:
+        """Returns user and assistant messages that have no embedding for model, or were edited since."""
+        query = """
+            SELECT m.chat_id, m.order_index, m.content, content_hash(m.content) AS content_hash
+            FROM messages m
+            LEFT JOIN message_embeddings e
+                ON e.model = ? AND e.chat_id = m.chat_id AND e.order_index = m.order_index
+            WHERE m.role IN ('user', 'assistant') AND m.content != ''
+                AND (e.row IS NULL OR e.content_hash != content_hash(m.content))
+        """
+        params: List[Any] = [model]
+        if chat_id:
+            query += " AND m.chat_id = ?"
+            params.append(chat_id)
+        query += " LIMIT ?"
+        params.append(limit)
+        with self._get_conn() as conn:
+            conn.create_function("content_hash", 1, content_hash, deterministic=True)
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+    def add_message_embeddings(self, model: str, entries: List[Dict[str, Any]]) -> None:
+        """Records the index rows of embedded messages, replacing older rows of the same messages."""
+        with self._get_conn() as conn:
+            # Chats deleted while their messages were being embedded are skipped
+            conn.executemany("""
+                INSERT OR REPLACE INTO message_embeddings (model, row, chat_id, order_index, content_hash)
+                SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM chats WHERE id = ?)
+            """, [
+                (model, e["row"], e["chat_id"], e["order_index"], e["content_hash"], e["chat_id"])
+                for e in entries
+            ])
+            conn.commit()
+
+    def get_embedded_messages(self, model: str, rows: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Returns the current messages behind index rows; rows of deleted or edited messages are left out."""
+        if not rows:
+            return {}
+        placeholders = ", ".join("?" for row in rows)
+        with self._get_conn() as conn:
+            conn.create_function("content_hash", 1, content_hash, deterministic=True)
+            cursor = conn.execute(f"""
+                SELECT e.row, e.chat_id, e.order_index, m.role, m.content, c.title, c.updated_at
+                FROM message_embeddings e
+                JOIN chats c ON c.id = e.chat_id
+                JOIN messages m ON m.chat_id = e.chat_id AND m.order_index = e.order_index
+                WHERE e.model = ? AND e.row IN ({placeholders})
+                    AND e.content_hash = content_hash(m.content)
+            """, [model, *rows])
+            return {row["row"]: dict(row) for row in cursor.fetchall()}
+
+    def get_embedding_rows(self, model: str) -> List[int]:
+        """Returns the index rows still referenced for model, in order."""
+        with self._get_conn() as conn:
+            cursor = conn.execute("SELECT row FROM message_embeddings WHERE model = ? ORDER BY row ASC", (model,))
+            return [row["row"] for row in cursor.fetchall()]
+
+    def renumber_embeddings(self, model: str, rows: List[int]) -> None:
+        """Renumbers the given ascending rows to 0..n-1 after the index file was compacted."""
+        with self._get_conn() as conn:
+            # Ascending order never collides: each new number is at most the old one
+            conn.executemany(
+                "UPDATE message_embeddings SET row = ? WHERE model = ? AND row = ?",
+                [(new, model, old) for new, old in enumerate(rows) if new != old]
+            )
+            conn.commit()
+
+    def delete_embeddings(self, model: str) -> None:
+        """Forgets every embedding of a model, e.g. when its index file is gone."""
+        with self._get_conn() as conn:
+            conn.execute("DELETE FROM message_embeddings WHERE model = ?", (model,))
+            conn.commit()
+
+    # --- Document Operations ---
+
+    def get_documents(self, folder: str, model: str) -> Dict[str, Dict[str, Any]]:
+        """Returns the indexed files of a folder by relative path."""
+        with self._get_conn() as conn:
+            cursor = conn.execute("""
+                SELECT id, path, mtime, size, content_hash FROM documents WHERE folder = ? AND model = ?
+            """, (folder, model))
+            return {row["path"]: dict(row) for row in cursor.fetchall()}
+
+    def replace_document(self, folder: str, model: str, path: str, mtime: float, size: int,
+                         content_hash: str, chunks: List[Tuple[int, str]]) -> None:
+        """Stores a file and its (row, content) chunks, replacing an older version in one transaction."""
+        with self._get_conn() as conn:
+            conn.execute("DELETE FROM documents WHERE folder = ? AND model = ? AND path = ?", (folder, model, path))
+            cursor = conn.execute("""
+                INSERT INTO documents (folder, model, path, mtime, size, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (folder, model, path, mtime, size, content_hash))
+            document_id = cursor.lastrowid
+            conn.executemany("""
+                INSERT INTO document_chunks (document_id, chunk_index, row, content) VALUES (?, ?, ?, ?)
+            """, [(document_id, idx, row, content) for idx, (row, content) in enumerate(chunks)])
+            conn.commit()
+
+    def touch_document(self, document_id: int, mtime: float, size: int) -> None:
+        """Records the new mtime of a file whose content did not change."""
+        with self._get_conn() as conn:
+            conn.execute("UPDATE documents SET mtime = ?, size = ? WHERE id = ?", (mtime, size, document_id))
+            conn.commit()
+
+    def delete_documents(self, folder: str, model: str, paths: Optional[List[str]] = None) -> None:
+        """Deletes files (all of the folder's if paths is None) and their chunks."""
+        with self._get_conn() as conn:
+            if paths is None:
+                conn.execute("DELETE FROM documents WHERE folder = ? AND model = ?", (folder, model))
+            else:
+                conn.executemany(
+                    "DELETE FROM documents WHERE folder = ? AND model = ? AND path = ?",
+                    [(folder, model, path) for path in paths]
+                )
+            conn.commit()
+
+    def get_document_chunks(self, folder: str, model: str, rows: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Returns the chunks behind index rows of a folder, with their file path."""
+        if not rows:
+            return {}
+        placeholders = ", ".join("?" for row in rows)
+        with self._get_conn() as conn:
+            cursor = conn.execute(f"""
+                SELECT c.row, c.chunk_index, c.content, d.path
+                FROM document_chunks c
+                JOIN documents d ON d.id = c.document_id
+                WHERE d.folder = ? AND d.model = ? AND c.row IN ({placeholders})
+            """, [folder, model, *rows])
+            return {row["row"]: dict(row) for row in cursor.fetchall()}
+
+    def get_document_rows(self, folder: str, model: str) -> List[int]:
+        """Returns the index rows still referenced by a folder's chunks, in order."""
+        with self._get_conn() as conn:
+            cursor = conn.execute("""
+                SELECT c.row FROM document_chunks c
+                JOIN documents d ON d.id = c.document_id
+                WHERE d.folder = ? AND d.model = ?
+                ORDER BY c.row ASC
+            """, (folder, model))
+            return [row["row"] for row in cursor.fetchall()]
+
+    def renumber_document_chunks(self, folder: str, model: str, rows: List[int]) -> None:
+        """Renumbers the given ascending rows to 0..n-1 after the folder's index file was compacted."""
+        with self._get_conn() as conn:
+            conn.executemany("""
+                UPDATE document_chunks SET row = ?
+                WHERE row = ? AND document_id IN (SELECT id FROM documents WHERE folder = ? AND model = ?)
+            """, [(new, old, folder, model) for new, old in enumerate(rows) if new != old])
+            conn.commit()
@@ -0,0 +1,404 @@
+import concurrent.futures
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from . import ollama
+from .database import DatabaseManager, content_hash
+from .tokens import DEFAULT_NUM_CTX, estimate_tokens
+from .vector_index import VectorIndex
+
+# Files read as plain text; everything else in the folder is skipped
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".markdown", ".rst", ".org", ".adoc", ".tex", ".csv", ".tsv", ".json", ".yaml", ".yml",
+    ".toml", ".ini", ".cfg", ".xml", ".html", ".htm", ".py", ".js", ".ts", ".c", ".h", ".cpp", ".hpp",
+    ".rs", ".go", ".java", ".kt", ".rb", ".php", ".sh", ".sql", ".css", ".vala", ".cs", ".swift", ".lua",
+}
+# Larger files are skipped; they are usually data rather than prose
+MAX_FILE_BYTES = 2 * 1024 * 1024
+# Characters per chunk and shared between consecutive chunks
+CHUNK_CHARS = 1200
+CHUNK_OVERLAP = 200
+# Chunks sent per request to the Embed API
+EMBED_BATCH = 32
+# Embedding requests in flight per host while indexing
+REQUESTS_PER_HOST = 2
+# An index file is compacted when fewer than this fraction of its rows are referenced
+COMPACT_RATIO = 0.5
+# Share of the context window retrieved chunks may fill
+CONTEXT_SHARE = 0.5
+
+RAG_TEMPLATE = (
+    "Answer using the following excerpts from local documents where they are relevant, "
+    "and mention the files you used.\n\n{context}\n\nQuestion: {prompt}"
+)
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Splits text into chunks of at most size characters, cut at a paragraph,
+    line or word break where possible. Consecutive chunks share up to overlap
+    characters, so a passage spanning a cut is still found.
+    """
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            window = text[start:end]
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = window.rfind(separator)
+                if cut > size // 2:
+                    end = start + cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        # Begin the overlap on a word
+        space = text.find(" ", start, end)
+        if space != -1:
+            start = space + 1
+    return chunks
+
+def iter_files(folder: str) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yields (relative path, stat) of the text files under folder, skipping hidden entries."""
+    for root, dirs, names in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(names):
+            if name.startswith(".") or os.path.splitext(name)[1].lower() not in TEXT_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_size <= MAX_FILE_BYTES:
+                yield os.path.relpath(path, folder), stat
+
+def read_text(path: str) -> Optional[str]:
+    """Reads a file as UTF-8, or returns None for binary files."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+def context_budget(options: Optional[Dict[str, Any]], conversation_tokens: int) -> int:
+    """Tokens left for retrieved chunks: a share of the context window, minus the conversation and the reply."""
+    options = options or {}
+    num_ctx = options.get('num_ctx') or DEFAULT_NUM_CTX
+    reply = options.get('num_predict') if (options.get('num_predict') or 0) > 0 else num_ctx // 8
+    free = num_ctx - conversation_tokens - reply
+    return max(min(int(num_ctx * CONTEXT_SHARE), free), 0)
+
+def augment_prompt(prompt: str, chunks: List[Dict[str, Any]], budget: int,
+                   count: Callable[[str], int] = estimate_tokens) -> Tuple[str, List[str]]:
+    """
+    Prepends the best chunks that fit in budget tokens, as measured by count, to the prompt.
+    Returns the prompt to send and the files the chunks came from.
+    """
+    parts: List[str] = []
+    sources: List[str] = []
+    used = count(RAG_TEMPLATE)
+    for chunk in chunks:
+        block = f"[{len(parts) + 1}] {chunk['path']}\n{chunk['content']}"
+        cost = count(block)
+        if used + cost > budget:
+            continue
+        used += cost
+        parts.append(block)
+        if chunk['path'] not in sources:
+            sources.append(chunk['path'])
+    if not parts:
+        return prompt, []
+    return RAG_TEMPLATE.format(context="\n\n".join(parts), prompt=prompt), sources
+
+def _serves(models: List[str], model: str) -> bool:
+    return model in models or f"{model}:latest" in models
+
+class _PendingFile:
+    """A changed file whose chunks are being embedded."""
+    __slots__ = ("path", "stat", "digest", "chunks", "rows", "remaining")
+
+    def __init__(self, path: str, stat: os.stat_result, digest: str, chunks: List[str]) -> None:
+        self.path = path
+        self.stat = stat
+        self.digest = digest
+        self.chunks = chunks
+        self.rows: List[int] = [0] * len(chunks)
+        self.remaining = len(chunks)
+
+class DocumentIndex:
+    """
+    Chunks and embeds the text files of document folders for retrieval.
+
+    Indexing is incremental: files whose mtime and size are unchanged are not
+    read, and files whose content hash is unchanged are not embedded again.
+    Files are read one at a time and their chunks sent in batches to every
+    host serving the embedding model, a bounded number of requests at a time,
+    so memory stays flat however large the folder is. A file's chunks are
+    stored together once all of them are embedded.
+    """
+
+    def __init__(self, db: DatabaseManager, storage_dir: str) -> None:
+        self.db = db
+        self.vectors_dir = os.path.join(storage_dir, "vectors")
+        self.hosts: List[str] = []
+        self.model: str = ""
+        self._indexes: Dict[Tuple[str, str], VectorIndex] = {}
+        self._lock = threading.Lock()
+        # Held while an index file is rewritten and its rows renumbered, so a
+        # search never reads new rows against the old mapping
+        self._rows_lock = threading.Lock()
+        # Hosts found serving each embedding model, so queries go where the documents were embedded
+        self._serving: Dict[str, List[str]] = {}
+        # Folders being indexed, and folders to index again once that run ends
+        self._running: Set[str] = set()
+        self._queued: Set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.hosts and self.model)
+
+    def configure(self, hosts: List[str], model: str) -> None:
+        """Sets the hosts (default first) and the embedding model (empty to disable)."""
+        self.hosts, self.model = list(hosts), model
+        with self._lock:
+            self._serving.clear()
+
+    def schedule_update(self, folder: str,
+                        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+        """
+        Indexes a folder on the background lane. on_progress is called from the worker
+        thread with the counts of update() as files are embedded, and with
+        done (and error, if it failed) set at the end.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if folder in self._running:
+                self._queued.add(folder)
+                return
+            self._running.add(folder)
+
+        def run() -> None:
+            while True:
+                try:
+                    stats = self.update(folder, self.model, self.hosts, on_progress)
+                    print(f"Indexed {folder}: {stats}")
+                except Exception as e:
+                    print(f"Error indexing documents in {folder}: {e}")
+                    if on_progress:
+                        on_progress({"done": True, "error": str(e)})
+                with self._lock:
+                    if folder not in self._queued:
+                        self._running.discard(folder)
+                        return
+                    self._queued.discard(folder)
+
+        from .session import worker
+        from .scheduler import LANE_BACKGROUND, PRIORITY_LOW
+        worker.schedule(LANE_BACKGROUND, run, priority=PRIORITY_LOW)
+
+    def _index(self, folder: str, model: str) -> VectorIndex:
+        with self._lock:
+            index = self._indexes.get((folder, model))
+            if index is None:
+                digest = hashlib.sha1(f"{folder}\0{model}".encode('utf-8')).hexdigest()[:12]
+                index = VectorIndex(os.path.join(self.vectors_dir, f"documents-{digest}.f32"))
+                rows = self.db.get_document_rows(folder, model)
+                if rows and rows[-1] >= len(index):
+                    print(f"Document index of {folder} is incomplete, embedding all files again")
+                    self.db.delete_documents(folder, model)
+                self._indexes[(folder, model)] = index
+            return index
+
+    def _reset(self, folder: str, model: str) -> VectorIndex:
+        """Drops the index of a folder whose embeddings changed dimension."""
+        with self._lock:
+            index = self._indexes.pop((folder, model), None)
+        if index is not None:
+            index.close()
+            os.remove(index.path)
+        self.db.delete_documents(folder, model)
+        return self._index(folder, model)
+
+    def _embedding_hosts(self, model: str, hosts: List[str]) -> List[str]:
+        """
+        Returns the hosts that serve the embedding model, or the default host if
+        none is known to, and remembers them for embedding search queries.
+        """
+        serving = []
+        for host in hosts:
+            try:
+                if _serves(ollama.fetch_models(host), model):
+                    serving.append(host)
+            except ollama.OllamaError:
+                pass
+        serving = serving or hosts[:1]
+        with self._lock:
+            self._serving[model] = list(serving)
+        return serving
+
+    def update(self, folder: str, model: str, hosts: List[str],
+               on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Brings the folder's index up to date and returns counts of what was done."""
+        from .session import worker
+        from .scheduler import LANE_EMBED
+
+        index = self._index(folder, model)
+        known = self.db.get_documents(folder, model)
+        hosts = self._embedding_hosts(model, hosts)
+        in_flight: Dict[concurrent.futures.Future, Tuple[str, List[Tuple[_PendingFile, int]]]] = {}
+        batch: List[Tuple[_PendingFile, int]] = []
+        stats: Dict[str, Any] = {"scanned": 0, "unchanged": 0, "embedded": 0, "chunks": 0, "deleted": 0}
+
+        def submit(entries: List[Tuple[_PendingFile, int]], host: Optional[str] = None) -> None:
+            if host is None:
+                # The host with the fewest requests in flight
+                load = {h: 0 for h in hosts}
+                for h, _entries in in_flight.values():
+                    load[h] = load.get(h, 0) + 1
+                host = min(hosts, key=lambda h: load[h])
+            texts = [pending.chunks[idx] for pending, idx in entries]
+            future = worker.schedule(LANE_EMBED, ollama.embed, host, model, texts, EMBED_BATCH, host=host)
+            in_flight[future] = (host, entries)
+
+        def collect(wait_all: bool) -> None:
+            nonlocal index
+            while in_flight:
+                done, _not_done = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    host, entries = in_flight.pop(future)
+                    try:
+                        vectors = future.result()
+                    except ollama.OllamaError as e:
+                        # Leave the failing host out and retry the batch elsewhere
+                        if host in hosts:
+                            hosts.remove(host)
+                            print(f"Embedding on {host} failed: {e}")
+                        if not hosts:
+                            raise
+                        submit(entries)
+                        continue
+                    try:
+                        first = index.append(vectors)
+                    except ValueError as e:
+                        print(f"Embeddings of {model} changed ({e}), rebuilding the index of {folder}")
+                        index = self._reset(folder, model)
+                        first = index.append(vectors)
+                    for offset, (pending, idx) in enumerate(entries):
+                        pending.rows[idx] = first + offset
+                        pending.remaining -= 1
+                        if pending.remaining == 0:
+                            self._store(folder, model, pending)
+                            stats["embedded"] += 1
+                            stats["chunks"] += len(pending.chunks)
+                            if on_progress:
+                                on_progress(dict(stats))
+                if not wait_all and len(in_flight) < REQUESTS_PER_HOST * len(hosts):
+                    return
+
+        try:
+            for path, stat in iter_files(folder):
+                stats["scanned"] += 1
+                known_file = known.pop(path, None)
+                if known_file and known_file["mtime"] == stat.st_mtime and known_file["size"] == stat.st_size:
+                    stats["unchanged"] += 1
+                    continue
+                try:
+                    text = read_text(os.path.join(folder, path))
+                except OSError as e:
+                    print(f"Error reading {path}: {e}")
+                    continue
+                if text is None:
+                    if known_file:
+                        # No longer a text file; its chunks are deleted below
+                        known[path] = known_file
+                    continue
+                digest = content_hash(text)
+                if known_file and known_file["content_hash"] == digest:
+                    self.db.touch_document(known_file["id"], stat.st_mtime, stat.st_size)
+                    stats["unchanged"] += 1
+                    continue
+
+                pending = _PendingFile(path, stat, digest, chunk_text(text))
+                if not pending.chunks:
+                    self._store(folder, model, pending)
+                    continue
+                for idx in range(len(pending.chunks)):
+                    batch.append((pending, idx))
+                    if len(batch) == EMBED_BATCH:
+                        submit(batch)
+                        batch = []
+                        if len(in_flight) >= REQUESTS_PER_HOST * len(hosts):
+                            collect(wait_all=False)
+            if batch:
+                submit(batch)
+            collect(wait_all=True)
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+        # Files left in known were deleted, renamed or are no longer text files
+        if known:
+            self.db.delete_documents(folder, model, list(known))
+            stats["deleted"] = len(known)
+        self._compact(folder, model, index)
+        stats["done"] = True
+        if on_progress:
+            on_progress(dict(stats))
+        return stats
+
+    def _store(self, folder: str, model: str, pending: _PendingFile) -> None:
+        self.db.replace_document(
+            folder, model, pending.path, pending.stat.st_mtime, pending.stat.st_size, pending.digest,
+            list(zip(pending.rows, pending.chunks))
+        )
+
+    def _compact(self, folder: str, model: str, index: VectorIndex) -> None:
+        """Rewrites the index without rows of deleted or changed files."""
+        with self._rows_lock:
+            rows = self.db.get_document_rows(folder, model)
+            if len(rows) < len(index) * COMPACT_RATIO:
+                index.compact(rows)
+                self.db.renumber_document_chunks(folder, model, rows)
+
+    def search(self, folder: str, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        Returns the chunks of a folder closest in meaning to query, best first,
+        each with path, chunk_index, content and score. Embeds the query, so
+        call it off the main thread.
+        """
+        hosts, model = self.hosts, self.model
+        if not hosts or not model or not query.strip():
+            return []
+        with self._lock:
+            serving = self._serving.get(model)
+        if serving is None:
+            serving = self._embedding_hosts(model, hosts)
+        for host in serving:
+            try:
+                vector = ollama.embed(host, model, [query])[0]
+                break
+            except ollama.OllamaError as e:
+                if host == serving[-1]:
+                    raise
+                print(f"Embedding the query on {host} failed: {e}")
+        with self._rows_lock:
+            hits = self._index(folder, model).search(vector, limit * 2)
+            chunks = self.db.get_document_chunks(folder, model, [row for row, _score in hits])
+        results = []
+        for row, score in hits:
+            chunk = chunks.get(row)
+            if chunk is not None:
+                results.append(dict(chunk, score=score))
+                if len(results) == limit:
+                    break
+        return results
@@ -11,6 +11,7 @@ class HostEditDialog(Adw.AlertDialog):
 
     name_entry: Gtk.Entry = Gtk.Template.Child()
     hostname_entry: Gtk.Entry = Gtk.Template.Child()
+    max_parallel_entry: Gtk.Entry = Gtk.Template.Child()
     default_check: Gtk.CheckButton = Gtk.Template.Child()
 
     def __init__(self, host: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
@@ -20,6 +21,16 @@ class HostEditDialog(Adw.AlertDialog):
             self.name_entry.set_text(host['name'])
             self.hostname_entry.set_text(host['hostname'])
             self.default_check.set_active(host.get("default", False))
+            if host.get("max_parallel"):
+                self.max_parallel_entry.set_text(str(host["max_parallel"]))
+
+    def get_max_parallel(self) -> Optional[int]:
+        """Returns the configured parallel request limit, or None to learn it."""
+        try:
+            value = int(self.max_parallel_entry.get_text().strip())
+            return value if value > 0 else None
+        except ValueError:
+            return None
 
 @Gtk.Template(resource_path='/io/github/jackrabbithanna/Gnollama/host_manager.ui')
 class HostManagerDialog(Adw.Window):
@@ -106,7 +117,8 @@ class HostManagerDialog(Adw.Window):
             GLib.idle_add(dialog.set_body, msg)
             
         from .session import worker
-        worker.submit(fetch_version_thread)
+        from .scheduler import LANE_METADATA, PRIORITY_HIGH
+        worker.schedule(LANE_METADATA, fetch_version_thread, priority=PRIORITY_HIGH)
 
     def on_edit_clicked(self, btn: Gtk.Button, host: Dict[str, Any]) -> None:
         """Callback for the 'Edit' button."""
@@ -124,11 +136,12 @@ class HostManagerDialog(Adw.Window):
                 name = dialog.name_entry.get_text().strip()
                 hostname = dialog.hostname_entry.get_text().strip()
                 is_default = dialog.default_check.get_active()
+                max_parallel = dialog.get_max_parallel()
                 if name and hostname:
                     if host:
-                        self.storage.update_host(host['id'], name, hostname, is_default)
+                        self.storage.update_host(host['id'], name, hostname, is_default, max_parallel)
                     else:
-                        self.storage.add_host(name, hostname, is_default)
+                        self.storage.add_host(name, hostname, is_default, max_parallel)
                     self.load_hosts()
                     if self.on_hosts_changed_cb:
                         self.on_hosts_changed_cb()
@@ -0,0 +1,286 @@
+import base64
+import collections
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from gi.repository import Gdk, GdkPixbuf, Gio, GLib, Gtk
+from .payload import FileImage
+
+# Longest side of the thumbnails shown in chat bubbles and the attachment row.
+# Twice the widget size, so they stay sharp on scaled displays.
+BUBBLE_THUMBNAIL_SIZE = 400
+PREVIEW_THUMBNAIL_SIZE = 160
+
+def decode_base64(data: str) -> bytes:
+    """Decodes a base64 image, with or without a data: URL prefix."""
+    if "," in data:
+        data = data[data.find(",") + 1:]
+    return base64.b64decode(data)
+
+def decode_scaled(data: bytes, size: int) -> GdkPixbuf.Pixbuf:
+    """
+    Decodes image bytes, letting the loader shrink them to fit in a size x size
+    box (0 keeps the original size). The EXIF orientation is applied.
+    """
+    loader = GdkPixbuf.PixbufLoader()
+
+    def on_size_prepared(loader: GdkPixbuf.PixbufLoader, width: int, height: int) -> None:
+        scale = min(size / width, size / height) if size > 0 else 1.0
+        if scale < 1.0:
+            loader.set_size(max(round(width * scale), 1), max(round(height * scale), 1))
+
+    loader.connect("size-prepared", on_size_prepared)
+    loader.write(data)
+    loader.close()
+    pixbuf = loader.get_pixbuf()
+    return pixbuf.apply_embedded_orientation() or pixbuf
+
+def upload_options() -> Dict[str, Any]:
+    """Reads the image upload preprocessing settings."""
+    settings = Gio.Settings.new('io.github.jackrabbithanna.Gnollama')
+    return {
+        'enabled': settings.get_boolean('image-preprocess'),
+        'max_size': settings.get_int('image-max-size'),
+        'format': settings.get_string('image-format'),
+        'quality': settings.get_int('image-quality'),
+    }
+
+def _can_save(image_format: str) -> bool:
+    return any(f.get_name() == image_format and f.is_writable() for f in GdkPixbuf.Pixbuf.get_formats())
+
+def encode_upload(data: bytes, options: Dict[str, Any]) -> bytes:
+    """
+    Downscales an image to options['max_size'] and re-encodes it in
+    options['format'] at options['quality']. Metadata such as EXIF and GPS
+    tags is not carried over.
+    """
+    pixbuf = decode_scaled(data, options['max_size'])
+    image_format = options['format']
+    if not _can_save(image_format):
+        # WebP needs the optional webp-pixbuf-loader
+        image_format = 'jpeg'
+
+    quality = str(min(max(options['quality'], 1), 100))
+    if image_format == 'png':
+        keys, values = ['compression'], ['6']
+    else:
+        keys, values = ['quality'], [quality]
+
+    if image_format == 'jpeg' and pixbuf.get_has_alpha():
+        # JPEG has no alpha channel; flatten onto white instead of black
+        width, height = pixbuf.get_width(), pixbuf.get_height()
+        flat = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, False, 8, width, height)
+        flat.fill(0xffffffff)
+        pixbuf.composite(flat, 0, 0, width, height, 0, 0, 1, 1, GdkPixbuf.InterpType.NEAREST, 255)
+        pixbuf = flat
+
+    # Raises GLib.Error on failure
+    _success, encoded = pixbuf.save_to_bufferv(image_format, keys, values)
+    return encoded
+
+def prepare_upload(path: str, options: Dict[str, Any]) -> Union[str, FileImage]:
+    """
+    Returns the preprocessed image base64 encoded, or, when preprocessing is
+    off or fails, a FileImage that is streamed from the file when sent.
+    """
+    if options['enabled']:
+        try:
+            with open(path, "rb") as f:
+                return base64.b64encode(encode_upload(f.read(), options)).decode('utf-8')
+        except GLib.Error as e:
+            print(f"Error preprocessing image {path}, sending the original: {e}")
+        except OSError as e:
+            # Removed or unreadable since it was attached; the original cannot be sent either
+            raise OSError(f"Cannot read image {path}: {e.strerror or e}") from e
+    return FileImage(path)
+
+def prepare_uploads(paths: List[str], options: Dict[str, Any]) -> List[Union[str, FileImage]]:
+    """Preprocesses the attached images of a prompt (runs on the images lane)."""
+    return [prepare_upload(path, options) for path in paths]
+
+class ThumbnailCache:
+    """
+    Decodes and downscales images on the images lane and caches the result.
+
+    Thumbnails are keyed by a hash of the image bytes (or of a file's path,
+    size and mtime) and the thumbnail size. Decoded textures are kept in a
+    bounded in-memory LRU, and the scaled PNGs in a bounded disk cache, so
+    reopening a chat with many photos neither blocks the main loop nor decodes
+    the originals again.
+    """
+
+    def __init__(self, cache_dir: str, memory_bytes: int = 64 * 1024 * 1024,
+                 disk_bytes: int = 256 * 1024 * 1024) -> None:
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._lock = threading.Lock()
+        self._memory: 'collections.OrderedDict[str, Tuple[Gdk.Texture, int]]' = collections.OrderedDict()
+        self._memory_used = 0
+        # Size of the disk cache, scanned on first write
+        self._disk_used: Optional[int] = None
+
+    # --- Public API (main thread) ---
+
+    def load_base64(self, data: str, size: int, on_ready: Callable[[Gdk.Texture], None]) -> None:
+        """Loads a thumbnail of a base64 encoded image and passes it to on_ready on the main thread."""
+        def task() -> None:
+            raw = decode_base64(data)
+            key = f"{hashlib.sha256(raw).hexdigest()}-{size}"
+            self._resolve(key, lambda: decode_scaled(raw, size), on_ready)
+
+        self._schedule(task)
+
+    def load_file(self, path: str, size: int, on_ready: Callable[[Gdk.Texture], None]) -> None:
+        """Loads a thumbnail of an image file, reading it off the main thread."""
+        def task() -> None:
+            stat = os.stat(path)
+            identity = f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}".encode('utf-8')
+            key = f"{hashlib.sha256(identity).hexdigest()}-{size}"
+
+            def decode() -> GdkPixbuf.Pixbuf:
+                with open(path, "rb") as f:
+                    return decode_scaled(f.read(), size)
+
+            self._resolve(key, decode, on_ready)
+
+        self._schedule(task)
+
+    def _schedule(self, task: Callable[[], None]) -> None:
+        def run() -> None:
+            try:
+                task()
+            except Exception as e:
+                print(f"Error loading image thumbnail: {e}")
+
+        from .session import worker
+        from .scheduler import LANE_IMAGES
+        worker.schedule(LANE_IMAGES, run)
+
+    # --- Worker side ---
+
+    def _resolve(self, key: str, decode: Callable[[], GdkPixbuf.Pixbuf],
+                 on_ready: Callable[[Gdk.Texture], None]) -> None:
+        texture = self._memory_get(key)
+        if texture is not None:
+            GLib.idle_add(self._deliver, texture, on_ready)
+            return
+
+        pixbuf = self._disk_get(key)
+        if pixbuf is None:
+            pixbuf = decode()
+            self._disk_put(key, pixbuf)
+        GLib.idle_add(self._store_and_deliver, key, pixbuf, on_ready)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".png")
+
+    def _disk_get(self, key: str) -> Optional[GdkPixbuf.Pixbuf]:
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
+            # The mtime orders entries for eviction
+            os.utime(path)
+            return pixbuf
+        except (GLib.Error, OSError) as e:
+            print(f"Discarding unreadable cached thumbnail {path}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _disk_put(self, key: str, pixbuf: GdkPixbuf.Pixbuf) -> None:
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pixbuf.savev(tmp_path, "png", [], [])
+            os.replace(tmp_path, path)
+            written = os.path.getsize(path)
+        except (GLib.Error, OSError) as e:
+            print(f"Error writing thumbnail cache entry: {e}")
+            return
+
+        with self._lock:
+            if self._disk_used is None:
+                self._disk_used = self._scan_disk()
+            else:
+                self._disk_used += written
+            if self._disk_used > self.disk_bytes:
+                self._disk_used = self._evict_disk(self.disk_bytes * 3 // 4)
+
+    def _cache_files(self) -> Dict[str, os.stat_result]:
+        files: Dict[str, os.stat_result] = {}
+        for root, _dirs, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".png"):
+                    path = os.path.join(root, name)
+                    try:
+                        files[path] = os.stat(path)
+                    except OSError:
+                        pass
+        return files
+
+    def _scan_disk(self) -> int:
+        return sum(st.st_size for st in self._cache_files().values())
+
+    def _evict_disk(self, target: int) -> int:
+        """Deletes the least recently used entries until the cache is under target bytes."""
+        files = self._cache_files()
+        used = sum(st.st_size for st in files.values())
+        for path, st in sorted(files.items(), key=lambda item: item[1].st_mtime):
+            if used <= target:
+                break
+            try:
+                os.remove(path)
+                used -= st.st_size
+            except OSError:
+                pass
+        return used
+
+    # --- Memory cache ---
+
+    def _memory_get(self, key: str) -> Optional[Gdk.Texture]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            self._memory.move_to_end(key)
+            return entry[0]
+
+    def _store_and_deliver(self, key: str, pixbuf: GdkPixbuf.Pixbuf,
+                           on_ready: Callable[[Gdk.Texture], None]) -> bool:
+        texture = Gdk.Texture.new_for_pixbuf(pixbuf)
+        cost = pixbuf.get_width() * pixbuf.get_height() * 4
+        with self._lock:
+            if key not in self._memory:
+                self._memory[key] = (texture, cost)
+                self._memory_used += cost
+                while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+                    _key, (_texture, evicted) = self._memory.popitem(last=False)
+                    self._memory_used -= evicted
+        return self._deliver(texture, on_ready)
+
+    def _deliver(self, texture: Gdk.Texture, on_ready: Callable[[Gdk.Texture], None]) -> bool:
+        on_ready(texture)
+        return False
+
+def thumbnail_picture(width: int, height: int) -> Gtk.Picture:
+    """Creates an empty picture that shows a placeholder until its thumbnail is set."""
+    picture = Gtk.Picture()
+    picture.set_content_fit(Gtk.ContentFit.SCALE_DOWN)
+    picture.set_size_request(width, height)
+    picture.set_can_shrink(True)
+    picture.add_css_class("image-placeholder")
+    return picture
+
+def show_thumbnail(picture: Gtk.Picture, texture: Gdk.Texture) -> None:
+    picture.remove_css_class("image-placeholder")
+    picture.set_paintable(texture)
+
+thumbnails = ThumbnailCache(os.path.join(GLib.get_user_cache_dir(), "gnollama", "thumbnails"))
@@ -0,0 +1,167 @@
+"""
+Client-side timing of generation streams.
+
+Ollama's reported durations stop at the server. StreamTimings records
+monotonic timestamps along the client path (request sent, response headers,
+each decoded chunk, first token, last chunk and every UI render flush) so
+network, server and UI delays can be told apart.
+
+Set GNOLLAMA_TIMINGS_LOG to a file path to append one JSON line per finished
+stream for offline analysis.
+"""
+import json
+import os
+import statistics
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional
+
+from .metrics import percentile
+
+TIMINGS_LOG_ENV = 'GNOLLAMA_TIMINGS_LOG'
+
+# Upper bounds (ms) of the inter-token gap histogram buckets; the last bucket is open ended
+GAP_BUCKETS_MS = (10, 25, 50, 100, 250, 500)
+
+class StreamTimings:
+    """
+    Monotonic timestamps for one generation stream.
+
+    mark_sent and mark_first_byte are called by the HTTP client, mark_chunk
+    and mark_last_chunk by the consumer thread and mark_render by the UI
+    thread after it has drawn new text, so all marks are lock protected.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.created: float = time.monotonic()
+        self.sent: Optional[float] = None
+        self.first_byte: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.last_chunk: Optional[float] = None
+        # Arrival times of token-carrying chunks, relative to `sent`
+        self.token_times: array = array('d')
+        self.chunk_count: int = 0
+        # Delay between a token arriving and the flush that drew it
+        self.render_lags: array = array('d')
+        self.render_count: int = 0
+        self._unrendered_since: Optional[float] = None
+        # Response lines the NDJSON decoder could not parse
+        self.malformed_lines: int = 0
+
+    def _rel(self, t: float) -> float:
+        return t - (self.sent if self.sent is not None else self.created)
+
+    def mark_sent(self) -> None:
+        with self._lock:
+            self.sent = time.monotonic()
+
+    def mark_first_byte(self) -> None:
+        with self._lock:
+            if self.first_byte is None:
+                self.first_byte = time.monotonic()
+
+    def mark_chunk(self, has_token: bool) -> None:
+        """Records a decoded chunk; has_token is True when it carries response or thinking text."""
+        now = time.monotonic()
+        with self._lock:
+            self.chunk_count += 1
+            if not has_token:
+                return
+            if self.first_token is None:
+                self.first_token = now
+            self.token_times.append(self._rel(now))
+            if self._unrendered_since is None:
+                self._unrendered_since = now
+
+    def mark_last_chunk(self) -> None:
+        with self._lock:
+            self.last_chunk = time.monotonic()
+
+    def mark_render(self) -> None:
+        """Records a UI flush that made all tokens received so far visible."""
+        now = time.monotonic()
+        with self._lock:
+            self.render_count += 1
+            if self._unrendered_since is not None:
+                self.render_lags.append(now - self._unrendered_since)
+                self._unrendered_since = None
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from sending the request to the first content or thinking token."""
+        with self._lock:
+            if self.first_token is None:
+                return None
+            return self._rel(self.first_token)
+
+    def summary(self) -> Dict[str, Any]:
+        """Returns derived timings in milliseconds."""
+        with self._lock:
+            gaps = [(b - a) * 1000 for a, b in zip(self.token_times, self.token_times[1:])]
+            lags = [lag * 1000 for lag in self.render_lags]
+            first_byte = self._rel(self.first_byte) * 1000 if self.first_byte is not None else None
+            ttft = self._rel(self.first_token) * 1000 if self.first_token is not None else None
+            stream = self._rel(self.last_chunk) * 1000 if self.last_chunk is not None else None
+            chunks = self.chunk_count
+            renders = self.render_count
+
+        histogram = [0] * (len(GAP_BUCKETS_MS) + 1)
+        for gap in gaps:
+            idx = 0
+            while idx < len(GAP_BUCKETS_MS) and gap >= GAP_BUCKETS_MS[idx]:
+                idx += 1
+            histogram[idx] += 1
+
+        return {
+            "first_byte_ms": first_byte,
+            "ttft_ms": ttft,
+            "stream_ms": stream,
+            "chunks": chunks,
+            "tokens": len(gaps) + 1 if ttft is not None else 0,
+            "gap_p50_ms": percentile(gaps, 50),
+            "gap_p95_ms": percentile(gaps, 95),
+            "gap_max_ms": max(gaps) if gaps else None,
+            "jitter_ms": statistics.pstdev(gaps) if len(gaps) > 1 else None,
+            "gap_histogram": histogram,
+            "renders": renders,
+            "render_lag_p50_ms": percentile(lags, 50),
+            "render_lag_p95_ms": percentile(lags, 95),
+            "render_lag_max_ms": max(lags) if lags else None,
+            "malformed_lines": self.malformed_lines,
+        }
+
+    def to_record(self, **extra: Any) -> Dict[str, Any]:
+        """Summary plus the raw token arrival offsets, for the debug export."""
+        record = dict(extra)
+        record["timestamp"] = time.time()
+        record.update(self.summary())
+        with self._lock:
+            record["token_offsets_ms"] = [round(t * 1000, 3) for t in self.token_times]
+            record["render_lags_ms"] = [round(t * 1000, 3) for t in self.render_lags]
+        return record
+
+def histogram_labels() -> List[str]:
+    """Human readable labels for the gap histogram buckets."""
+    labels = []
+    low = 0
+    for high in GAP_BUCKETS_MS:
+        labels.append(f"{low}–{high} ms")
+        low = high
+    labels.append(f"≥{low} ms")
+    return labels
+
+def export_enabled() -> bool:
+    return bool(os.environ.get(TIMINGS_LOG_ENV))
+
+def export(record: Dict[str, Any]) -> None:
+    """Appends a timing record to the file named by GNOLLAMA_TIMINGS_LOG, if set."""
+    path = os.environ.get(TIMINGS_LOG_ENV)
+    if not path:
+        return
+    try:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Error writing stream timings: {e}")
@@ -0,0 +1,125 @@
+import math
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Marks a missing alternative in the top_logprobs columns
+NO_TOKEN = 0xFFFFFFFF
+
+# Serialized layout: header, string lengths, UTF-8 strings, then the four columns
+_MAGIC = b'GLP1'
+_HEADER = struct.Struct('<4sHII')
+
+class LogprobTrace:
+    """
+    Columnar store of the logprobs of one response.
+
+    Token strings are interned once in a vocabulary and referenced by id, and
+    log-probabilities live in float32 arrays, so a long answer with
+    top_logprobs costs a few bytes per token instead of a dict per entry.
+    The streaming thread only appends; readers use len() as the number of
+    complete tokens, which is updated last.
+    """
+
+    def __init__(self, top_k: Optional[int] = None) -> None:
+        # Alternatives per token; taken from the first entry when not given
+        self.top_k: Optional[int] = top_k
+        self.strings: List[str] = []
+        self._vocab: Dict[str, int] = {}
+        self.token_ids = array('I')
+        self.logprobs = array('f')
+        # top_k entries per token, padded with NO_TOKEN / NaN
+        self.top_ids = array('I')
+        self.top_logprobs = array('f')
+
+    def __len__(self) -> int:
+        return len(self.logprobs)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'LogprobTrace':
+        # A trace is complete once it is stored in a message, so snapshots share it
+        return self
+
+    def _intern(self, token: str) -> int:
+        token_id = self._vocab.get(token)
+        if token_id is None:
+            token_id = len(self.strings)
+            self._vocab[token] = token_id
+            self.strings.append(token)
+        return token_id
+
+    def extend(self, entries: Iterable[Any]) -> None:
+        """Appends the logprobs entries of one streamed chunk."""
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            top = entry.get('top_logprobs') or []
+            if self.top_k is None:
+                self.top_k = len(top)
+            for alt in top[:self.top_k]:
+                self.top_ids.append(self._intern(str(alt.get('token', ''))))
+                self.top_logprobs.append(float(alt.get('logprob', math.nan)))
+            for _missing in range(self.top_k - min(len(top), self.top_k)):
+                self.top_ids.append(NO_TOKEN)
+                self.top_logprobs.append(math.nan)
+            self.token_ids.append(self._intern(str(entry.get('token', ''))))
+            self.logprobs.append(float(entry.get('logprob', 0.0)))
+
+    def token(self, index: int) -> str:
+        return self.strings[self.token_ids[index]]
+
+    def probability(self, index: int) -> float:
+        return math.exp(self.logprobs[index])
+
+    def alternatives(self, index: int) -> List[Tuple[str, float]]:
+        """Returns the (token, logprob) alternatives recorded for a token."""
+        k = self.top_k or 0
+        result = []
+        for pos in range(index * k, index * k + k):
+            token_id = self.top_ids[pos]
+            if token_id != NO_TOKEN:
+                result.append((self.strings[token_id], self.top_logprobs[pos]))
+        return result
+
+    def to_bytes(self) -> bytes:
+        """Serializes the trace to a compact little-endian blob."""
+        encoded = [s.encode('utf-8') for s in self.strings]
+        lengths = array('I', (len(e) for e in encoded))
+        n = len(self)
+        k = self.top_k or 0
+        columns = [lengths, self.token_ids[:n], self.logprobs[:n], self.top_ids[:n * k], self.top_logprobs[:n * k]]
+        if sys.byteorder == 'big':
+            for column in columns:
+                column.byteswap()
+        header = _HEADER.pack(_MAGIC, k, n, len(encoded))
+        return b''.join([header, columns[0].tobytes(), b''.join(encoded)] + [c.tobytes() for c in columns[1:]])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'LogprobTrace':
+        """Restores a trace written by to_bytes."""
+        magic, k, n, count = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC:
+            raise ValueError("Not a logprobs blob")
+        view = memoryview(data)
+        offset = _HEADER.size
+
+        def take(typecode: str, length: int) -> array:
+            nonlocal offset
+            column = array(typecode)
+            size = column.itemsize * length
+            column.frombytes(view[offset:offset + size])
+            offset += size
+            if sys.byteorder == 'big':
+                column.byteswap()
+            return column
+
+        lengths = take('I', count)
+        trace = cls(top_k=k)
+        for length in lengths:
+            trace._intern(bytes(view[offset:offset + length]).decode('utf-8'))
+            offset += length
+        trace.token_ids = take('I', n)
+        trace.logprobs = take('f', n)
+        trace.top_ids = take('I', n * k)
+        trace.top_logprobs = take('f', n * k)
+        return trace
@@ -18,6 +18,7 @@ class GnollamaApplication(Adw.Application):
         self.create_action('quit', lambda *_: self.quit(), ['<control>q'])
         self.create_action('about', self.on_about_action)
         self.set_accels_for_action('win.new_chat_tab', ['<control>n'])
+        self.set_accels_for_action('win.search_chats', ['<control><shift>f'])
 
     def do_activate(self) -> None:
         """Called when the application is activated.
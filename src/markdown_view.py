@@ -1,13 +1,7 @@
-import html
-import re
-from typing import List, Dict, Any, Optional, Tuple, Union
-from html.parser import HTMLParser
-from gi.repository import Gtk, Gdk, Pango, GObject
-
-try:
-    import markdown
-except ImportError:
-    markdown = None
+import weakref
+from typing import List, Dict, Any, Optional
+from gi.repository import Gtk, Gdk, Pango, GObject, GLib
+from .markdown_parser import parse_blocks, markdown_to_pango
 
 try:
     import gi
@@ -23,184 +17,79 @@ try:
 except (ImportError, ValueError):
     Adw = None
 
-class PangoMarkupParser(HTMLParser):
+# Language and style scheme lookups are shared by every code block
+_languages: Dict[str, Any] = {}
+_schemes: Dict[bool, Any] = {}
+
+def _get_language(lang: str) -> Any:
+    """Returns the cached GtkSource language for a fence label, or None."""
+    if not GtkSource or not lang:
+        return None
+    if lang not in _languages:
+        _languages[lang] = GtkSource.LanguageManager.get_default().get_language(lang)
+    return _languages[lang]
+
+def _get_scheme(dark: bool) -> Any:
+    """Returns the cached style scheme for the light or dark theme."""
+    if not GtkSource:
+        return None
+    if dark not in _schemes:
+        sm = GtkSource.StyleSchemeManager.get_default()
+        _schemes[dark] = sm.get_scheme("oblivion" if dark else "classic")
+    return _schemes[dark]
+
+def _is_dark() -> bool:
+    return Adw.StyleManager.get_default().get_dark() if Adw else True
+
+class CodeViewRegistry:
     """
-    A simple HTML parser that converts a subset of HTML into Pango markup.
-    Also handles ASCII table rendering for basic HTML tables.
+    Keeps every GtkSource code block in sync with the light/dark theme.
+
+    One StyleManager connection serves all blocks. A theme switch restyles
+    realized blocks in a single idle pass; unrealized ones pick up the scheme
+    when they are realized. Blocks are held weakly, so destroyed bubbles
+    drop out without leaving handlers behind.
     """
+
     def __init__(self) -> None:
-        super().__init__()
-        self.output: List[str] = []
-        self.tags: List[str] = []
-        
-        # Table state
-        self.in_table: bool = False
-        self.table_rows: List[List[str]] = []
-        self.current_row: List[str] = []
-        self.in_cell: bool = False
-        self.cell_content: str = "" # Buffer for cell content
-        
-    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
-        if tag == 'table':
-            self.in_table = True
-            self.table_rows = []
-            self.output.append("\n") # Spacing before table
-        elif tag == 'tr':
-            if self.in_table:
-                self.current_row = []
-        elif tag in ['td', 'th']:
-            if self.in_table:
-                self.in_cell = True
-                self.cell_content = ""
-            else:
-                self.output.append(" | ")
-        elif tag in ['h1', 'h2']:
-            self.output.append("\n<span size='xx-large' weight='bold'>")
-        elif tag == 'h3':
-            self.output.append("\n<span size='x-large' weight='bold'>")
-        elif tag in ['h4', 'h5', 'h6']:
-            self.output.append("\n<span size='large' weight='bold'>")
-        elif tag in ['b', 'strong']:
-            tag_str = "<b>"
-            if self.in_table: self.cell_content += tag_str
-            else: self.output.append(tag_str)
-        elif tag in ['i', 'em']:
-            tag_str = "<i>"
-            if self.in_table: self.cell_content += tag_str
-            else: self.output.append(tag_str)
-        elif tag in ['s', 'del', 'strike']:
-            tag_str = "<s>"
-            if self.in_table: self.cell_content += tag_str
-            else: self.output.append(tag_str)
-        elif tag in ['code', 'tt']:
-            tag_str = "<tt>"
-            if self.in_table: self.cell_content += tag_str
-            else: self.output.append(tag_str)
-        elif tag == 'p':
-            if not self.in_table and self.output and not self.output[-1].endswith("\n\n"):
-                self.output.append("\n")
-        elif tag == 'ul':
-            self.output.append("\n")
-        elif tag == 'li':
-            self.output.append("• ")
-        elif tag == 'a':
-            href = dict(attrs).get('href', '')
-            tag_str = f"<a href='{html.escape(href)}'>"
-            if self.in_table: 
-                 self.cell_content += tag_str
-            else:
-                self.output.append(tag_str)
-        elif tag == 'br':
-            if self.in_table: self.cell_content += " "
-            else: self.output.append("\n")
-        elif tag == 'hr':
-            self.output.append("\n" + "─" * 20 + "\n")
-        elif tag == 'pre':
-            self.output.append("\n  ") 
-        elif tag == 'blockquote':
-            self.output.append("\n  <i>") # Indent and italicize quote
-            
-    def handle_endtag(self, tag: str) -> None:
-        if tag == 'table':
-            self.in_table = False
-            self.render_ascii_table()
-            self.output.append("\n")
-        elif tag == 'tr':
-            if self.in_table:
-                self.table_rows.append(self.current_row)
-            else:
-                self.output.append("\n")
-        elif tag in ['td', 'th']:
-            if self.in_table:
-                self.in_cell = False
-                self.current_row.append(self.cell_content.strip())
-        elif tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            self.output.append("</span>\n")
-        elif tag in ['b', 'strong']:
-            tag_str = "</b>"
-            if self.in_table: self.cell_content += tag_str
-            else: self.output.append(tag_str)
-        elif tag in ['i', 'em']:
-            tag_str = "</i>"
-            if self.in_table: self.cell_content += tag_str
-            else: self.output.append(tag_str)
-        elif tag in ['s', 'del', 'strike']:
-            tag_str = "</s>"
-            if self.in_table: self.cell_content += tag_str
-            else: self.output.append(tag_str)
-        elif tag in ['code', 'tt']:
-            tag_str = "</tt>"
-            if self.in_table: self.cell_content += tag_str
-            else: self.output.append(tag_str)
-        elif tag == 'p':
-            if not self.in_table: self.output.append("\n")
-        elif tag == 'a':
-            tag_str = "</a>"
-            if self.in_table: self.cell_content += tag_str
-            else: self.output.append(tag_str)
-        elif tag == 'li':
-            self.output.append("\n")
-        elif tag == 'blockquote':
-            self.output.append("</i>\n")
-        elif tag == 'pre':
-            self.output.append("\n")
-
-    def handle_data(self, data: str) -> None:
-        if self.in_table and self.in_cell:
-            self.cell_content += html.escape(data) 
-        elif not self.in_table:
-            self.output.append(html.escape(data))
-    
-    def render_ascii_table(self) -> None:
-        """Renders the collected table rows as an ASCII table using Pango tags for styling."""
-        if not self.table_rows:
+        self._blocks: 'weakref.WeakSet[Gtk.Box]' = weakref.WeakSet()
+        self._dark: Optional[bool] = None
+        self._handler_id: int = 0
+        self._apply_scheduled: bool = False
+
+    def register(self, wrapper: Gtk.Box) -> None:
+        """Styles a new code block and tracks it for later theme changes."""
+        if self._dark is None:
+            self._dark = _is_dark()
+            if Adw:
+                sm = Adw.StyleManager.get_default()
+                self._handler_id = sm.connect("notify::dark", self._on_dark_changed)
+        self._blocks.add(wrapper)
+        self._apply(wrapper)
+        wrapper.connect("realize", self._apply)
+
+    def _apply(self, wrapper: Gtk.Box, *args: Any) -> None:
+        if getattr(wrapper, '_dark', None) == self._dark:
             return
-            
-        def visible_len(s: str) -> int:
-            """Helper to get visible length (ignoring pango tags)."""
-            return len(re.sub(r'<[^>]+>', '', s))
-
-        # Handle multi-line cells: replace <br> with \n and split
-        processed_rows = []
-        for row in self.table_rows:
-            processed_row = []
-            for cell in row:
-                cell_text = re.sub(r'<br\s*/?>', '\n', cell, flags=re.IGNORECASE)
-                lines = cell_text.split('\n')
-                processed_row.append(lines)
-            processed_rows.append(processed_row)
-
-        # Calc max widths
-        col_widths: Dict[int, int] = {}
-        for row in processed_rows:
-            for i, cell_lines in enumerate(row):
-                max_line_len = max((visible_len(line) for line in cell_lines), default=0)
-                col_widths[i] = max(col_widths.get(i, 0), max_line_len)
-        
-        # Generate lines
-        lines: List[str] = []
-        for row in processed_rows:
-            max_height = max((len(cell_lines) for cell_lines in row), default=1)
-            for h in range(max_height):
-                line_parts: List[str] = []
-                for i, cell_lines in enumerate(row):
-                    width = col_widths.get(i, 0)
-                    if h < len(cell_lines):
-                        cell_line = cell_lines[h]
-                    else:
-                        cell_line = ""
-                    v_len = visible_len(cell_line)
-                    padding = width - v_len
-                    line_parts.append(cell_line + " " * padding)
-                lines.append(" | ".join(line_parts))
-            
-        table_str = "\n".join(lines)
-        self.output.append(f"<tt>{table_str}</tt>")
+        scheme = _get_scheme(self._dark)
+        if scheme:
+            wrapper._view.get_buffer().set_style_scheme(scheme)
+        wrapper._dark = self._dark
 
-    def get_markup(self) -> str:
-        """Returns the accumulated Pango markup."""
-        return "".join(self.output).strip()
+    def _on_dark_changed(self, style_manager: Any, pspec: Any) -> None:
+        self._dark = style_manager.get_dark()
+        if not self._apply_scheduled:
+            self._apply_scheduled = True
+            GLib.idle_add(self._apply_all)
 
+    def _apply_all(self) -> bool:
+        self._apply_scheduled = False
+        for wrapper in list(self._blocks):
+            if wrapper.get_realized():
+                self._apply(wrapper)
+        return False
+
+code_views = CodeViewRegistry()
 
 class MarkdownView(Gtk.Box):
     """
@@ -215,42 +104,68 @@ class MarkdownView(Gtk.Box):
         self.set_spacing(12)
         self.add_css_class("markdown-view")
         self._text: str = text
-        
-        self._theme_handler_id = None
-        if Adw:
-            sm = Adw.StyleManager.get_default()
-            self._theme_handler_id = sm.connect("notify::dark", self._on_theme_changed)
-            self.connect("destroy", self._on_destroy)
+        # Code blocks whose highlighting waits until they are closed or scrolled into view
+        self._pending_highlight: List[Gtk.Box] = []
+        self._scrolled: Optional[Gtk.ScrolledWindow] = None
+        self._adjustment_handlers: List[int] = []
+        self.connect("map", self._on_map)
+        self.connect("unmap", self._on_unmap)
             
         self.render()
 
-    def _on_destroy(self, widget: Gtk.Widget) -> None:
-        if Adw and self._theme_handler_id:
-            sm = Adw.StyleManager.get_default()
-            sm.disconnect(self._theme_handler_id)
+    def _on_map(self, widget: Gtk.Widget) -> None:
+        """Watches the enclosing scrolled window so deferred code blocks light up when scrolled to."""
+        self._scrolled = self.get_ancestor(Gtk.ScrolledWindow)
+        if self._scrolled:
+            adjustment = self._scrolled.get_vadjustment()
+            self._adjustment_handlers = [
+                adjustment.connect("value-changed", self._check_pending_highlight),
+                adjustment.connect("changed", self._check_pending_highlight),
+            ]
+        self._check_pending_highlight()
 
-    def _on_theme_changed(self, style_manager: Any, pspec: Any) -> None:
-        is_dark = style_manager.get_dark()
-        scheme_name = "oblivion" if is_dark else "classic"
-        
-        if not GtkSource:
-            return
-            
-        sm = GtkSource.StyleSchemeManager.get_default()
-        scheme = sm.get_scheme(scheme_name)
-        if not scheme:
+    def _on_unmap(self, widget: Gtk.Widget) -> None:
+        if self._scrolled:
+            adjustment = self._scrolled.get_vadjustment()
+            for handler_id in self._adjustment_handlers:
+                adjustment.disconnect(handler_id)
+        self._adjustment_handlers = []
+        self._scrolled = None
+
+    def _in_viewport(self, widget: Gtk.Widget) -> bool:
+        """Whether any part of the widget is inside the visible area of the enclosing scrolled window."""
+        if not widget.get_mapped():
+            return False
+        if not self._scrolled:
+            return True
+        ok, bounds = widget.compute_bounds(self._scrolled)
+        if not ok:
+            return False
+        top = bounds.get_y()
+        return top + bounds.get_height() >= 0 and top <= self._scrolled.get_height()
+
+    def _check_pending_highlight(self, *args: Any) -> None:
+        """Enables highlighting for deferred code blocks that have become visible."""
+        if not self._pending_highlight:
             return
-            
-        curr_child = self.get_first_child()
-        while curr_child:
-            if curr_child.has_css_class("code-block"):
-                scrolled = curr_child.get_first_child()
-                if isinstance(scrolled, Gtk.ScrolledWindow):
-                    view = scrolled.get_child()
-                    if isinstance(view, GtkSource.View):
-                        buffer = view.get_buffer()
-                        buffer.set_style_scheme(scheme)
-            curr_child = curr_child.get_next_sibling()
+        still_pending = []
+        for wrapper in self._pending_highlight:
+            if wrapper.get_parent() is not self or wrapper._highlighted:
+                continue
+            if self._in_viewport(wrapper):
+                self._enable_highlighting(wrapper)
+            else:
+                still_pending.append(wrapper)
+        self._pending_highlight = still_pending
+
+    def _enable_highlighting(self, wrapper: Gtk.Box) -> None:
+        """Applies the block's language and turns on syntax highlighting."""
+        buffer = wrapper._view.get_buffer()
+        language = _get_language(wrapper._lang)
+        if language:
+            buffer.set_language(language)
+        buffer.set_highlight_syntax(True)
+        wrapper._highlighted = True
 
     def update(self, text: str) -> None:
         """Updates the view with new markdown text."""
@@ -264,71 +179,7 @@ class MarkdownView(Gtk.Box):
 
     def _parse_blocks(self, text: str) -> List[Dict[str, Any]]:
         """Parses markdown text into a list of block dictionaries."""
-        blocks: List[Dict[str, Any]] = []
-        lines = text.split('\n')
-        i = 0
-        n = len(lines)
-        
-        while i < n:
-            line = lines[i]
-            match = re.match(r'^(\s*)(`{3,}|~{3,})(.*)$', line)
-            
-            if match:
-                indent, fence, raw_lang = match.groups()
-                lang = raw_lang.strip()
-                
-                content_start_idx = i + 1
-                if not lang and content_start_idx < n:
-                    next_line = lines[content_start_idx].strip()
-                    clean_lang = next_line.strip('`')
-                    lower_clean = clean_lang.lower()
-                    
-                    if lower_clean in ['markdown', 'md', 'python', 'py', 'bash', 'sh', 'javascript', 'js', 'html', 'css', 'json', 'xml', 'sql', 'java', 'c', 'cpp', 'go', 'rs', 'rust']:
-                        lang = clean_lang
-                        content_start_idx += 1
-                    elif re.match(r'^[-*_]{3,}\s*$', next_line) or re.match(r'^#{1,6}\s', next_line):
-                        lang = 'markdown'
-                
-                code_lines = []
-                i = content_start_idx
-                while i < n:
-                    curr_line = lines[i]
-                    close_match = re.match(r'^(\s*)(`{3,}|~{3,})\s*$', curr_line)
-                    if close_match:
-                        c_indent, c_fence = close_match.groups()
-                        if c_fence[0] == fence[0] and len(c_fence) >= len(fence):
-                            i += 1
-                            break
-                    
-                    code_lines.append(curr_line)
-                    i += 1
-                
-                if lang.lower() in ['markdown', 'md']:
-                    inner_blocks = self._parse_blocks("\n".join(code_lines))
-                    blocks.extend(inner_blocks)
-                else:
-                    blocks.append({
-                        'type': 'code',
-                        'lang': lang,
-                        'content': "\n".join(code_lines)
-                    })
-                continue
-            
-            text_buffer = []
-            while i < n:
-                curr_line = lines[i]
-                if re.match(r'^\s*(`{3,}|~{3,})', curr_line):
-                    break
-                text_buffer.append(curr_line)
-                i += 1
-            
-            if text_buffer:
-                blocks.append({
-                    'type': 'text',
-                    'content': "\n".join(text_buffer)
-                })
-                
-        return blocks
+        return parse_blocks(text)
 
     def _sync_view(self, blocks: List[Dict[str, Any]]) -> None:
         """Syncs the Gtk widget list with the parsed blocks, minimizing churn."""
@@ -342,7 +193,7 @@ class MarkdownView(Gtk.Box):
                 is_text = isinstance(curr_child, Gtk.Label)
                 
                 if block['type'] == 'code' and is_code:
-                    self._update_code_block(curr_child, block['lang'], block['content'])
+                    self._update_code_block(curr_child, block['lang'], block['content'], block['closed'])
                     match = True
                 elif block['type'] == 'text' and is_text:
                     self._update_text_block(curr_child, block['content'])
@@ -376,32 +227,22 @@ class MarkdownView(Gtk.Box):
              self._update_text_block(label, block['content'])
              return label
         else: # code
-             return self._create_code_widget(block['lang'], block['content'])
+             return self._create_code_widget(block['lang'], block['content'], block['closed'])
 
-    def _create_code_widget(self, lang: str, code: str) -> Gtk.Box:
-        """Creates a styled code view widget, using GtkSource if available."""
+    def _create_code_widget(self, lang: str, code: str, closed: bool = True) -> Gtk.Box:
+        """
+        Creates a styled code view widget, using GtkSource if available.
+
+        Highlighting starts once the block is closed or scrolled into view, so
+        off-screen blocks that are still streaming don't re-highlight on every flush.
+        """
         wrapper = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         wrapper.add_css_class("code-block")
         wrapper.add_css_class("margin-v-6")
         
         if GtkSource:
             buffer = GtkSource.Buffer()
-            lm = GtkSource.LanguageManager.get_default()
-            language = lm.get_language(lang)
-            if language:
-                buffer.set_language(language)
-            
-            sm = GtkSource.StyleSchemeManager.get_default()
-            scheme_name = "oblivion"
-            if Adw:
-                style_manager = Adw.StyleManager.get_default()
-                if not style_manager.get_dark():
-                    scheme_name = "classic"
-                    
-            scheme = sm.get_scheme(scheme_name) 
-            if scheme:
-                buffer.set_style_scheme(scheme)
-                
+            buffer.set_highlight_syntax(False)
             view = GtkSource.View.new_with_buffer(buffer)
             view.set_show_line_numbers(False)
         else:
@@ -424,6 +265,18 @@ class MarkdownView(Gtk.Box):
         scrolled.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.NEVER)
         
         wrapper.append(scrolled)
+
+        # Mirror of the buffer contents, so updates don't have to read the buffer back
+        wrapper._view = view
+        wrapper._code = code
+        wrapper._lang = lang
+        wrapper._highlighted = not GtkSource
+        if GtkSource:
+            code_views.register(wrapper)
+            if closed:
+                self._enable_highlighting(wrapper)
+            else:
+                self._pending_highlight.append(wrapper)
         return wrapper
 
     def _update_text_block(self, label: Gtk.Label, text: str) -> None:
@@ -437,28 +290,24 @@ class MarkdownView(Gtk.Box):
             label.set_markup("")
             return
         
-        try:
-            text = re.sub(r'~~(.*?)~~', r'<s>\1</s>', text)
-            if markdown:
-                html_text = markdown.markdown(text, extensions=['extra', 'fenced_code'])
+        label.set_markup(markdown_to_pango(text))
+
+    def _update_code_block(self, wrapper: Gtk.Box, lang: str, code: str, closed: bool = True) -> None:
+        """Updates an existing code block widget, appending only the new tail while streaming."""
+        buffer = wrapper._view.get_buffer()
+        current = wrapper._code
+        if code != current:
+            if code.startswith(current):
+                buffer.insert(buffer.get_end_iter(), code[len(current):])
             else:
-                html_text = html.escape(text)
-            parser = PangoMarkupParser()
-            parser.feed(html_text)
-            markup = parser.get_markup()
-        except Exception:
-            markup = html.escape(text)
-            
-        label.set_markup(markup)
-
-    def _update_code_block(self, wrapper: Gtk.Box, lang: str, code: str) -> None:
-        """Updates an existing code block widget with new content."""
-        scrolled = wrapper.get_first_child()
-        if isinstance(scrolled, Gtk.ScrolledWindow):
-            view = scrolled.get_child()
-            if isinstance(view, Gtk.TextView):
-                buffer = view.get_buffer()
-                start, end = buffer.get_bounds()
-                current = buffer.get_text(start, end, True)
-                if current != code:
-                    buffer.set_text(code)
+                buffer.set_text(code)
+            wrapper._code = code
+
+        # The fence's language label can still be streaming in
+        if lang != wrapper._lang:
+            wrapper._lang = lang
+            if wrapper._highlighted and GtkSource:
+                buffer.set_language(_get_language(lang))
+
+        if closed and not wrapper._highlighted:
+            self._enable_highlighting(wrapper)
@@ -0,0 +1,93 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Counters Ollama reports in the final chunk of a generation
+METRIC_KEYS = [
+    'total_duration', 'load_duration', 'prompt_eval_count',
+    'prompt_eval_duration', 'eval_count', 'eval_duration'
+]
+
+# Percentiles shown on the dashboard
+PERCENTILES = (50, 95)
+
+def final_counters(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """Extracts the performance counters from a final chunk."""
+    return {k: chunk[k] for k in METRIC_KEYS if k in chunk}
+
+def tokens_per_second(chunk: Dict[str, Any]) -> Optional[float]:
+    """Returns generation speed from eval_count / eval_duration, if both are present."""
+    eval_count = chunk.get('eval_count')
+    eval_duration = chunk.get('eval_duration')
+    if eval_count and eval_duration:
+        return eval_count / (eval_duration / 1e9)
+    return None
+
+def build_metric(host: str, model: str, endpoint: str, options: Optional[Dict[str, Any]],
+                 chunk: Dict[str, Any], ttft_s: Optional[float], chat_id: Optional[str] = None) -> Dict[str, Any]:
+    """Builds a generation_metrics row from a final chunk and the client-measured TTFT."""
+    def ms(key: str) -> Optional[float]:
+        return chunk[key] / 1e6 if key in chunk else None
+
+    return {
+        "created_at": time.time(),
+        "host": host,
+        "model": model,
+        "endpoint": endpoint,
+        "chat_id": chat_id,
+        "options": options or None,
+        "ttft_ms": ttft_s * 1000 if ttft_s is not None else None,
+        "tokens_per_s": tokens_per_second(chunk),
+        "load_ms": ms('load_duration'),
+        "total_ms": ms('total_duration'),
+        "prompt_eval_count": chunk.get('prompt_eval_count'),
+        "prompt_eval_ms": ms('prompt_eval_duration'),
+        "eval_count": chunk.get('eval_count'),
+        "eval_ms": ms('eval_duration'),
+    }
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Returns the pct-th percentile of values using linear interpolation."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def _stats(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"count": len(rows)}
+    for field in ("ttft_ms", "tokens_per_s", "load_ms"):
+        values = [r[field] for r in rows if r.get(field) is not None]
+        stats[field] = {p: percentile(values, p) for p in PERCENTILES}
+    return stats
+
+def summarize(rows: List[Dict[str, Any]], bucket_seconds: int = 86400) -> List[Dict[str, Any]]:
+    """
+    Groups metric rows by (model, host) and computes percentiles overall and
+    per time bucket (one local day by default), newest bucket first.
+    """
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault((row["model"], row["host"]), []).append(row)
+
+    summary = []
+    for (model, host), group_rows in sorted(groups.items()):
+        buckets: Dict[int, List[Dict[str, Any]]] = {}
+        for row in group_rows:
+            # Align buckets to local midnight rather than UTC
+            offset = time.localtime(row["created_at"]).tm_gmtoff
+            start = int((row["created_at"] + offset) // bucket_seconds * bucket_seconds - offset)
+            buckets.setdefault(start, []).append(row)
+        summary.append({
+            "model": model,
+            "host": host,
+            "overall": _stats(group_rows),
+            "buckets": [
+                dict(_stats(bucket_rows), start=start)
+                for start, bucket_rows in sorted(buckets.items(), reverse=True)
+            ],
+        })
+    return summary
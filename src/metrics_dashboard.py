@@ -0,0 +1,93 @@
+import time
+from typing import Any, List, Dict, Optional
+from gi.repository import Adw, Gtk, GLib
+from .storage import ChatStorage
+from .metrics import summarize
+
+# Seconds covered by each entry of the period dropdown (None means all time)
+PERIODS = [86400, 7 * 86400, 30 * 86400, None]
+
+def _format_value(values: Dict[int, Optional[float]], fmt: str) -> Optional[str]:
+    if values.get(50) is None:
+        return None
+    return f"{fmt.format(values[50])} / {fmt.format(values[95])}"
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    """Formats p50 / p95 for TTFT, generation speed and load time."""
+    parts = [_("{0} runs").format(stats['count'])]
+    ttft = _format_value(stats['ttft_ms'], "{:.0f}")
+    if ttft:
+        parts.append(_("TTFT {0} ms").format(ttft))
+    speed = _format_value(stats['tokens_per_s'], "{:.1f}")
+    if speed:
+        parts.append(_("{0} tokens/s").format(speed))
+    load = _format_value(stats['load_ms'], "{:.0f}")
+    if load:
+        parts.append(_("load {0} ms").format(load))
+    return " · ".join(parts)
+
+@Gtk.Template(resource_path='/io/github/jackrabbithanna/Gnollama/metrics_dashboard.ui')
+class MetricsDashboard(Adw.Window):
+    """Window showing generation performance percentiles per model and host over time."""
+    __gtype_name__ = 'MetricsDashboard'
+
+    period_dropdown: Gtk.DropDown = Gtk.Template.Child()
+    refresh_button: Gtk.Button = Gtk.Template.Child()
+    summary_label: Gtk.Label = Gtk.Template.Child()
+    metrics_group: Adw.PreferencesGroup = Gtk.Template.Child()
+
+    def __init__(self, storage: ChatStorage, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.storage: ChatStorage = storage
+        self.rows: List[Gtk.Widget] = []
+
+        self.refresh_button.connect("clicked", lambda btn: self.load_metrics())
+        self.period_dropdown.connect("notify::selected", lambda *args: self.load_metrics())
+        self.load_metrics()
+
+    def load_metrics(self) -> None:
+        """Reads and aggregates the metrics for the selected period in the background."""
+        period = PERIODS[self.period_dropdown.get_selected()]
+        since = time.time() - period if period else 0.0
+        host_names = {h['hostname']: h['name'] for h in self.storage.get_all_hosts()}
+        self.summary_label.set_label(_("Loading..."))
+
+        def thread_func() -> None:
+            try:
+                summary = summarize(self.storage.get_generation_metrics(since))
+            except Exception as e:
+                print(f"Error loading generation metrics: {e}")
+                summary = []
+            GLib.idle_add(self.populate, summary, host_names)
+
+        from .session import worker
+        from .scheduler import LANE_DISK
+        worker.schedule(LANE_DISK, thread_func)
+
+    def populate(self, summary: List[Dict[str, Any]], host_names: Dict[str, str]) -> None:
+        for row in self.rows:
+            self.metrics_group.remove(row)
+        self.rows.clear()
+
+        total = sum(entry['overall']['count'] for entry in summary)
+        self.summary_label.set_label(_("{0} generations").format(total))
+
+        if not summary:
+            row = Adw.ActionRow()
+            row.set_title(_("No generations recorded in this period"))
+            self.metrics_group.add(row)
+            self.rows.append(row)
+            return
+
+        for entry in summary:
+            row = Adw.ExpanderRow()
+            row.set_title(entry['model'])
+            host = host_names.get(entry['host'], entry['host'])
+            row.set_subtitle(f"{host} — {format_stats(entry['overall'])}")
+            for bucket in entry['buckets']:
+                day_row = Adw.ActionRow()
+                day_row.set_title(GLib.DateTime.new_from_unix_local(bucket['start']).format("%x"))
+                day_row.set_subtitle(format_stats(bucket))
+                row.add_row(day_row)
+            self.metrics_group.add(row)
+            self.rows.append(row)
@@ -93,7 +93,8 @@ class ModelManagerDialog(Adw.Window):
                 GLib.idle_add(self.show_error, _("Connection Error"), str(e))
             
         from .session import worker
-        worker.submit(thread_func)
+        from .scheduler import LANE_METADATA, PRIORITY_HIGH
+        worker.schedule(LANE_METADATA, thread_func, priority=PRIORITY_HIGH)
 
     def update_models_list(self, models: List[Dict[str, Any]]) -> None:
         """Updates the UI with a new list of models."""
@@ -155,7 +156,8 @@ class ModelManagerDialog(Adw.Window):
                 GLib.idle_add(self.show_error, _("Failed to fetch details"), str(e))
                 
         from .session import worker
-        worker.submit(thread_func)
+        from .scheduler import LANE_METADATA
+        worker.schedule(LANE_METADATA, thread_func)
 
     def show_error(self, title: str, msg: str) -> None:
         """Displays an error message dialog."""
@@ -189,7 +191,8 @@ class ModelManagerDialog(Adw.Window):
                     except ollama.OllamaError as e:
                         GLib.idle_add(self.show_error, _("Delete Failed"), str(e))
                 from .session import worker
-                worker.submit(thread_func)
+                from .scheduler import LANE_METADATA
+                worker.schedule(LANE_METADATA, thread_func)
             d.close()
             
         dialog.connect("response", on_response)
@@ -337,7 +340,9 @@ class PullModelDialog(Adw.Window):
         self.status_label.set_text(_("Starting pull..."))
         
         from .session import worker
-        self.pull_future = worker.submit(self.pull_task, model_name, self.insecure_check.get_active())
+        from .scheduler import LANE_BULK
+        self.pull_future = worker.schedule(LANE_BULK, self.pull_task, model_name, self.insecure_check.get_active(),
+                                           host=self.hostname)
 
     def pull_task(self, model_name: str, insecure: bool) -> None:
         """Thread worker to stream pull status."""
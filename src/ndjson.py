@@ -0,0 +1,87 @@
+import json
+from typing import Any, BinaryIO, Callable, Iterator, List, Optional, Tuple
+
+# Optional faster JSON parsers, tried in order; the stdlib is the fallback
+_decode_errors: Tuple[type, ...] = (ValueError,)
+try:
+    import orjson
+    loads: Callable[[bytes], Any] = orjson.loads
+    BACKEND = "orjson"
+except ImportError:
+    try:
+        import msgspec
+        loads = msgspec.json.Decoder().decode
+        _decode_errors = (ValueError, msgspec.DecodeError)
+        BACKEND = "msgspec"
+    except ImportError:
+        loads = json.loads
+        BACKEND = "json"
+
+# Bytes requested per read; read1() returns whatever has arrived, up to this
+BLOCK_SIZE = 64 * 1024
+# Length of the malformed line excerpt kept for the report
+EXCERPT_LENGTH = 200
+
+class NDJSONDecoder:
+    """
+    Incremental newline-delimited JSON decoder.
+
+    Bytes are fed in blocks of any size; lines split across blocks are kept
+    until their newline arrives. Lines that do not parse are counted, and the
+    first one is kept for the report, instead of being dropped silently.
+    """
+
+    def __init__(self) -> None:
+        self._pending = bytearray()
+        self.lines: int = 0
+        self.malformed: int = 0
+        self.first_malformed: Optional[bytes] = None
+
+    def feed(self, data: bytes) -> List[Any]:
+        """Returns the objects of every line completed by data."""
+        self._pending += data
+        end = self._pending.rfind(b"\n")
+        if end < 0:
+            return []
+        complete = bytes(self._pending[:end])
+        del self._pending[:end + 1]
+        return [obj for obj in map(self._decode, complete.split(b"\n")) if obj is not None]
+
+    def close(self) -> List[Any]:
+        """Decodes a final line that was not newline-terminated."""
+        rest = bytes(self._pending)
+        self._pending.clear()
+        obj = self._decode(rest)
+        return [obj] if obj is not None else []
+
+    def _decode(self, line: bytes) -> Any:
+        line = line.strip()
+        if not line:
+            return None
+        self.lines += 1
+        try:
+            return loads(line)
+        except _decode_errors:
+            self.malformed += 1
+            if self.first_malformed is None:
+                self.first_malformed = line[:EXCERPT_LENGTH]
+            return None
+
+    def report(self) -> str:
+        return f"{self.malformed} of {self.lines} lines malformed, first: {self.first_malformed!r}"
+
+def iter_ndjson(stream: BinaryIO, decoder: NDJSONDecoder,
+                block_size: int = BLOCK_SIZE) -> Iterator[Any]:
+    """
+    Yields the objects of an NDJSON stream as soon as their line is complete.
+
+    Uses read1() where available (HTTP responses, buffered files), which
+    returns the bytes already received instead of waiting for a full block.
+    """
+    read = getattr(stream, 'read1', stream.read)
+    while True:
+        block = read(block_size)
+        if not block:
+            break
+        yield from decoder.feed(block)
+    yield from decoder.close()
@@ -2,11 +2,19 @@ import json
 import urllib.request
 import urllib.error
 from typing import List, Dict, Any, Generator, Tuple, Optional
+from .instrumentation import StreamTimings
+from .payload import iter_json
+from .ndjson import NDJSONDecoder, iter_ndjson
+from .content_encoding import DecodedResponse, read_body, urlopen
 
 class OllamaError(Exception):
     """Exception raised for errors in the Ollama API."""
     pass
 
+class UnsupportedEndpoint(OllamaError):
+    """Exception raised when the server does not have the requested endpoint."""
+    pass
+
 def fetch_models(host: str, timeout: int = 10) -> List[str]:
     """
     Fetches the list of available models from the Ollama host.
@@ -19,8 +27,8 @@ def fetch_models(host: str, timeout: int = 10) -> List[str]:
     """
     url = f"{host}/api/tags"
     try:
-        with urllib.request.urlopen(url, timeout=timeout) as response:
-            result = json.loads(response.read().decode('utf-8'))
+        with urlopen(url, timeout=timeout) as response:
+            result = json.loads(read_body(response))
             return [model['name'] for model in result.get('models', [])]
     except urllib.error.HTTPError as e:
         raise OllamaError(f"HTTP Error {e.code}: {e.reason}")
@@ -39,8 +47,8 @@ def fetch_model_details(host: str, timeout: int = 10) -> List[Dict[str, Any]]:
     """
     url = f"{host}/api/tags"
     try:
-        with urllib.request.urlopen(url, timeout=timeout) as response:
-            result = json.loads(response.read().decode('utf-8'))
+        with urlopen(url, timeout=timeout) as response:
+            result = json.loads(read_body(response))
             return result.get('models', [])
     except urllib.error.HTTPError as e:
         raise OllamaError(f"HTTP Error {e.code}: {e.reason}")
@@ -65,11 +73,11 @@ def show_model(host: str, name: str, timeout: int = 10) -> Dict[str, Any]:
     }
     try:
         req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), headers={'Content-Type': 'application/json'})
-        with urllib.request.urlopen(req, timeout=timeout) as response:
-            return json.loads(response.read().decode('utf-8'))
+        with urlopen(req, timeout=timeout) as response:
+            return json.loads(read_body(response))
     except urllib.error.HTTPError as e:
         try:
-            error_msg = json.loads(e.read().decode('utf-8')).get('error', str(e))
+            error_msg = json.loads(read_body(e)).get('error', str(e))
             raise OllamaError(error_msg)
         except Exception:
             raise OllamaError(f"HTTP Error {e.code}: {e.reason}")
@@ -88,12 +96,12 @@ def get_version(host: str, timeout: int = 5) -> str:
     """
     try:
         url = f"{host}/api/version"
-        with urllib.request.urlopen(url, timeout=timeout) as response:
-            result = json.loads(response.read().decode('utf-8'))
+        with urlopen(url, timeout=timeout) as response:
+            result = json.loads(read_body(response))
             return result.get('version', 'Unknown')
     except urllib.error.HTTPError as e:
         try:
-            error_msg = json.loads(e.read().decode('utf-8')).get('error', str(e))
+            error_msg = json.loads(read_body(e)).get('error', str(e))
             raise OllamaError(error_msg)
         except Exception:
             raise OllamaError(f"HTTP Error {e.code}: {e.reason}")
@@ -117,17 +125,135 @@ def delete_model(host: str, model_name: str, timeout: int = 10) -> bool:
     }
     try:
         req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), headers={'Content-Type': 'application/json'}, method='DELETE')
-        with urllib.request.urlopen(req, timeout=timeout) as response:
+        with urlopen(req, timeout=timeout) as response:
             return True
     except urllib.error.HTTPError as e:
         try:
-            error_msg = json.loads(e.read().decode('utf-8')).get('error', str(e))
+            error_msg = json.loads(read_body(e)).get('error', str(e))
             raise OllamaError(error_msg)
         except Exception:
             raise OllamaError(f"HTTP Error {e.code}: {e.reason}")
     except Exception as e:
         raise OllamaError(str(e))
 
+def complete(host: str, model: str, prompt: str, system: Optional[str] = None,
+             options: Optional[Dict[str, Any]] = None, format: Any = None,
+             timeout: int = 300) -> Dict[str, Any]:
+    """
+    Runs a non-streaming generation, for background tasks such as titles.
+
+    Args:
+        host: The base URL of the Ollama host.
+        model: The model name.
+        prompt: The prompt.
+        system: Optional system prompt.
+        options: Optional generation parameters.
+        format: Optional "json" or JSON schema the response must follow.
+
+    Returns:
+        The final response object; the text is in 'response'.
+    """
+    url = f"{host}/api/generate"
+    data: Dict[str, Any] = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False
+    }
+    if system:
+        data["system"] = system
+    if options:
+        data["options"] = options
+    if format is not None:
+        data["format"] = format
+    try:
+        req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), headers={'Content-Type': 'application/json'})
+        with urlopen(req, timeout=timeout) as response:
+            return json.loads(read_body(response))
+    except urllib.error.HTTPError as e:
+        try:
+            error_msg = json.loads(read_body(e)).get('error', str(e))
+            raise OllamaError(error_msg)
+        except Exception:
+            raise OllamaError(f"HTTP Error {e.code}: {e.reason}")
+    except Exception as e:
+        raise OllamaError(str(e))
+
+def tokenize(host: str, model: str, content: str, timeout: int = 10) -> List[int]:
+    """
+    Tokenizes text with the model's tokenizer, on servers that have a tokenize endpoint.
+
+    Args:
+        host: The base URL of the Ollama host.
+        model: The model name.
+        content: The text to tokenize.
+
+    Returns:
+        The token ids.
+    """
+    url = f"{host}/api/tokenize"
+    data = {
+        "model": model,
+        "content": content
+    }
+    try:
+        req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), headers={'Content-Type': 'application/json'})
+        with urlopen(req, timeout=timeout) as response:
+            result = json.loads(read_body(response))
+    except urllib.error.HTTPError as e:
+        # A missing model is reported in JSON; a missing endpoint is not
+        try:
+            error_msg = json.loads(read_body(e)).get('error', str(e))
+        except Exception:
+            if e.code in (404, 405):
+                raise UnsupportedEndpoint(f"{host} cannot tokenize")
+            raise OllamaError(f"HTTP Error {e.code}: {e.reason}")
+        raise OllamaError(error_msg)
+    except Exception as e:
+        raise OllamaError(str(e))
+    if not isinstance(result.get('tokens'), list):
+        raise OllamaError("No tokens in response")
+    return result['tokens']
+
+def embed(host: str, model: str, inputs: List[str], batch_size: int = 32,
+          timeout: int = 120) -> List[List[float]]:
+    """
+    Computes embeddings with the Embed API, sending the inputs in batches.
+
+    Args:
+        host: The base URL of the Ollama host.
+        model: The name of the embedding model.
+        inputs: The texts to embed.
+        batch_size: The number of texts sent per request.
+
+    Returns:
+        One embedding per input, in the same order.
+    """
+    url = f"{host}/api/embed"
+    embeddings: List[List[float]] = []
+    for start in range(0, len(inputs), batch_size):
+        data = {
+            "model": model,
+            "input": inputs[start:start + batch_size],
+            "truncate": True
+        }
+        try:
+            req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), headers={'Content-Type': 'application/json'})
+            with urlopen(req, timeout=timeout) as response:
+                result = json.loads(read_body(response))
+        except urllib.error.HTTPError as e:
+            try:
+                error_msg = json.loads(read_body(e)).get('error', str(e))
+                raise OllamaError(error_msg)
+            except Exception:
+                raise OllamaError(f"HTTP Error {e.code}: {e.reason}")
+        except Exception as e:
+            raise OllamaError(str(e))
+        batch = result.get('embeddings', [])
+        if len(batch) != len(data["input"]):
+            raise OllamaError(f"Expected {len(data['input'])} embeddings, got {len(batch)}")
+        embeddings.extend(batch)
+    return embeddings
+
 def pull(host: str, model: str, insecure: bool = False) -> Generator[Dict[str, Any], None, None]:
     """
     Generator that streams responses from the Ollama Pull API.
@@ -153,7 +279,9 @@ def pull(host: str, model: str, insecure: bool = False) -> Generator[Dict[str, A
 def generate(host: str, model: str, prompt: str, system: Optional[str] = None, 
              options: Optional[Dict[str, Any]] = None, thinking: Any = None, 
              logprobs: bool = False, top_logprobs: Optional[int] = None, 
-             images: Optional[List[str]] = None) -> Generator[Dict[str, Any], None, None]:
+             images: Optional[List[str]] = None,
+             timings: Optional[StreamTimings] = None,
+             cache: Any = None) -> Generator[Dict[str, Any], None, None]:
     """
     Generator that streams responses from the Ollama Generate API.
 
@@ -167,6 +295,8 @@ def generate(host: str, model: str, prompt: str, system: Optional[str] = None,
         logprobs: Whether to return logprobs.
         top_logprobs: Number of top logprobs to return.
         images: Optional list of base64 encoded images.
+        timings: Optional StreamTimings that receives the send and first byte marks.
+        cache: Optional ResponseCache to replay or store the response in.
 
     Yields:
         Response chunks from the Ollama API.
@@ -187,12 +317,17 @@ def generate(host: str, model: str, prompt: str, system: Optional[str] = None,
     if system:
         data["system"] = system
 
-    yield from _stream_response(url, data)
+    if cache:
+        yield from cache.stream(host, "generate", data, lambda: _stream_response(url, data, timings))
+    else:
+        yield from _stream_response(url, data, timings)
 
 def chat(host: str, model: str, messages: List[Dict[str, Any]], 
          options: Optional[Dict[str, Any]] = None, thinking: Any = None, 
          logprobs: bool = False, top_logprobs: Optional[int] = None, 
-         images: Optional[List[str]] = None) -> Generator[Dict[str, Any], None, None]:
+         images: Optional[List[str]] = None,
+         timings: Optional[StreamTimings] = None,
+         cache: Any = None) -> Generator[Dict[str, Any], None, None]:
     """
     Generator that streams responses from the Ollama Chat API.
 
@@ -205,6 +340,8 @@ def chat(host: str, model: str, messages: List[Dict[str, Any]],
         logprobs: Whether to return logprobs.
         top_logprobs: Number of top logprobs to return.
         images: Optional list of base64 encoded images.
+        timings: Optional StreamTimings that receives the send and first byte marks.
+        cache: Optional ResponseCache to replay or store the response in.
 
     Yields:
         Response chunks from the Ollama API.
@@ -224,7 +361,10 @@ def chat(host: str, model: str, messages: List[Dict[str, Any]],
 
     _add_common_params(data, options, thinking, logprobs, top_logprobs)
 
-    yield from _stream_response(url, data)
+    if cache:
+        yield from cache.stream(host, "chat", data, lambda: _stream_response(url, data, timings))
+    else:
+        yield from _stream_response(url, data, timings)
 
 def _add_common_params(data: Dict[str, Any], options: Optional[Dict[str, Any]], 
                        thinking: Any, logprobs: bool, top_logprobs: Optional[int]) -> None:
@@ -245,20 +385,30 @@ def _add_common_params(data: Dict[str, Any], options: Optional[Dict[str, Any]],
     if options:
         data['options'] = options
 
-def _stream_response(url: str, data: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+def _stream_response(url: str, data: Dict[str, Any],
+                     timings: Optional[StreamTimings] = None) -> Generator[Dict[str, Any], None, None]:
     """Internal helper to handle streaming JSON responses from Ollama."""
     try:
-        req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), headers={'Content-Type': 'application/json'})
-        with urllib.request.urlopen(req) as response:
-            for line in response:
-                if line:
-                    try:
-                        yield json.loads(line.decode('utf-8'))
-                    except ValueError:
-                        pass
+        # The body is encoded while it is sent, with chunked transfer encoding,
+        # so large histories and images are never copied into one buffer
+        req = urllib.request.Request(url, data=iter_json(data), headers={'Content-Type': 'application/json'})
+        if timings:
+            timings.mark_sent()
+        decoder = NDJSONDecoder()
+        try:
+            with urlopen(req) as response:
+                if timings:
+                    timings.mark_first_byte()
+                for chunk in iter_ndjson(DecodedResponse(response), decoder):
+                    if timings and decoder.malformed:
+                        timings.malformed_lines = decoder.malformed
+                    yield chunk
+        finally:
+            if decoder.malformed:
+                print(f"Malformed lines in stream from {url}: {decoder.report()}")
     except urllib.error.HTTPError as e:
         try:
-            error_body = e.read().decode('utf-8')
+            error_body = read_body(e).decode('utf-8')
             error_msg = json.loads(error_body).get('error', str(e))
             yield {"error": error_msg}
         except Exception:
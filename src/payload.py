@@ -0,0 +1,104 @@
+import base64
+import json
+import os
+from typing import Any, Iterator
+
+# Size of the chunks handed to the HTTP connection
+CHUNK_SIZE = 64 * 1024
+# Longest string escaped in one piece
+STRING_SLICE = 16 * 1024
+# Raw bytes read per step; a multiple of 3 so the base64 pieces concatenate
+READ_SIZE = 48 * 1024
+
+class FileImage:
+    """An image attachment sent straight from a file instead of held in memory as base64."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __repr__(self) -> str:
+        return f"FileImage({self.path!r})"
+
+    def __deepcopy__(self, memo: Any) -> 'FileImage':
+        return self
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def iter_base64(self) -> Iterator[bytes]:
+        with open(self.path, "rb") as f:
+            while True:
+                block = f.read(READ_SIZE)
+                if not block:
+                    break
+                yield base64.b64encode(block)
+
+def image_bytes(image: Any) -> bytes:
+    """Returns the raw bytes of an attachment, given as base64 (optionally a data: URL) or a FileImage."""
+    if isinstance(image, FileImage):
+        return image.read()
+    if "," in image:
+        image = image.split(",", 1)[1]
+    return base64.b64decode(image)
+
+def image_base64(image: Any) -> str:
+    """Returns an attachment as base64, reading a FileImage's file now."""
+    if isinstance(image, FileImage):
+        return base64.b64encode(image.read()).decode('ascii')
+    return image
+
+def _encode_string(value: str) -> Iterator[bytes]:
+    if len(value) <= STRING_SLICE:
+        yield json.dumps(value).encode('utf-8')
+        return
+    yield b'"'
+    for start in range(0, len(value), STRING_SLICE):
+        yield json.dumps(value[start:start + STRING_SLICE])[1:-1].encode('utf-8')
+    yield b'"'
+
+def _encode(value: Any) -> Iterator[bytes]:
+    if isinstance(value, str):
+        yield from _encode_string(value)
+    elif isinstance(value, dict):
+        yield b'{'
+        for idx, (key, item) in enumerate(value.items()):
+            if idx:
+                yield b','
+            yield json.dumps(str(key)).encode('utf-8') + b':'
+            yield from _encode(item)
+        yield b'}'
+    elif isinstance(value, (list, tuple)):
+        yield b'['
+        for idx, item in enumerate(value):
+            if idx:
+                yield b','
+            yield from _encode(item)
+        yield b']'
+    elif isinstance(value, FileImage):
+        yield b'"'
+        yield from value.iter_base64()
+        yield b'"'
+    else:
+        yield json.dumps(value).encode('utf-8')
+
+def iter_json(value: Any, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Encodes value as JSON, yielding chunks of roughly chunk_size bytes.
+
+    Unlike json.dumps(...).encode(), this never holds the whole body: long
+    strings such as base64 images are escaped slice by slice and FileImage
+    attachments are read from disk as the body is sent.
+    """
+    buffer = bytearray()
+    for piece in _encode(value):
+        buffer += piece
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import ollama
+from .payload import iter_json
+
+# Seconds a host's model digests are trusted before /api/tags is asked again
+DIGEST_TTL_S = 30.0
+# Eviction frees space down to this share of the limit, so it does not run on every store
+EVICT_TO = 0.9
+
+def is_deterministic(options: Optional[Dict[str, Any]]) -> bool:
+    """Whether the options make a generation repeatable: greedy decoding or a fixed seed."""
+    options = options or {}
+    return options.get('temperature') == 0 or options.get('seed') is not None
+
+class ResponseCache:
+    """
+    Disk cache of complete responses to deterministic requests.
+
+    An entry is keyed by the model's digest and a hash of the full request
+    payload, so a re-pulled model or any change to the messages, options or
+    images misses. Each entry is a gzipped NDJSON file of the response's
+    chunks, replayed through the normal streaming path with "cached" set on
+    every chunk. A file's mtime is its last use; the least recently used files
+    are deleted once the directory grows past max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Bytes on disk, counted on first use
+        self._size: Optional[int] = None
+        # (host) -> ({model: digest}, fetched at)
+        self._digests: Dict[str, Tuple[Dict[str, str], float]] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.ndjson.gz")
+
+    def digest(self, host: str, model: str) -> Optional[str]:
+        """Returns the digest of a model on a host, from a short-lived copy of its model list."""
+        with self._lock:
+            digests, fetched_at = self._digests.get(host, ({}, 0.0))
+        if time.monotonic() - fetched_at > DIGEST_TTL_S:
+            details = ollama.fetch_model_details(host)
+            digests = {m['name']: m.get('digest', '') for m in details if m.get('name')}
+            with self._lock:
+                self._digests[host] = (digests, time.monotonic())
+        return digests.get(model) or None
+
+    def key(self, host: str, endpoint: str, payload: Dict[str, Any]) -> Optional[str]:
+        """Returns the cache key of a request, or None if the model's digest is unknown."""
+        digest = self.digest(host, payload.get('model', ''))
+        if not digest:
+            return None
+        h = hashlib.sha256()
+        h.update(f"{digest}\0{endpoint}\0".encode('utf-8'))
+        # Hashed as it is encoded, so images are never held as one string and
+        # FileImage attachments are read from disk in blocks
+        for chunk in iter_json(payload):
+            h.update(chunk)
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Returns the chunks of a cached response, marking it as used."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                chunks = [json.loads(line) for line in f if line.strip()]
+            os.utime(path)
+            return chunks
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Dropping unreadable cached response {key}: {e}")
+            self._remove(path)
+            return None
+
+    def put(self, key: str, chunks: List[Dict[str, Any]]) -> None:
+        """Stores the chunks of a complete response, then evicts past the size limit."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                for chunk in chunks:
+                    f.write(json.dumps(chunk, separators=(',', ':')))
+                    f.write("\n")
+            size = os.path.getsize(tmp_path)
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error caching response: {e}")
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            total = self._disk_size() + size - replaced
+            self._size = total
+        if total > self.max_bytes:
+            self.evict()
+
+    def _disk_size(self) -> int:
+        if self._size is None:
+            self._size = sum(e.stat().st_size for e in self._entries())
+        return self._size
+
+    def _entries(self) -> List[os.DirEntry]:
+        try:
+            with os.scandir(self.directory) as it:
+                return [e for e in it if e.name.endswith(".ndjson.gz")]
+        except FileNotFoundError:
+            return []
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        """Deletes the least recently used responses until the cache fits comfortably."""
+        with self._lock:
+            entries = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in self._entries()))
+            total = sum(size for mtime, size, path in entries)
+            for mtime, size, path in entries:
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                self._remove(path)
+                total -= size
+            self._size = total
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self._entries():
+                self._remove(entry.path)
+            self._size = 0
+
+    def stream(self, host: str, endpoint: str, payload: Dict[str, Any],
+               fetch: Callable[[], Iterator[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        """
+        Replays the cached response to a request, or streams it from fetch and
+        caches it once it completes. Errors and interrupted streams are not cached.
+        """
+        try:
+            key = self.key(host, endpoint, payload)
+        except Exception as e:
+            # The request itself may still succeed; send it uncached
+            print(f"Response cache unavailable: {e}")
+            key = None
+
+        cached = self.get(key) if key else None
+        if cached:
+            for chunk in cached:
+                yield dict(chunk, cached=True)
+            return
+
+        chunks: List[Dict[str, Any]] = []
+        done = False
+        for chunk in fetch():
+            if key:
+                if 'error' in chunk:
+                    key = None
+                else:
+                    chunks.append(chunk)
+                    done = done or chunk.get('done', False)
+            yield chunk
+        if key and done:
+            self.put(key, chunks)
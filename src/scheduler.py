@@ -0,0 +1,246 @@
+import heapq
+import itertools
+import threading
+import time
+import concurrent.futures
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Lanes keep unrelated kinds of work from starving each other.
+LANE_STREAM = "stream"      # Interactive generation streams
+LANE_METADATA = "metadata"  # Short API calls: model lists, show, version, delete
+LANE_BULK = "bulk"          # Long running downloads such as model pulls
+LANE_DISK = "disk"          # Database writes
+LANE_IMAGES = "images"      # Image decoding and the thumbnail cache
+LANE_BACKGROUND = "background"  # Indexing and other upkeep, one job at a time
+LANE_EMBED = "embed"        # Embedding batches of document indexing, spread over hosts
+
+# Lower values run first within a lane.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 50
+PRIORITY_LOW = 100
+
+# Lane name -> (max worker threads, default per-host concurrency limit or None)
+DEFAULT_LANES: Dict[str, Tuple[int, Optional[int]]] = {
+    LANE_STREAM: (8, None),
+    LANE_METADATA: (4, None),
+    LANE_BULK: (2, 1),
+    # A single writer keeps saves ordered and avoids SQLite lock contention.
+    LANE_DISK: (1, None),
+    LANE_IMAGES: (2, None),
+    # Jobs here can run for minutes; keeping them off the bulk lane leaves it free for pulls.
+    LANE_BACKGROUND: (1, None),
+    LANE_EMBED: (8, 2),
+}
+
+class _Task:
+    """A queued unit of work."""
+    __slots__ = ("fn", "args", "kwargs", "future", "priority", "seq", "host", "enqueued_at")
+
+    def __init__(self, fn: Callable[..., Any], args: Tuple[Any, ...], kwargs: Dict[str, Any],
+                 priority: int, seq: int, host: Optional[str]) -> None:
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.priority = priority
+        self.seq = seq
+        self.host = host
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: '_Task') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class _Lane:
+    """Queue, threads and counters for one lane."""
+
+    def __init__(self, name: str, max_workers: int, per_host_limit: Optional[int]) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.host_limits: Dict[str, int] = {}
+        self.queue: List[_Task] = []
+        self.threads: List[threading.Thread] = []
+        self.idle: int = 0
+        self.running: Dict[Optional[str], int] = {}
+        self.submitted: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+        self.total_wait: float = 0.0
+        self.max_depth: int = 0
+
+    def host_limit(self, host: Optional[str]) -> Optional[int]:
+        if host is None:
+            return None
+        return self.host_limits.get(host, self.per_host_limit)
+
+    def has_capacity(self, host: Optional[str]) -> bool:
+        limit = self.host_limit(host)
+        return limit is None or self.running.get(host, 0) < limit
+
+class TaskScheduler:
+    """
+    Runs background work in separate lanes, each with its own worker threads,
+    priority queue and optional per-host concurrency caps.
+    """
+
+    def __init__(self, lanes: Optional[Dict[str, Tuple[int, Optional[int]]]] = None) -> None:
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._shutdown: bool = False
+        self._lanes: Dict[str, _Lane] = {
+            name: _Lane(name, workers, per_host)
+            for name, (workers, per_host) in (lanes or DEFAULT_LANES).items()
+        }
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> concurrent.futures.Future:
+        """Schedules fn on the metadata lane with normal priority."""
+        return self._enqueue(LANE_METADATA, fn, args, kwargs, PRIORITY_NORMAL, None)
+
+    def schedule(self, lane: str, fn: Callable[..., Any], *args: Any,
+                 priority: int = PRIORITY_NORMAL, host: Optional[str] = None) -> concurrent.futures.Future:
+        """
+        Schedules fn on a lane.
+
+        Args:
+            lane: One of the LANE_* names.
+            fn: The callable to run.
+            priority: Lower values run first.
+            host: Optional host key the per-host concurrency cap applies to.
+        """
+        return self._enqueue(lane, fn, args, {}, priority, host)
+
+    def _enqueue(self, lane_name: str, fn: Callable[..., Any], args: Tuple[Any, ...],
+                 kwargs: Dict[str, Any], priority: int, host: Optional[str]) -> concurrent.futures.Future:
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new tasks after shutdown")
+            lane = self._lanes[lane_name]
+            task = _Task(fn, args, kwargs, priority, next(self._seq), host)
+            heapq.heappush(lane.queue, task)
+            lane.submitted += 1
+            lane.max_depth = max(lane.max_depth, len(lane.queue))
+
+            # Idle threads may not have woken for earlier tasks yet, so compare against the
+            # whole queue rather than only checking for an idle thread
+            if len(lane.queue) > lane.idle and len(lane.threads) < lane.max_workers:
+                # Daemon threads let the app exit while a stream is blocked on the network;
+                # durability of queued writes is handled by the shutdown coordinator.
+                t = threading.Thread(target=self._worker, args=(lane,), daemon=True,
+                                     name=f"GnollamaWorker-{lane.name}-{len(lane.threads)}")
+                lane.threads.append(t)
+                t.start()
+            self._cond.notify_all()
+            return task.future
+
+    def _next_task(self, lane: _Lane) -> Optional[_Task]:
+        """Pops the highest priority task whose host has spare capacity."""
+        for task in sorted(lane.queue):
+            if lane.has_capacity(task.host):
+                lane.queue.remove(task)
+                heapq.heapify(lane.queue)
+                return task
+        return None
+
+    def _worker(self, lane: _Lane) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    task = self._next_task(lane)
+                    if task is not None:
+                        break
+                    if self._shutdown and not lane.queue:
+                        return
+                    lane.idle += 1
+                    self._cond.wait()
+                    lane.idle -= 1
+                lane.running[task.host] = lane.running.get(task.host, 0) + 1
+                lane.total_wait += time.monotonic() - task.enqueued_at
+
+            failed = False
+            if task.future.set_running_or_notify_cancel():
+                try:
+                    result = task.fn(*task.args, **task.kwargs)
+                except BaseException as e:
+                    failed = True
+                    task.future.set_exception(e)
+                else:
+                    task.future.set_result(result)
+
+            with self._cond:
+                lane.running[task.host] -= 1
+                if not lane.running[task.host]:
+                    del lane.running[task.host]
+                if failed:
+                    lane.failed += 1
+                else:
+                    lane.completed += 1
+                self._cond.notify_all()
+            del task
+
+    def set_host_limit(self, lane_name: str, host: str, limit: Optional[int]) -> None:
+        """Sets (or clears, with None) the concurrency cap for a host on a lane."""
+        with self._cond:
+            lane = self._lanes[lane_name]
+            if limit is None:
+                lane.host_limits.pop(host, None)
+            else:
+                lane.host_limits[host] = max(int(limit), 1)
+            self._cond.notify_all()
+
+    def queue_position(self, future: concurrent.futures.Future) -> Optional[int]:
+        """
+        Returns the 1-based position of a queued task among the tasks waiting
+        for the same lane and host, or None if it is no longer queued.
+        """
+        with self._cond:
+            for lane in self._lanes.values():
+                ordered = sorted(lane.queue)
+                for task in ordered:
+                    if task.future is future:
+                        ahead = [t for t in ordered if t.host == task.host]
+                        return ahead.index(task) + 1
+        return None
+
+    def running_count(self, lane_name: str, host: Optional[str]) -> int:
+        """Returns how many tasks for a host are running on a lane."""
+        with self._cond:
+            return self._lanes[lane_name].running.get(host, 0)
+
+    def queued_count(self, lane_name: str, host: Optional[str]) -> int:
+        """Returns how many tasks for a host are waiting on a lane."""
+        with self._cond:
+            return sum(1 for t in self._lanes[lane_name].queue if t.host == host)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Returns queue depth and throughput counters for each lane."""
+        with self._cond:
+            result = {}
+            for name, lane in self._lanes.items():
+                started = lane.completed + lane.failed + sum(lane.running.values())
+                result[name] = {
+                    "queued": len(lane.queue),
+                    "max_queued": lane.max_depth,
+                    "running": sum(lane.running.values()),
+                    "threads": len(lane.threads),
+                    "submitted": lane.submitted,
+                    "completed": lane.completed,
+                    "failed": lane.failed,
+                    "avg_wait_ms": (lane.total_wait / started * 1000) if started else 0.0,
+                }
+            return result
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = True) -> None:
+        """Stops accepting work, optionally cancelling queued tasks and joining threads."""
+        with self._cond:
+            self._shutdown = True
+            if cancel_futures:
+                for lane in self._lanes.values():
+                    for task in lane.queue:
+                        task.future.cancel()
+                    lane.queue.clear()
+            self._cond.notify_all()
+            threads = [t for lane in self._lanes.values() for t in lane.threads]
+
+        if wait:
+            for t in threads:
+                t.join()
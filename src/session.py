@@ -1,26 +1,90 @@
-from typing import List, Optional, Any, Dict, Callable
+from typing import List, Optional, Any, Dict, Callable, Set, Tuple
 from gi.repository import GLib
-import concurrent.futures
+import threading
 from . import ollama
 from .storage import ChatStorage
+from .scheduler import TaskScheduler
+from .admission import AdmissionController
+from .logprobs import LogprobTrace
+from .compaction import summary_message
+from .payload import image_base64
 
-class NetworkWorker:
-    """Manages background network tasks cleanly."""
-    def __init__(self, max_workers: int = 4) -> None:
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="GnollamaNetworkWorker")
+# Shared scheduler for all background work, split into lanes (see scheduler.py)
+worker = TaskScheduler()
 
-    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> concurrent.futures.Future:
-        return self.executor.submit(fn, *args, **kwargs)
-        
-    def shutdown(self, wait: bool = True) -> None:
-        self.executor.shutdown(wait=wait, cancel_futures=True)
+# Per-host concurrency limits for generation streams
+admission = AdmissionController(worker)
+
+class StreamHandle:
+    """A single in-flight generation stream that can be cancelled and finalized once."""
+    def __init__(self, registry: 'ActiveStreams') -> None:
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._finalized: bool = False
+        self.on_interrupt: Optional[Callable[[], None]] = None
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the stream has been asked to stop."""
+        return self._registry.cancelled.is_set()
+
+    def finalize(self, fn: Callable[[], None]) -> bool:
+        """Runs fn unless the stream was already finalized. Returns True if it ran."""
+        with self._lock:
+            if self._finalized:
+                return False
+            self._finalized = True
+        fn()
+        return True
+
+    def interrupt(self) -> None:
+        """Persists the partial result of the stream if nothing has been saved yet."""
+        if self.on_interrupt:
+            self.finalize(self.on_interrupt)
+
+class ActiveStreams:
+    """Registry of in-flight generation streams, used to drain them on shutdown."""
+    def __init__(self) -> None:
+        self.cancelled = threading.Event()
+        self._handles: Set[StreamHandle] = set()
+        self._cond = threading.Condition()
 
-worker = NetworkWorker()
+    def begin(self) -> StreamHandle:
+        handle = StreamHandle(self)
+        with self._cond:
+            self._handles.add(handle)
+        return handle
+
+    def end(self, handle: StreamHandle) -> None:
+        with self._cond:
+            self._handles.discard(handle)
+            self._cond.notify_all()
+
+    def cancel_all(self) -> None:
+        """Asks every stream to stop at its next chunk."""
+        self.cancelled.set()
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Blocks until no stream is active or the timeout expires."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._handles, timeout=max(timeout, 0))
+
+    def pending(self) -> List[StreamHandle]:
+        with self._cond:
+            return list(self._handles)
+
+streams = ActiveStreams()
 
 class GenerationStrategy:
     """Strategy for single-turn text generation."""
+    def request_messages(self, system: Optional[str]) -> Tuple[List[Dict[str, Any]], int]:
+        """Returns what is sent ahead of a new prompt, and how many messages the compacted summary replaces."""
+        return ([{"role": "system", "content": system}] if system else []), 0
+
     def process(self, tab: Any, **kwargs: Any) -> Any:
         """Executes the generation process via Ollama API."""
+        # Image tokens would skew the characters per token of a calibration
+        self.current_prompt_chars = None if kwargs.get('images') else len(kwargs['prompt']) + len(kwargs.get('system') or '')
         return ollama.generate(
             host=kwargs['host'],
             model=kwargs['model'],
@@ -30,7 +94,9 @@ class GenerationStrategy:
             thinking=kwargs.get('thinking'),
             logprobs=kwargs.get('logprobs', False),
             top_logprobs=kwargs.get('top_logprobs'),
-            images=kwargs.get('images')
+            images=kwargs.get('images'),
+            timings=kwargs.get('timings'),
+            cache=kwargs.get('cache')
         )
     
     def on_response_complete(self, tab: Any, model_name: str) -> None:
@@ -45,6 +111,7 @@ class ChatStrategy:
         self.chat_id: Optional[str] = chat_id
         self.storage: ChatStorage = storage
         self.current_thinking_full_text: str = ""
+        self.current_logprob_trace: Optional[LogprobTrace] = None
 
     def append_thinking(self, text: str) -> None:
         """Accumulates thinking content for the current turn."""
@@ -54,6 +121,10 @@ class ChatStrategy:
         """Accumulates response content for the current turn."""
         self.current_response_full_text += text
 
+    def set_logprobs(self, trace: LogprobTrace) -> None:
+        """Keeps the logprobs trace of the current turn, filled in as the response streams."""
+        self.current_logprob_trace = trace
+
     def on_response_complete(self, tab: Any, model_name: str) -> None:
         """Saves the completed turn to storage and updates UI."""
         msg = {
@@ -63,6 +134,8 @@ class ChatStrategy:
         }
         if self.current_thinking_full_text:
             msg["thinking_content"] = self.current_thinking_full_text
+        if self.current_logprob_trace:
+            msg["logprobs"] = self.current_logprob_trace
             
         if hasattr(self, 'current_api_params'):
             msg["api_details"] = getattr(self, 'current_api_params')
@@ -84,19 +157,57 @@ class ChatStrategy:
             top_logprobs_val = getattr(self, 'current_top_logprobs', None)
             if top_logprobs_val is not None:
                 options['top_logprobs'] = top_logprobs_val
+
+            documents = getattr(self, 'current_documents', None)
+            if documents:
+                options['documents'] = documents
             
             host = getattr(self, 'current_host', None)
             
-            def update_ui() -> bool:
-                chat_data = self.storage.get_chat(self.chat_id)
-                if chat_data and tab.tab_label:
-                    new_title = chat_data.get('title', 'Chat')
+            def update_ui(new_title: Optional[str]) -> bool:
+                if new_title and tab.tab_label:
                     tab.tab_label.set_label(new_title)
                     tab.emit("chat-updated", self.chat_id, new_title)
                 return False
 
             self.storage.save_chat(self.chat_id, self.history, model=model_name, options=options, system=system, host=host, on_done=update_ui)
             
+    def retrieve_documents(self, prompt: str, messages: List[Dict[str, Any]],
+                           model: str, options: Optional[Dict[str, Any]]) -> str:
+        """Returns the prompt with the document excerpts most relevant to it that fit in the context."""
+        from .documents import augment_prompt, context_budget
+        try:
+            chunks = self.storage.document_index.search(self.current_documents, prompt)
+        except Exception as e:
+            print(f"Error retrieving documents: {e}")
+            return prompt
+        # Calibrated estimates, so retrieval costs no tokenize requests
+        count = lambda text: self.storage.tokens.estimate(model, text)
+        conversation = sum(count(str(m.get('content') or '')) for m in messages) + count(prompt)
+        augmented, sources = augment_prompt(prompt, chunks, context_budget(options, conversation), count)
+        if sources and hasattr(self, 'current_api_params'):
+            self.current_api_params['documents'] = sources
+        return augmented
+
+    def request_messages(self, system: Optional[str]) -> Tuple[List[Dict[str, Any]], int]:
+        """Returns what is sent ahead of a new prompt, and how many messages the compacted summary replaces."""
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+
+        # Messages folded into the compacted summary are sent as the summary alone
+        history = self.history
+        summary, compacted = self.storage.get_chat_compaction(self.chat_id) if self.chat_id else (None, 0)
+        if summary and 0 < compacted <= len(history):
+            messages.append(summary_message(summary))
+            history = history[compacted:]
+        else:
+            compacted = 0
+
+        # Logprobs are only kept for display and are not part of the conversation
+        messages.extend({k: v for k, v in m.items() if k != 'logprobs'} for m in history)
+        return messages, compacted
+
     def process(self, tab: Any, **kwargs: Any) -> Any:
         """Executes the chat process via Ollama API."""
         prompt = kwargs['prompt']
@@ -108,21 +219,34 @@ class ChatStrategy:
         self.current_logprobs = kwargs.get('logprobs')
         self.current_top_logprobs = kwargs.get('top_logprobs')
         self.current_host = kwargs.get('host_id')
+        self.current_documents = kwargs.get('documents')
         
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-            
-        messages.extend(self.history)
-        messages.append({"role": "user", "content": prompt})
+        messages, compacted = self.request_messages(system)
+        if compacted and hasattr(self, 'current_api_params'):
+            self.current_api_params['compacted_messages'] = compacted
+        if self.current_documents:
+            # Only the request carries the retrieved excerpts; the history keeps the prompt as typed
+            content = self.retrieve_documents(prompt, messages, kwargs['model'], kwargs.get('options'))
+            messages.append({"role": "user", "content": content})
+        else:
+            messages.append({"role": "user", "content": prompt})
+        # Only a first turn calibrates token estimates: later turns reuse the KV cache for the
+        # earlier messages, so prompt_eval_count counts just part of what was sent
+        if self.history or kwargs.get('images'):
+            self.current_prompt_chars = None
+        else:
+            self.current_prompt_chars = sum(len(str(m.get('content') or '')) for m in messages)
         
         msg = {"role": "user", "content": prompt}
         if kwargs.get('images'):
-             msg['images'] = kwargs['images']
+            # Only this request streams file attachments; the history keeps the bytes as sent,
+            # so moving or deleting the file later cannot break saving or later requests
+            msg['images'] = [image_base64(image) for image in kwargs['images']]
         self.history.append(msg)
         
         self.current_response_full_text = ""
         self.current_thinking_full_text = ""
+        self.current_logprob_trace = None
 
         return ollama.chat(
             host=kwargs['host'],
@@ -132,5 +256,7 @@ class ChatStrategy:
             thinking=kwargs.get('thinking'),
             logprobs=kwargs.get('logprobs', False),
             top_logprobs=kwargs.get('top_logprobs'),
-            images=kwargs.get('images')
+            images=kwargs.get('images'),
+            timings=kwargs.get('timings'),
+            cache=kwargs.get('cache')
         )
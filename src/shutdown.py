@@ -0,0 +1,37 @@
+import time
+from .storage import ChatStorage
+from .session import worker, streams
+
+class ShutdownCoordinator:
+    """
+    Drains in-flight work when the window closes so the app exits quickly
+    without losing the last turn of a conversation.
+    """
+
+    def __init__(self, storage: ChatStorage, deadline: float = 3.0) -> None:
+        self.storage: ChatStorage = storage
+        self.deadline: float = deadline
+
+    def _remaining(self, start: float) -> float:
+        return max(self.deadline - (time.monotonic() - start), 0)
+
+    def run(self) -> None:
+        """Cancels streams, persists partial results, flushes writes and checkpoints the WAL."""
+        start = time.monotonic()
+
+        # Ask every stream to stop at its next chunk; each one saves what it has so far.
+        streams.cancel_all()
+        if not streams.wait_idle(self._remaining(start)):
+            # Streams still blocked on the network: save their partial output from here.
+            for handle in streams.pending():
+                try:
+                    handle.interrupt()
+                except Exception as e:
+                    print(f"Error persisting interrupted stream: {e}")
+
+        if not self.storage.flush_pending_saves(self._remaining(start)):
+            print("Warning: some chat saves were still running at shutdown")
+
+        self.storage.cleanup_empty_chats()
+        self.storage.checkpoint()
+        worker.shutdown(wait=False)
@@ -1,10 +1,18 @@
 import os
 import uuid
 import time
-from typing import List, Dict, Any, Optional, Callable
+import threading
+import concurrent.futures
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from gi.repository import GLib
 
 from .database import DatabaseManager
+from .chat_index import ChatIndex
+from .documents import DocumentIndex
+from .summarizer import ChatSummarizer, provisional_title
+from .compaction import ConversationCompactor
+from .tokens import TokenCounter
+from .response_cache import ResponseCache
 
 class ChatStorage:
     """Handles persistence for chat history and host configurations using SQLite."""
@@ -21,6 +29,23 @@ class ChatStorage:
         # Initialize SQLite Database Manager
         self.db = DatabaseManager(self.db_path)
 
+        # Semantic search over messages; enabled once an embedding model is configured
+        self.chat_index = ChatIndex(self.db, self.storage_dir)
+        # Retrieval over document folders attached to chats
+        self.document_index = DocumentIndex(self.db, self.storage_dir)
+        # Generated titles and rolling summaries
+        self.summarizer = ChatSummarizer(self.db)
+        # Token counts before sending, from the server or calibrated estimates
+        self.tokens = TokenCounter(self.db)
+        # Summaries that replace the oldest messages of long chats in requests
+        self.compactor = ConversationCompactor(self.db, self.tokens)
+        # Responses to deterministic requests, replayed when a request repeats; sized from settings
+        self.response_cache = ResponseCache(os.path.join(self.storage_dir, "responses"), 256 * 1024 * 1024)
+
+        # Queued save tasks, kept so they can be flushed on shutdown
+        self._pending_saves: Dict[concurrent.futures.Future, Callable[[], None]] = {}
+        self._pending_lock = threading.Lock()
+
         # Detect legacy JSON files and rename them
         self._handle_legacy_json()
 
@@ -63,17 +88,18 @@ class ChatStorage:
         """Sets a host as the default."""
         self.db.set_default_host(host_id)
 
-    def add_host(self, name: str, hostname: str, is_default: bool = False) -> Dict[str, Any]:
+    def add_host(self, name: str, hostname: str, is_default: bool = False, max_parallel: Optional[int] = None) -> Dict[str, Any]:
         """Adds a new host configuration."""
         host_id = str(uuid.uuid4())
-        self.db.add_host(host_id, name, hostname, is_default)
+        self.db.add_host(host_id, name, hostname, is_default, max_parallel)
         if is_default:
             self.db.set_default_host(host_id)
         return self.db.get_host(host_id)
 
-    def update_host(self, host_id: str, name: str, hostname: str, is_default: bool = False) -> Optional[Dict[str, Any]]:
+    def update_host(self, host_id: str, name: str, hostname: str, is_default: bool = False,
+                    max_parallel: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """Updates an existing host configuration."""
-        self.db.update_host(host_id, name, hostname, is_default)
+        self.db.update_host(host_id, name, hostname, is_default, max_parallel)
         if is_default:
             self.db.set_default_host(host_id)
         return self.db.get_host(host_id)
@@ -92,6 +118,10 @@ class ChatStorage:
         """Returns a specific chat by its ID."""
         return self.db.get_chat(chat_id)
 
+    def get_chat_compaction(self, chat_id: str) -> Tuple[Optional[str], int]:
+        """Returns a chat's compacted summary and the number of messages it replaces."""
+        return self.db.get_chat_compaction(chat_id)
+
     def create_chat(self, model: str = "") -> Dict[str, Any]:
         """Creates a new empty chat."""
         chat_id = str(uuid.uuid4())
@@ -102,27 +132,18 @@ class ChatStorage:
     def save_chat(self, chat_id: str, messages: List[Dict[str, Any]], 
                   model: Optional[str] = None, options: Optional[Dict[str, Any]] = None, 
                   system: Optional[str] = None, host: Optional[str] = None,
-                  on_done: Optional[Callable[[], None]] = None) -> None:
-        """Saves messages and settings to a chat asynchronously."""
+                  on_done: Optional[Callable[[Optional[str]], Any]] = None) -> None:
+        """Saves messages and settings to a chat asynchronously. on_done receives the chat's title."""
         import copy
         messages_snapshot = copy.deepcopy(messages)
         options_snapshot = copy.deepcopy(options) if options else None
 
         def save_task() -> None:
             try:
-                # Auto-generate title if it's the default "New Chat" and we have messages
-                chat_data = self.db.get_chat(chat_id)
-                if chat_data and chat_data.get("title") == "New Chat" and messages_snapshot:
-                    for msg in messages_snapshot:
-                        if msg.get("role") == "user":
-                            content = msg.get("content", "").strip()
-                            if content:
-                                # Take first 30 chars/first line
-                                title = content.split('\n')[0][:30]
-                                if len(content) > 30:
-                                    title += "..."
-                                self.db.update_chat_title(chat_id, title, time.time())
-                                break
+                # A chat still called "New Chat" is named after its first prompt until a title is generated
+                title = provisional_title(messages_snapshot)
+                if title:
+                    self.db.set_provisional_title(chat_id, title)
 
                 # Update chat properties
                 self.db.update_chat(
@@ -136,17 +157,81 @@ class ChatStorage:
 
                 # Save new set of messages
                 self.db.save_messages(chat_id, messages_snapshot)
+                self.chat_index.schedule_update(chat_id)
+                self.summarizer.schedule()
+                self.compactor.schedule(chat_id, host, model, options_snapshot)
 
                 if on_done:
-                    GLib.idle_add(on_done)
+                    GLib.idle_add(on_done, self.db.get_chat_title(chat_id))
             except Exception as e:
                 print(f"Error saving chat asynchronously in DB: {e}")
 
+        self._submit_write(save_task)
+
+    def _submit_write(self, task: Callable[[], None]) -> None:
+        """Queues a database write on the disk lane, tracking it until it completes."""
         try:
             from .session import worker
-            worker.submit(save_task)
+            from .scheduler import LANE_DISK
+            future = worker.schedule(LANE_DISK, task)
         except ImportError:
-            save_task()
+            task()
+            return
+
+        with self._pending_lock:
+            self._pending_saves[future] = task
+        future.add_done_callback(self._forget_save)
+
+    def _forget_save(self, future: concurrent.futures.Future) -> None:
+        with self._pending_lock:
+            self._pending_saves.pop(future, None)
+
+    def flush_pending_saves(self, timeout: float) -> bool:
+        """
+        Waits for queued saves to finish within the timeout.
+        Saves that have not started by then are cancelled and run inline,
+        so they are never dropped. Returns True if every save completed.
+        """
+        with self._pending_lock:
+            pending = dict(self._pending_saves)
+        if not pending:
+            return True
+
+        done, not_done = concurrent.futures.wait(pending, timeout=max(timeout, 0))
+        for future in not_done:
+            if future.cancel():
+                pending[future]()
+        return all(f.done() for f in not_done)
+
+    def checkpoint(self) -> None:
+        """Checkpoints the database WAL into the main file."""
+        try:
+            self.db.checkpoint()
+        except Exception as e:
+            print(f"Error checkpointing database: {e}")
+
+    def save_comparison(self, prompt: str, system: Optional[str], options: Optional[Dict[str, Any]],
+                        results: List[Dict[str, Any]]) -> str:
+        """Saves a multi-model comparison run and returns its ID."""
+        comparison_id = str(uuid.uuid4())
+        self.db.save_comparison(comparison_id, prompt, system, options, time.time(), results)
+        return comparison_id
+
+    # --- Generation Metrics ---
+
+    def record_metric(self, metric: Dict[str, Any]) -> None:
+        """Stores a generation metrics row asynchronously."""
+        def write_task() -> None:
+            try:
+                self.db.add_generation_metric(metric)
+            except Exception as e:
+                print(f"Error saving generation metrics: {e}")
+
+        self._submit_write(write_task)
+
+    def get_generation_metrics(self, since: float = 0.0) -> List[Dict[str, Any]]:
+        """Returns stored generation metrics created after `since`."""
+        return self.db.get_generation_metrics(since)
 
     def update_title(self, chat_id: str, title: str) -> None:
         """Updates the title of a chat."""
@@ -0,0 +1,217 @@
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from . import ollama
+from .database import DatabaseManager
+
+# Chats handled per request
+BATCH_SIZE = 4
+# Messages past the summary after which it is brought up to date
+SUMMARY_INTERVAL = 6
+# Characters sent per message, and of new messages per chat and request
+MESSAGE_CHARS = 1000
+CHAT_CHARS = 3000
+# Longest generated title kept
+TITLE_CHARS = 60
+# Seconds to wait before checking again while the host is generating
+IDLE_RETRY_S = 5.0
+# Room for BATCH_SIZE chats of CHAT_CHARS plus the summaries and the reply
+OPTIONS = {"temperature": 0.2, "num_ctx": 8192}
+
+SYSTEM_PROMPT = (
+    "You write titles and summaries of conversations between a user and an assistant. "
+    "A title has at most six words and names the topic; it has no quotes and no final period. "
+    "A summary has at most five sentences and keeps the facts, decisions and open questions "
+    "needed to continue the conversation. When a previous summary is given, return it updated "
+    "with the new messages."
+)
+
+RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "chats": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "title": {"type": "string"},
+                    "summary": {"type": "string"}
+                },
+                "required": ["id", "title", "summary"]
+            }
+        }
+    },
+    "required": ["chats"]
+}
+
+def provisional_title(messages: List[Dict[str, Any]]) -> Optional[str]:
+    """Names a chat after the first line of its first prompt until a title is generated."""
+    for msg in messages:
+        if msg.get("role") == "user":
+            content = msg.get("content", "").strip()
+            if content:
+                title = content.split('\n')[0][:30]
+                if len(content) > 30:
+                    title += "..."
+                return title
+    return None
+
+def host_idle(host: str) -> bool:
+    """Whether a host has no generation streams running or queued."""
+    from .session import worker
+    from .scheduler import LANE_STREAM
+    return worker.running_count(LANE_STREAM, host) + worker.queued_count(LANE_STREAM, host) == 0
+
+def clean_title(title: str) -> str:
+    title = " ".join(title.split()).strip(" \"'`*#").rstrip(".")
+    if len(title) > TITLE_CHARS:
+        title = title[:TITLE_CHARS].rsplit(" ", 1)[0] + "..."
+    return title
+
+class ChatSummarizer:
+    """
+    Generates chat titles and rolling summaries with a small model, in the background.
+
+    The database is the queue: every run asks for chats whose title is still
+    the truncated first prompt or whose summary is SUMMARY_INTERVAL messages
+    behind, and handles them BATCH_SIZE at a time in one structured request.
+    It runs on the background lane at low priority, and waits while the host has
+    generation streams running or queued so it never competes with the user.
+    """
+
+    def __init__(self, db: DatabaseManager) -> None:
+        self.db = db
+        self.host: Optional[str] = None
+        self.model: str = ""
+        # Called from the worker thread with (chat_id, new title or None, summary)
+        self.on_update: Optional[Callable[[str, Optional[str], str], None]] = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._requested = False
+        # Chats the model gave no usable answer for; retried after a restart
+        self._skip: Set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.host and self.model)
+
+    def configure(self, host: Optional[str], model: str) -> None:
+        """Sets the host and model (empty to disable) and catches up on pending chats."""
+        self.host, self.model = host, model
+        self.schedule()
+
+    def schedule(self) -> None:
+        """Requests a run; called after every save."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._requested = True
+            if self._running:
+                return
+            self._running = True
+        self._start()
+
+    def _start(self) -> None:
+        from .session import worker
+        from .scheduler import LANE_BACKGROUND, PRIORITY_LOW
+        worker.schedule(LANE_BACKGROUND, self._run, priority=PRIORITY_LOW)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                self._requested = False
+            host, model = self.host, self.model
+            handled = False
+            if host and model:
+                if not host_idle(host):
+                    # Check back later instead of holding the background worker; still counts as running
+                    timer = threading.Timer(IDLE_RETRY_S, self._start)
+                    timer.daemon = True
+                    timer.start()
+                    return
+                try:
+                    handled = self.step(host, model)
+                except Exception as e:
+                    print(f"Error generating chat titles and summaries: {e}")
+            if not handled:
+                with self._lock:
+                    if not self._requested:
+                        self._running = False
+                        return
+
+    def step(self, host: str, model: str) -> bool:
+        """Handles one batch of pending chats. Returns False when there were none."""
+        chats = self.db.get_chats_to_summarize(SUMMARY_INTERVAL, BATCH_SIZE, sorted(self._skip))
+        if not chats:
+            return False
+
+        for chat in chats:
+            chat["messages"] = []
+            used = 0
+            for msg in self.db.get_message_texts(chat["id"], chat["summary_count"]):
+                if chat["messages"] and used >= CHAT_CHARS:
+                    # The rest is summarized on the next run
+                    break
+                content = msg["content"][:MESSAGE_CHARS]
+                used += len(content)
+                chat["messages"].append(dict(msg, content=content))
+
+        results = self.summarize(host, model, chats)
+        for chat in chats:
+            result = results.get(chat["id"])
+            if not result or not chat["messages"]:
+                self._skip.add(chat["id"])
+                continue
+            title = clean_title(result["title"]) if chat["title_source"] == "truncated" else None
+            if title == "":
+                # The chat would stay pending forever
+                self._skip.add(chat["id"])
+                continue
+            summary = result["summary"].strip()
+            covered = chat["messages"][-1]["order_index"] + 1
+            changed = self.db.update_chat_summary(chat["id"], summary, covered, title)
+            if self.on_update:
+                self.on_update(chat["id"], title if changed else None, summary)
+        return True
+
+    def summarize(self, host: str, model: str, chats: List[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+        """Asks the model for a title and summary of each chat. Returns them by chat id."""
+        parts = []
+        for number, chat in enumerate(chats, 1):
+            lines = [f"Conversation {number}"]
+            if chat["summary"]:
+                lines.append(f"Previous summary: {chat['summary']}")
+                lines.append("New messages:")
+            else:
+                lines.append("Messages:")
+            for msg in chat["messages"]:
+                if msg["role"] in ("user", "assistant"):
+                    lines.append(f"{msg['role'].capitalize()}: {msg['content']}")
+            parts.append("\n".join(lines))
+        prompt = (
+            "Write a title and a summary for each of these conversations. "
+            "Answer with the conversation numbers as ids.\n\n" + "\n\n".join(parts)
+        )
+
+        response = ollama.complete(host, model, prompt, system=SYSTEM_PROMPT, options=OPTIONS, format=RESULT_SCHEMA)
+        try:
+            data = json.loads(response.get("response", ""))
+        except ValueError:
+            print(f"Unreadable titles and summaries from {model}")
+            return {}
+
+        results: Dict[str, Dict[str, str]] = {}
+        items = data.get("chats") if isinstance(data, dict) else None
+        for item in items if isinstance(items, list) else []:
+            try:
+                number = int(item["id"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not 1 <= number <= len(chats):
+                continue
+            chat = chats[number - 1]
+            if isinstance(item.get("title"), str) and isinstance(item.get("summary"), str) and item["summary"].strip():
+                results[chat["id"]] = item
+        return results
@@ -1,14 +1,23 @@
 from typing import List, Optional, Any, Dict, Union
 from gi.repository import Gtk, Gio, GLib, GObject
 import threading
+import concurrent.futures
 from . import ollama
+from . import instrumentation
+from .metrics import build_metric, final_counters
+from .logprobs import LogprobTrace
 from .storage import ChatStorage
+from .tokens import DEFAULT_NUM_CTX
+from .response_cache import is_deterministic
 from .session import GenerationStrategy, ChatStrategy
 
 from .widgets.message_list import MessageList
 from .widgets.chat_input import ChatInput
 from .widgets.options_panel import OptionsPanel
 
+# Milliseconds of quiet after typing before the context meter is recounted
+CONTEXT_METER_DELAY_MS = 300
+
 @Gtk.Template(resource_path='/io/github/jackrabbithanna/Gnollama/tab.ui')
 class GenerationTab(Gtk.Box):
     """The main widget for a chat or generation session."""
@@ -41,12 +50,21 @@ class GenerationTab(Gtk.Box):
         
         self.options_panel.storage = self.storage
         self.options_panel.update_hosts()
+        self.options_panel.documents_box.set_visible(mode == 'chat')
         
         self.chat_input.send_button.connect('clicked', self.on_send_clicked)
         self.chat_input.entry.connect('activate', self.on_send_clicked)
         self.options_panel.system_prompt_entry.connect('activate', self.on_send_clicked)
         
         self.options_panel.host_dropdown.connect('notify::selected-item', self.on_host_changed)
+
+        # The context meter follows the draft, the model and the context size
+        self._context_timeout = 0
+        self._context_generation = 0
+        self.chat_input.entry.connect('changed', self.schedule_context_update)
+        self.options_panel.system_prompt_entry.connect('changed', self.schedule_context_update)
+        self.options_panel.num_ctx_entry.connect('changed', self.schedule_context_update)
+        self.chat_input.model_dropdown.connect('notify::selected-item', self.schedule_context_update)
         
         self.on_host_changed()
 
@@ -96,6 +114,10 @@ class GenerationTab(Gtk.Box):
                 bubble.append_text(content)
                 if 'api_details' in msg:
                     bubble.set_api_details(msg['api_details'])
+                    if msg['api_details'].get('cached'):
+                        bubble.set_cached()
+                if 'logprobs' in msg:
+                    bubble.update_logprobs(msg['logprobs'])
                 self.message_list.add_ai_bubble(bubble)
             elif role == 'system':
                 self.message_list.add_system_message(content)
@@ -114,16 +136,11 @@ class GenerationTab(Gtk.Box):
             self.tab_label.set_label(truncated)
             
         self.chat_input.entry.set_text("")
-        images = []
-        if self.chat_input.selected_image_paths:
-            import base64
-            for path in self.chat_input.selected_image_paths:
-                with open(path, "rb") as image_file:
-                    encoded = base64.b64encode(image_file.read()).decode('utf-8')
-                    images.append(encoded)
+        image_paths = list(self.chat_input.selected_image_paths)
+        if image_paths:
             self.chat_input.on_clear_image_clicked(None)
 
-        self.message_list.add_user_message(prompt, images=images)
+        self.message_list.add_user_message(prompt, image_paths=image_paths)
         
         # Extract all UI state on the main thread before launching the background request
         host = self.options_panel.get_selected_host()
@@ -142,24 +159,133 @@ class GenerationTab(Gtk.Box):
             except ValueError:
                 pass
                 
+        if not host:
+            self.message_list.add_system_message(_("Error: No host configured."))
+            return
+
+        from .session import worker, admission
+        from .scheduler import LANE_STREAM, LANE_IMAGES
+        from .bubbles import AiBubble
+        from .images import prepare_uploads, upload_options
+
+        # Images are resized and re-encoded while the request waits for a slot
+        image_upload = None
+        if image_paths:
+            image_upload = worker.schedule(LANE_IMAGES, prepare_uploads, image_paths, upload_options())
+
+        # The chat keeps its selected host even if this request is routed elsewhere
+        host_id = host['id']
+        if self.options_panel.overflow_check.get_active() and admission.is_saturated(host['hostname']):
+            overflow_host = admission.pick_overflow_host(self.options_panel.host_list, model, host['hostname'])
+            if overflow_host:
+                host = overflow_host
+
+        ai_bubble = AiBubble(model_name=model)
+        ai_bubble.timings = instrumentation.StreamTimings()
+        if host['id'] != host_id:
+            ai_bubble.set_host_name(host['name'])
+        self.message_list.add_ai_bubble(ai_bubble)
+                
         req_data = {
             'host': host,
+            'host_id': host_id,
             'model': model,
             'thinking': thinking,
             'options': options,
             'system': system,
             'logprobs': logprobs,
             'show_stats': show_stats,
-            'top_logprobs': top_logprobs
+            'top_logprobs': top_logprobs,
+            'documents': self.options_panel.documents_folder if self.mode == 'chat' else None,
+            'cache': self.options_panel.cache_check.get_active() and is_deterministic(options),
+            'bubble': ai_bubble
         }
         
+        future = worker.schedule(LANE_STREAM, self.process_request, prompt, image_upload, req_data,
+                                 host=host['hostname'])
+        self._watch_queue_position(future, ai_bubble)
+
+    def _watch_queue_position(self, future: Any, ai_bubble: Any) -> None:
+        """Keeps the bubble's queue position current until the request starts."""
         from .session import worker
-        worker.submit(self.process_request, prompt, images, req_data)
 
-    def process_request(self, prompt: str, images: Optional[List[str]], req_data: Dict[str, Any]) -> None:
-        host = req_data.get('host')
-        if not host:
-            GLib.idle_add(self.message_list.add_system_message, _("Error: No host configured."))
+        def poll() -> bool:
+            position = worker.queue_position(future)
+            ai_bubble.set_queue_position(position)
+            return position is not None
+
+        if poll():
+            GLib.timeout_add(250, poll)
+
+    def _finish_stream(self, ai_bubble: Any, metrics: Dict[str, Any], show_stats: bool,
+                       api_params: Dict[str, Any]) -> bool:
+        """Draws the remaining text, then shows and exports the stream's timings."""
+        ai_bubble.flush()
+        timings = ai_bubble.timings
+        if show_stats and metrics:
+            ai_bubble.show_stats(metrics, timings.summary())
+        if instrumentation.export_enabled():
+            from .session import worker
+            from .scheduler import LANE_DISK
+            record = timings.to_record(
+                host=api_params['host'], model=api_params['model'], endpoint=api_params['endpoint'],
+                server=metrics
+            )
+            worker.schedule(LANE_DISK, instrumentation.export, record)
+        self.schedule_context_update()
+        return False
+
+    def schedule_context_update(self, *args: Any) -> None:
+        """Recounts the context meter once the inputs stop changing."""
+        if self._context_timeout:
+            GLib.source_remove(self._context_timeout)
+        self._context_timeout = GLib.timeout_add(CONTEXT_METER_DELAY_MS, self.update_context_meter)
+
+    def update_context_meter(self) -> bool:
+        """Counts the tokens the next request would send, off the main thread."""
+        self._context_timeout = 0
+        host = self.options_panel.get_selected_host()
+        if not host or not self.chat_input.model_dropdown.get_selected_item():
+            return False
+        model = self.chat_input.get_selected_model()
+        num_ctx = self.options_panel.get_options_from_ui().get('num_ctx') or DEFAULT_NUM_CTX
+        system = self.options_panel.system_prompt_entry.get_text().strip() or None
+        draft = self.chat_input.entry.get_text().strip()
+        self._context_generation += 1
+        generation = self._context_generation
+        tokens = self.storage.tokens
+
+        def count() -> None:
+            messages = self.strategy.request_messages(system)[0]
+            messages.append({"role": "user", "content": draft})
+            used = tokens.count_messages(host['hostname'], model, messages)
+            GLib.idle_add(show, used, not tokens.exact(host['hostname']))
+
+        def show(used: int, estimated: bool) -> bool:
+            # Only the latest count is shown
+            if generation == self._context_generation:
+                self.chat_input.set_context_usage(used, num_ctx, estimated)
+            return False
+
+        from .session import worker
+        from .scheduler import LANE_METADATA
+        worker.schedule(LANE_METADATA, count)
+        return False
+
+    def process_request(self, prompt: str, image_upload: Optional[concurrent.futures.Future],
+                        req_data: Dict[str, Any]) -> None:
+        from .session import streams
+        handle = streams.begin()
+        try:
+            self._run_request(handle, prompt, image_upload, req_data)
+        finally:
+            streams.end(handle)
+
+    def _run_request(self, handle: Any, prompt: str, image_upload: Optional[concurrent.futures.Future],
+                     req_data: Dict[str, Any]) -> None:
+        host = req_data['host']
+        ai_bubble = req_data['bubble']
+        if handle.cancelled:
             return
             
         model = req_data.get('model')
@@ -184,31 +310,31 @@ class GenerationTab(Gtk.Box):
             api_params["system"] = system
             
         self.strategy.current_api_params = api_params
-        
-        ai_bubble = None
-        def create_bubble():
-            nonlocal ai_bubble
-            from .bubbles import AiBubble
-            ai_bubble = AiBubble(model_name=model)
-            ai_bubble.set_api_details(api_params)
-            self.message_list.add_ai_bubble(ai_bubble)
-            
-        GLib.idle_add(create_bubble)
-        
+        GLib.idle_add(ai_bubble.set_queue_position, None)
+        GLib.idle_add(ai_bubble.set_api_details, api_params)
+
         import time
-        while ai_bubble is None:
-            time.sleep(0.01)
+        from .session import worker, admission
+        from .scheduler import LANE_STREAM
+        concurrency = worker.running_count(LANE_STREAM, host['hostname'])
+        timings = ai_bubble.timings
 
         if hasattr(self.strategy, 'current_response_full_text'):
             self.strategy.current_response_full_text = ""
         if hasattr(self.strategy, 'current_thinking_full_text'):
             self.strategy.current_thinking_full_text = ""
 
+        def persist_partial() -> None:
+            self.strategy.current_api_params = dict(api_params, interrupted=True)
+            if hasattr(self.strategy, 'on_response_complete'):
+                self.strategy.on_response_complete(self, model)
+
         try:
-            for chunk in self.strategy.process(
+            images = image_upload.result() if image_upload else None
+            stream = self.strategy.process(
                 self,
                 host=host['hostname'],
-                host_id=host['id'],
+                host_id=req_data.get('host_id', host['id']),
                 model=model,
                 prompt=prompt,
                 system=system if system else None,
@@ -216,8 +342,26 @@ class GenerationTab(Gtk.Box):
                 thinking=thinking,
                 logprobs=logprobs,
                 top_logprobs=top_logprobs,
-                images=images
-            ):
+                images=images,
+                documents=req_data.get('documents'),
+                timings=timings,
+                cache=self.storage.response_cache if req_data.get('cache') else None
+            )
+            handle.on_interrupt = persist_partial
+            trace = LogprobTrace()
+            if logprobs and hasattr(self.strategy, 'set_logprobs'):
+                self.strategy.set_logprobs(trace)
+            sent_at = time.monotonic()
+            first_chunk_at = None
+            for chunk in stream:
+                if handle.cancelled:
+                    break
+                if first_chunk_at is None:
+                    first_chunk_at = time.monotonic()
+                    if chunk.get('cached'):
+                        api_params['cached'] = True
+                        GLib.idle_add(ai_bubble.set_cached)
+
                 if 'error' in chunk:
                     error_header = _("Error")
                     GLib.idle_add(ai_bubble.append_text, f"\n\n### {error_header}\n\n{chunk['error']}")
@@ -236,6 +380,8 @@ class GenerationTab(Gtk.Box):
                     # Actually, we should just let the user see <think> for now or keep it simple.
                     pass
 
+                timings.mark_chunk(bool(native_thinking or content))
+
                 if native_thinking:
                     GLib.idle_add(ai_bubble.append_thinking, native_thinking)
                     if hasattr(self.strategy, 'append_thinking'):
@@ -250,20 +396,38 @@ class GenerationTab(Gtk.Box):
                 if not logprobs_data and 'message' in chunk:
                     logprobs_data = chunk['message'].get('logprobs')
                 if logprobs_data:
-                    GLib.idle_add(ai_bubble.append_logprobs, logprobs_data)
+                    trace.extend(logprobs_data)
+                    GLib.idle_add(ai_bubble.update_logprobs, trace)
                         
                 if chunk.get('done', False):
-                    metrics = {
-                        k: chunk[k] for k in [
-                            'total_duration', 'load_duration', 'prompt_eval_count', 
-                            'prompt_eval_duration', 'eval_count', 'eval_duration'
-                        ] if k in chunk
-                    }
-                    if show_stats and metrics:
-                        GLib.idle_add(ai_bubble.show_stats, metrics)
+                    timings.mark_last_chunk()
+                    metrics = final_counters(chunk)
+                    GLib.idle_add(self._finish_stream, ai_bubble, metrics, show_stats, api_params)
+
+                    # A replayed response says nothing about the host's current performance
+                    cached = chunk.get('cached', False)
+                    if not cached:
+                        admission.observe(
+                            host['hostname'], concurrency, first_chunk_at - sent_at,
+                            chunk.get('load_duration', 0), chunk.get('prompt_eval_duration', 0)
+                        )
+                    if not cached:
+                        # Set only for prompts the server evaluated in full
+                        self.storage.tokens.observe(
+                            model, getattr(self.strategy, 'current_prompt_chars', None), chunk.get('prompt_eval_count')
+                        )
                         
                     if hasattr(self.strategy, 'on_response_complete'):
-                        self.strategy.on_response_complete(self, model)
+                        handle.finalize(lambda: self.strategy.on_response_complete(self, model))
+
+                    if not cached:
+                        self.storage.record_metric(build_metric(
+                            host['hostname'], model, api_params['endpoint'], api_params['options'], chunk,
+                            timings.ttft, chat_id=getattr(self.strategy, 'chat_id', None)
+                        ))
+
+            if handle.cancelled:
+                handle.interrupt()
                         
         except Exception as e:
             conn_err = _("Connection Error")
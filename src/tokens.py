@@ -0,0 +1,132 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import ollama
+from .database import DatabaseManager, content_hash
+
+# Rough size of a token, used until a model is calibrated
+CHARS_PER_TOKEN = 4
+# Context size Ollama uses when the request does not set num_ctx
+DEFAULT_NUM_CTX = 4096
+# Tokens the chat template adds around each message
+MESSAGE_OVERHEAD = 4
+# Sanity bounds; callers only observe prompts evaluated in full, without images,
+# since prompt_eval_count leaves out the part served from the KV cache
+MIN_CHARS_PER_TOKEN = 1.5
+MAX_CHARS_PER_TOKEN = 8.0
+# Weight of a new observation in a model's calibration
+SMOOTHING = 0.2
+# Prompts shorter than this say more about the template than the tokenizer
+MIN_CALIBRATION_CHARS = 200
+# Server token counts kept, by model and content hash
+CACHE_SIZE = 4096
+# Seconds before asking a host that failed to tokenize again
+SERVER_RETRY_S = 60.0
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+class TokenCounter:
+    """
+    Counts tokens before a prompt is sent.
+
+    Hosts whose server can tokenize are asked once per distinct text; the counts
+    are cached by model and content hash, so only new messages cost a request.
+    Other hosts are estimated from characters per token, calibrated per model
+    from the prompt_eval_count of finished requests, which costs no request at all.
+    """
+
+    def __init__(self, db: DatabaseManager) -> None:
+        self.db = db
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[Tuple[str, str], int]' = OrderedDict()
+        # Hosts not to ask to tokenize until the given monotonic time
+        self._no_server: Dict[str, float] = {}
+        self._calibration: Optional[Dict[str, Tuple[float, int]]] = None
+
+    def _calibrations(self) -> Dict[str, Tuple[float, int]]:
+        if self._calibration is None:
+            try:
+                self._calibration = self.db.get_token_calibration()
+            except Exception as e:
+                print(f"Error loading token calibration: {e}")
+                self._calibration = {}
+        return self._calibration
+
+    def chars_per_token(self, model: str) -> float:
+        with self._lock:
+            return self._calibrations().get(model, (CHARS_PER_TOKEN, 0))[0]
+
+    def estimate(self, model: Optional[str], text: str) -> int:
+        """Estimates the tokens of text from the model's calibration, without any request."""
+        if not text:
+            return 0
+        if model:
+            return math.ceil(len(text) / self.chars_per_token(model))
+        return estimate_tokens(text)
+
+    def count(self, host: Optional[str], model: str, text: str) -> int:
+        """Counts the tokens of text with the server's tokenizer when it has one; may block on a request."""
+        if not text:
+            return 0
+        key = (model, content_hash(text))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        if not self.exact(host):
+            return self.estimate(model, text)
+
+        try:
+            tokens = len(ollama.tokenize(host, model, text))
+        except ollama.UnsupportedEndpoint:
+            # Servers without a tokenize endpoint are estimated for the rest of the session
+            with self._lock:
+                self._no_server[host] = math.inf
+            return self.estimate(model, text)
+        except ollama.OllamaError:
+            # Unreachable or missing the model; estimate for a while rather than wait on every count
+            with self._lock:
+                self._no_server[host] = time.monotonic() + SERVER_RETRY_S
+            return self.estimate(model, text)
+
+        self.observe(model, len(text), tokens)
+        with self._lock:
+            self._cache[key] = tokens
+            if len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def exact(self, host: Optional[str]) -> bool:
+        """Whether counts for host currently come from the server's tokenizer."""
+        with self._lock:
+            return host is not None and self._no_server.get(host, 0) <= time.monotonic()
+
+    def count_messages(self, host: Optional[str], model: str, messages: List[Dict[str, Any]]) -> int:
+        """Counts the tokens of chat messages, including the template around each."""
+        return sum(self.count(host, model, str(m.get('content') or '')) + MESSAGE_OVERHEAD for m in messages)
+
+    def observe(self, model: str, chars: Optional[int], tokens: Optional[int]) -> None:
+        """
+        Calibrates a model from a prompt of chars characters that was tokens tokens long.
+        Only pass prompts the server evaluated in full, not ones continuing a cached prefix.
+        """
+        if not model or not tokens or not chars or chars < MIN_CALIBRATION_CHARS:
+            return
+        ratio = chars / tokens
+        if not MIN_CHARS_PER_TOKEN <= ratio <= MAX_CHARS_PER_TOKEN:
+            return
+        with self._lock:
+            calibrations = self._calibrations()
+            current, samples = calibrations.get(model, (ratio, 0))
+            # Average the first observations evenly, then follow drift
+            weight = max(1 / (samples + 1), SMOOTHING)
+            calibrations[model] = (current + (ratio - current) * weight, samples + 1)
+            current, samples = calibrations[model]
+        try:
+            self.db.set_token_calibration(model, current, samples)
+        except Exception as e:
+            print(f"Error saving token calibration: {e}")
@@ -0,0 +1,169 @@
+import heapq
+import math
+import mmap
+import os
+import struct
+import threading
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# File layout: header (magic, dimension, reserved), then rows of float32, little-endian
+_MAGIC = b'GVI1'
+_HEADER = struct.Struct('<4sI8x')
+
+# Rows scored per step by the pure Python fallback and the NumPy path
+_BLOCK_ROWS = 65536
+
+def normalize(vector: Sequence[float]) -> List[float]:
+    """Scales a vector to unit length so dot products are cosine similarities."""
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else [0.0] * len(vector)
+
+class VectorIndex:
+    """
+    Append-only matrix of unit float32 vectors in a file, searched by cosine similarity.
+
+    Rows are addressed by position; callers keep the mapping from rows to what
+    they embed. The file is memory-mapped for searching, so only the pages a
+    query touches are read and the matrix never has to fit in the Python heap.
+    Scoring is vectorized with NumPy when it is installed.
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None) -> None:
+        self.path = path
+        self.dim: Optional[int] = None
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_rows = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                magic, self.dim = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"Not a vector index: {path}")
+        elif dim is not None:
+            self._create(dim)
+
+    def _create(self, dim: int) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, dim))
+        self.dim = dim
+
+    def __len__(self) -> int:
+        if self.dim is None:
+            return 0
+        return (os.path.getsize(self.path) - _HEADER.size) // (4 * self.dim)
+
+    def append(self, vectors: Sequence[Sequence[float]]) -> int:
+        """Appends normalized vectors and returns the row of the first one."""
+        if not vectors:
+            return len(self)
+        with self._lock:
+            if self.dim is None:
+                self._create(len(vectors[0]))
+            first = len(self)
+            rows = array('f')
+            for vector in vectors:
+                if len(vector) != self.dim:
+                    raise ValueError(f"Expected {self.dim} dimensions, got {len(vector)}")
+                rows.extend(normalize(vector))
+            if rows.itemsize != 4:
+                raise RuntimeError("float32 arrays are required")
+            if struct.pack('=f', 1.0) != struct.pack('<f', 1.0):
+                rows.byteswap()
+            with open(self.path, 'ab') as f:
+                rows.tofile(f)
+            return first
+
+    def _mapped(self) -> Tuple[Optional[mmap.mmap], int]:
+        """Returns the mapping of the file, remapped when rows were appended."""
+        rows = len(self)
+        if self._map is None or self._mapped_rows != rows:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if rows:
+                with open(self.path, 'rb') as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_rows = rows
+        return self._map, rows
+
+    def search(self, query: Sequence[float], k: int = 10) -> List[Tuple[int, float]]:
+        """Returns up to k (row, cosine similarity) pairs, best first."""
+        if self.dim is None or len(query) != self.dim or k <= 0:
+            return []
+        q = normalize(query)
+        with self._lock:
+            mapped, rows = self._mapped()
+            if not rows:
+                return []
+            if numpy is not None:
+                return self._search_numpy(mapped, rows, q, k)
+            return self._search_python(mapped, rows, q, k)
+
+    def _search_numpy(self, mapped: mmap.mmap, rows: int, q: List[float], k: int) -> List[Tuple[int, float]]:
+        matrix = numpy.frombuffer(mapped, dtype='<f4', count=rows * self.dim,
+                                  offset=_HEADER.size).reshape(rows, self.dim)
+        query = numpy.asarray(q, dtype=numpy.float32)
+        best_rows: List[numpy.ndarray] = []
+        best_scores: List[numpy.ndarray] = []
+        for start in range(0, rows, _BLOCK_ROWS):
+            scores = matrix[start:start + _BLOCK_ROWS] @ query
+            take = min(k, len(scores))
+            top = numpy.argpartition(-scores, take - 1)[:take]
+            best_rows.append(top + start)
+            best_scores.append(scores[top])
+        all_rows = numpy.concatenate(best_rows)
+        all_scores = numpy.concatenate(best_scores)
+        order = numpy.argsort(-all_scores)[:k]
+        return [(int(all_rows[i]), float(all_scores[i])) for i in order]
+
+    def _search_python(self, mapped: mmap.mmap, rows: int, q: List[float], k: int) -> List[Tuple[int, float]]:
+        dim = self.dim
+        view = memoryview(mapped)[_HEADER.size:_HEADER.size + rows * dim * 4]
+        values = view.cast('f')
+        swap = struct.pack('=f', 1.0) != struct.pack('<f', 1.0)
+
+        def scores():
+            for row in range(rows):
+                vector = values[row * dim:(row + 1) * dim]
+                if swap:
+                    vector = array('f', vector)
+                    vector.byteswap()
+                yield sum(a * b for a, b in zip(vector, q)), row
+
+        try:
+            return [(row, score) for score, row in heapq.nlargest(k, scores())]
+        finally:
+            values.release()
+            view.release()
+
+    def compact(self, keep: Sequence[int]) -> None:
+        """Rewrites the file with only the given rows, in that order; row i becomes keep[i]'s vector."""
+        if self.dim is None:
+            return
+        row_bytes = self.dim * 4
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+                self._mapped_rows = 0
+            with open(self.path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                dst.write(_HEADER.pack(_MAGIC, self.dim))
+                for row in keep:
+                    src.seek(_HEADER.size + row * row_bytes)
+                    dst.write(src.read(row_bytes))
+            os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+                self._mapped_rows = 0
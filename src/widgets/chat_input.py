@@ -2,6 +2,7 @@ from typing import List, Optional, Any, Dict, Callable
 from gi.repository import Gtk, GObject, Gio, GdkPixbuf, GLib, Gdk
 import threading
 from .. import ollama
+from ..images import PREVIEW_THUMBNAIL_SIZE, show_thumbnail, thumbnail_picture, thumbnails
 
 @Gtk.Template(resource_path='/io/github/jackrabbithanna/Gnollama/widgets/chat_input.ui')
 class ChatInput(Gtk.Box):
@@ -17,6 +18,9 @@ class ChatInput(Gtk.Box):
     attach_button: Gtk.Button = Gtk.Template.Child()
     image_label: Gtk.Label = Gtk.Template.Child()
     clear_image_button: Gtk.Button = Gtk.Template.Child()
+    context_box: Gtk.Box = Gtk.Template.Child()
+    context_level: Gtk.LevelBar = Gtk.Template.Child()
+    context_label: Gtk.Label = Gtk.Template.Child()
 
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
@@ -27,6 +31,12 @@ class ChatInput(Gtk.Box):
         self.thinking_dropdown.set_selected(0)
 
         self.selected_image_paths: List[str] = []
+
+        # The context meter is drawn as a warning once the prompt nears the window
+        for offset in (Gtk.LEVEL_BAR_OFFSET_LOW, Gtk.LEVEL_BAR_OFFSET_HIGH, Gtk.LEVEL_BAR_OFFSET_FULL):
+            self.context_level.remove_offset_value(offset)
+        self.context_level.add_offset_value(Gtk.LEVEL_BAR_OFFSET_HIGH, 0.75)
+        self.context_level.add_offset_value(Gtk.LEVEL_BAR_OFFSET_LOW, 1.0)
         
         self.attach_button.connect("clicked", self.on_attach_clicked)
         self.clear_image_button.connect("clicked", self.on_clear_image_clicked)
@@ -96,17 +106,33 @@ class ChatInput(Gtk.Box):
                 self.thinking_dropdown.set_selected(i)
                 break
 
+    def set_context_usage(self, used: int, num_ctx: int, estimated: bool) -> None:
+        """Shows how much of the context window the next request fills."""
+        def short(tokens: int) -> str:
+            return f"{tokens / 1000:.1f}k" if tokens >= 1000 else str(tokens)
+
+        self.context_level.set_value(min(used / num_ctx, 1.0) if num_ctx else 0)
+        self.context_label.set_text(f"{short(used)} / {short(num_ctx)}")
+        if estimated:
+            tooltip = _("About {0} of {1} context tokens used (estimated)").format(used, num_ctx)
+        else:
+            tooltip = _("{0} of {1} context tokens used").format(used, num_ctx)
+        self.context_box.set_tooltip_text(tooltip)
+        self.context_box.set_visible(True)
+
     def fetch_models(self, host: str) -> None:
         """Asynchronously fetches available models from the host."""
         def thread_func() -> None:
             try:
                 models = ollama.fetch_models(host)
+                admission.note_models(host, models)
                 GLib.idle_add(self.set_models, models)
             except ollama.OllamaError:
                 GLib.idle_add(self.set_models, [])
             
-        from ..session import worker
-        worker.submit(thread_func)
+        from ..session import worker, admission
+        from ..scheduler import LANE_METADATA, PRIORITY_HIGH
+        worker.schedule(LANE_METADATA, thread_func, priority=PRIORITY_HIGH)
 
     def on_attach_clicked(self, btn: Gtk.Button) -> None:
         """Opens a file chooser to attach one or multiple images."""
@@ -161,28 +187,22 @@ class ChatInput(Gtk.Box):
         self.clear_image_button.set_visible(True)
 
         for path in self.selected_image_paths:
-            try:
-                with open(path, "rb") as f:
-                    data = f.read()
-                texture = Gdk.Texture.new_from_bytes(GLib.Bytes.new(data))
-                img_widget = Gtk.Picture.new_for_paintable(texture)
-                img_widget.set_size_request(80, 80)
-                img_widget.set_content_fit(Gtk.ContentFit.SCALE_DOWN)
-                
-                remove_btn = Gtk.Button.new_from_icon_name("window-close-symbolic")
-                remove_btn.add_css_class("osd")
-                remove_btn.add_css_class("circular")
-                remove_btn.set_valign(Gtk.Align.START)
-                remove_btn.set_halign(Gtk.Align.END)
-                remove_btn.connect("clicked", self.on_remove_single_image_clicked, path)
-                
-                overlay = Gtk.Overlay()
-                overlay.set_child(img_widget)
-                overlay.add_overlay(remove_btn)
-                
-                self.image_preview_box.append(overlay)
-            except GLib.Error as e:
-                print(f"Error loading image preview for {path}: {e}")
+            img_widget = thumbnail_picture(80, 80)
+            thumbnails.load_file(path, PREVIEW_THUMBNAIL_SIZE,
+                                 lambda texture, picture=img_widget: show_thumbnail(picture, texture))
+
+            remove_btn = Gtk.Button.new_from_icon_name("window-close-symbolic")
+            remove_btn.add_css_class("osd")
+            remove_btn.add_css_class("circular")
+            remove_btn.set_valign(Gtk.Align.START)
+            remove_btn.set_halign(Gtk.Align.END)
+            remove_btn.connect("clicked", self.on_remove_single_image_clicked, path)
+
+            overlay = Gtk.Overlay()
+            overlay.set_child(img_widget)
+            overlay.add_overlay(remove_btn)
+
+            self.image_preview_box.append(overlay)
 
     def on_remove_single_image_clicked(self, btn: Gtk.Button, path: str) -> None:
         """Removes a single image from the selection."""
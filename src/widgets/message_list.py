@@ -32,9 +32,10 @@ class MessageList(Gtk.ScrolledWindow):
             if adj:
                 adj.set_value(adj.get_upper() - adj.get_page_size())
 
-    def add_user_message(self, text: str, images: Optional[List[str]] = None) -> None:
-        """Adds a user message bubble."""
-        bubble = UserBubble(text, images=images)
+    def add_user_message(self, text: str, images: Optional[List[str]] = None,
+                         image_paths: Optional[List[str]] = None) -> None:
+        """Adds a user message bubble, with base64 images or image files."""
+        bubble = UserBubble(text, images=images, image_paths=image_paths)
         self.list_box.append(bubble)
         GLib.idle_add(self.auto_scroll)
 
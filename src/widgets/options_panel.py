@@ -1,5 +1,5 @@
 from typing import Dict, Any, Callable, List, Optional
-from gi.repository import Gtk, GObject
+from gi.repository import Gio, GLib, Gtk, GObject
 from ..storage import ChatStorage
 
 @Gtk.Template(resource_path='/io/github/jackrabbithanna/Gnollama/widgets/options_panel.ui')
@@ -9,6 +9,13 @@ class OptionsPanel(Gtk.Expander):
 
     host_dropdown: Gtk.DropDown = Gtk.Template.Child()
     system_prompt_entry: Gtk.Entry = Gtk.Template.Child()
+    documents_box: Gtk.Box = Gtk.Template.Child()
+    documents_button: Gtk.Button = Gtk.Template.Child()
+    documents_label: Gtk.Label = Gtk.Template.Child()
+    documents_clear_button: Gtk.Button = Gtk.Template.Child()
+    documents_status_label: Gtk.Label = Gtk.Template.Child()
+    overflow_check: Gtk.CheckButton = Gtk.Template.Child()
+    cache_check: Gtk.CheckButton = Gtk.Template.Child()
     stats_check: Gtk.CheckButton = Gtk.Template.Child()
     logprobs_check: Gtk.CheckButton = Gtk.Template.Child()
     top_logprobs_entry: Gtk.Entry = Gtk.Template.Child()
@@ -26,6 +33,11 @@ class OptionsPanel(Gtk.Expander):
         super().__init__(**kwargs)
         self.storage = None
         self.host_list: List[Dict[str, Any]] = []
+        # Folder whose documents are retrieved into chat prompts
+        self.documents_folder: Optional[str] = None
+
+        self.documents_button.connect("clicked", self.on_documents_clicked)
+        self.documents_clear_button.connect("clicked", lambda btn: self.set_documents_folder(None))
 
     def update_hosts(self) -> None:
         """Reloads the host list from storage and updates the dropdown."""
@@ -50,6 +62,59 @@ class OptionsPanel(Gtk.Expander):
         if hosts:
             self.host_dropdown.set_selected(target_idx)
 
+    def on_documents_clicked(self, btn: Gtk.Button) -> None:
+        """Opens a folder chooser for the documents to answer from."""
+        parent_window = self.get_root()
+        if not isinstance(parent_window, Gtk.Window):
+            return
+
+        dialog = Gtk.FileDialog()
+        dialog.set_title(_("Select Documents Folder"))
+
+        def on_folder_selected(dialog: Gtk.FileDialog, result: Gio.AsyncResult) -> None:
+            try:
+                folder = dialog.select_folder_finish(result)
+                if folder and folder.get_path():
+                    self.set_documents_folder(folder.get_path())
+            except GLib.Error as e:
+                if not (e.domain == 'gtk-dialog-error-quark' and e.code == 2):
+                    print(f"Error selecting folder: {e}")
+
+        dialog.select_folder(parent_window, None, on_folder_selected)
+
+    def set_documents_folder(self, folder: Optional[str]) -> None:
+        """Uses the documents in folder (None for none), indexing its new and changed files."""
+        self.documents_folder = folder
+        self.documents_clear_button.set_visible(folder is not None)
+        self.documents_label.set_label(folder if folder else _("No folder selected"))
+        self.documents_status_label.set_visible(folder is not None)
+        if folder:
+            self.index_documents()
+
+    def index_documents(self) -> None:
+        """Indexes the documents folder in the background, showing the progress."""
+        folder = self.documents_folder
+        index = self.storage.document_index if self.storage else None
+        if not folder or not index:
+            return
+        if not index.enabled:
+            self.documents_status_label.set_label(_("Set an embedding model to use documents"))
+            return
+        self.documents_status_label.set_label(_("Indexing..."))
+        index.schedule_update(folder, lambda progress: GLib.idle_add(self.show_index_progress, folder, progress))
+
+    def show_index_progress(self, folder: str, progress: Dict[str, Any]) -> bool:
+        if folder != self.documents_folder:
+            return False
+        if progress.get('error'):
+            text = _("Indexing failed: {0}").format(progress['error'])
+        elif progress.get('done'):
+            text = _("{0} files indexed, {1} updated").format(progress['scanned'], progress['embedded'])
+        else:
+            text = _("Indexing... {0} files updated, {1} scanned").format(progress['embedded'], progress['scanned'])
+        self.documents_status_label.set_label(text)
+        return False
+
     def get_selected_host(self) -> Optional[Dict[str, Any]]:
         """Returns the currently selected host configuration."""
         if not self.host_list:
@@ -110,3 +175,6 @@ class OptionsPanel(Gtk.Expander):
             
         if 'top_logprobs' in options and options['top_logprobs'] is not None:
             self.top_logprobs_entry.set_text(str(options['top_logprobs']))
+
+        if options.get('documents'):
+            self.set_documents_folder(options['documents'])
@@ -25,8 +25,11 @@ import urllib.request
 import re
 import html
 from .tab import GenerationTab
+from .compare_tab import CompareTab
 from .storage import ChatStorage
 from .host_manager import HostManagerDialog
+from .metrics_dashboard import MetricsDashboard
+from .chat_search import ChatSearchWindow
 from .model_manager import ModelManagerDialog
 
 @Gtk.Template(resource_path='/io/github/jackrabbithanna/Gnollama/history_row.ui')
@@ -91,6 +94,25 @@ class GnollamaWindow(Adw.ApplicationWindow):
         # Load history
         self.load_history_sidebar()
         
+        # Apply per-host parallel request limits
+        from .session import admission
+        hosts = self.storage.get_all_hosts()
+        admission.configure_hosts(hosts)
+        admission.refresh_models(hosts)
+
+        # Embed messages and documents with the configured model
+        self.settings.connect("changed::embedding-model", lambda *args: self.configure_embeddings())
+        self.configure_embeddings()
+
+        # Generate titles and summaries in the background
+        self.storage.summarizer.on_update = lambda *args: GLib.idle_add(self.on_chat_summarized, *args)
+        self.settings.connect("changed::summary-model", lambda *args: self.configure_summarizer())
+        self.configure_summarizer()
+
+        # Bound the response cache
+        self.settings.connect("changed::response-cache-size", lambda *args: self.configure_response_cache())
+        self.configure_response_cache()
+        
         # Connect tab switching
         self.notebook.connect("switch-page", self.on_tab_switched)
         
@@ -99,9 +121,8 @@ class GnollamaWindow(Adw.ApplicationWindow):
 
     def on_close_request(self, *args: Any) -> bool:
         """Handles the window close request and performs cleanup."""
-        self.storage.cleanup_empty_chats()
-        from .session import worker
-        worker.shutdown(wait=False)
+        from .shutdown import ShutdownCoordinator
+        ShutdownCoordinator(self.storage).run()
         return False
 
     def _setup_actions(self) -> None:
@@ -109,9 +130,12 @@ class GnollamaWindow(Adw.ApplicationWindow):
         actions = [
             ("new_tab", self.on_new_tab),
             ("new_chat_tab", self.on_new_chat_tab),
+            ("new_compare_tab", self.on_new_compare_tab),
             ("clear_history", self.on_clear_history),
             ("manage_hosts", self.on_manage_hosts),
-            ("manage_models", self.on_manage_models)
+            ("manage_models", self.on_manage_models),
+            ("metrics_dashboard", self.on_metrics_dashboard),
+            ("search_chats", self.on_search_chats)
         ]
         for name, callback in actions:
             action = Gio.SimpleAction.new(name, None)
@@ -171,8 +195,69 @@ class GnollamaWindow(Adw.ApplicationWindow):
         dialog.set_transient_for(self)
         dialog.present()
 
+    def on_metrics_dashboard(self, action: Gio.SimpleAction, param: Optional[GLib.Variant]) -> None:
+        """Opens the performance dashboard."""
+        dialog = MetricsDashboard(storage=self.storage)
+        dialog.set_transient_for(self)
+        dialog.present()
+
+    def on_search_chats(self, action: Gio.SimpleAction, param: Optional[GLib.Variant]) -> None:
+        """Opens the semantic chat search window."""
+        dialog = ChatSearchWindow(storage=self.storage, on_open_chat=self.open_chat_by_id)
+        dialog.set_transient_for(self)
+        dialog.present()
+
+    def open_chat_by_id(self, chat_id: str) -> None:
+        """Opens a stored chat, e.g. from a search result."""
+        chat_data = self.storage.get_chat(chat_id)
+        if chat_data:
+            self.open_chat_tab(chat_data)
+
+    def configure_embeddings(self) -> None:
+        """Points the chat and document indexes at the hosts and the embedding-model setting."""
+        hosts = sorted(self.storage.get_all_hosts(), key=lambda h: not h.get('default'))
+        hostnames = [h['hostname'] for h in hosts]
+        model = self.settings.get_string('embedding-model').strip()
+        self.storage.chat_index.configure(hostnames[0] if hostnames else None, model)
+        # Documents are indexed on every host that serves the model
+        self.storage.document_index.configure(hostnames, model)
+
+    def configure_summarizer(self) -> None:
+        """Points the title and summary worker at the default host and the summary-model setting."""
+        hosts = self.storage.get_all_hosts()
+        default = next((h for h in hosts if h.get('default')), hosts[0] if hosts else None)
+        self.storage.summarizer.configure(
+            default['hostname'] if default else None,
+            self.settings.get_string('summary-model').strip()
+        )
+
+    def configure_response_cache(self) -> None:
+        """Applies the response-cache-size setting, evicting responses past the new limit."""
+        cache = self.storage.response_cache
+        cache.max_bytes = self.settings.get_int('response-cache-size') * 1024 * 1024
+        from .session import worker
+        from .scheduler import LANE_DISK
+        worker.schedule(LANE_DISK, cache.evict)
+
+    def on_chat_summarized(self, chat_id: str, title: Optional[str], summary: str) -> bool:
+        """Shows a generated title and summary in the sidebar and the chat's tab."""
+        row = self.chat_rows.get(chat_id)
+        if row:
+            row.set_tooltip_text(summary)
+            if title:
+                row.label.set_text(title)
+        if title:
+            self.update_tab_title(chat_id, title)
+        return False
+
     def on_hosts_changed(self) -> None:
         """Callback when hosts configuration is updated."""
+        from .session import admission
+        hosts = self.storage.get_all_hosts()
+        admission.configure_hosts(hosts)
+        admission.refresh_models(hosts)
+        self.configure_embeddings()
+        self.configure_summarizer()
         n_pages = self.notebook.get_n_pages()
         for i in range(n_pages):
             page = self.notebook.get_nth_page(i)
@@ -186,6 +271,36 @@ class GnollamaWindow(Adw.ApplicationWindow):
     def on_new_chat_tab(self, action: Gio.SimpleAction, param: Optional[GLib.Variant]) -> None:
         """Action callback for creating a new chat tab."""
         self.new_chat_tab()
+
+    def on_new_compare_tab(self, action: Gio.SimpleAction, param: Optional[GLib.Variant]) -> None:
+        """Action callback for creating a new model comparison tab."""
+        self.new_compare_tab()
+
+    def new_compare_tab(self) -> None:
+        """Creates and adds a new model comparison tab to the notebook."""
+        tab_label_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        icon = Gtk.Image.new_from_icon_name("view-dual-symbolic")
+        tab_label_box.append(icon)
+
+        tab_title = Gtk.Label(label=_("New Comparison"))
+        tab_label_box.append(tab_title)
+
+        close_button = Gtk.Button.new_from_icon_name("window-close-symbolic")
+        close_button.add_css_class("flat")
+        close_button.set_valign(Gtk.Align.CENTER)
+        tab_label_box.append(close_button)
+
+        tab = CompareTab(tab_title, storage=self.storage)
+
+        page_num = self.notebook.append_page(tab, tab_label_box)
+        self.notebook.set_menu_label_text(tab, tab_title.get_label())
+        tab_title.connect("notify::label", lambda lbl, pspec, t=tab: self.notebook.page_num(t) != -1 and self.notebook.set_menu_label_text(t, lbl.get_label()))
+        self.notebook.set_current_page(page_num)
+        self.notebook.set_tab_reorderable(tab, True)
+        self.notebook.set_tab_detachable(tab, True)
+
+        close_button.connect("clicked", lambda btn: self.close_tab(tab))
+        tab.set_visible(True)
         
     def new_tab(self) -> None:
         """Creates and adds a new generation tab to the notebook."""
@@ -231,6 +346,8 @@ class GnollamaWindow(Adw.ApplicationWindow):
         chat_id = chat['id']
         is_pinned = chat.get('is_pinned', False)
         row = HistoryRow(chat_id, chat.get('title', _('New Chat')), is_pinned=is_pinned)
+        if chat.get('summary'):
+            row.set_tooltip_text(chat['summary'])
         row.popover_pin_btn.connect("clicked", self.on_popover_pin_clicked, chat_id, row)
         row.popover_rename_btn.connect("clicked", self.on_popover_rename_clicked, chat_id, row)
         row.popover_delete_btn.connect("clicked", self.on_popover_delete_clicked, chat_id, row)
@@ -313,9 +430,7 @@ class GnollamaWindow(Adw.ApplicationWindow):
         """Callback when a chat row is activated in the sidebar."""
         chat_id = getattr(row, 'chat_id', None)
         if chat_id:
-            chat_data = self.storage.get_chat(chat_id)
-            if chat_data:
-                self.open_chat_tab(chat_data)
+            self.open_chat_by_id(chat_id)
 
     def open_chat_tab(self, chat_data: Dict[str, Any]) -> None:
         """Opens an existing chat in a new or existing tab."""